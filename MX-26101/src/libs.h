@@ -1 +1 @@
-{"text_cursor": 2239, "print": 1027, "scroll": 1348, "cls": 1528, "strcmp": 1606, "memcpy": 1834, "load": 1969, "draw_asset": 2038}
\ No newline at end of file
+{"text_cursor": 2161, "print": 1027, "scroll": 1318, "cls": 1489, "strcmp": 1564, "memcpy": 1771, "load": 1903, "draw_asset": 1966}
\ No newline at end of file
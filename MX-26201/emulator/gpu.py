@@ -3,6 +3,7 @@ os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
 import mmap
 import struct
 import pygame
+import numpy as np
 
 SHM_SIZE = 4013
 SHM_NAME = "Local\\MX-26201_VM_SharedMemory"
@@ -14,16 +15,39 @@ COLORS = [
     (255,85,85), (255,85,255), (255,255,85), (255,255,255)
 ]
 
+CELL_W, CELL_H = 10, 16
+
+# Atlas slot of every character byte; slot 0 is the blank space glyph.
+GLYPH = np.zeros(256, dtype=np.intp)
+GLYPH[32:127] = np.arange(95)
+
+def glyph_coverage(font):
+    # Alpha of the 95 printable glyphs, moved up just far enough that descenders stay inside the cell.
+    glyphs = [pygame.surfarray.array_alpha(font.render(chr(i), True, (255, 255, 255))).T for i in range(32, 127)]
+    coverage = np.zeros((95, max(CELL_H, max(g.shape[0] for g in glyphs)), CELL_W), dtype=np.uint16)
+    for i, g in enumerate(glyphs):
+        coverage[i, :g.shape[0], :g.shape[1]] = g[:, :CELL_W]
+    ink = np.flatnonzero(coverage.any(axis=(0, 2)))
+    top = min(ink[0], max(0, ink[-1] + 1 - CELL_H)) if len(ink) else 0
+    return coverage[:, top:top + CELL_H]
+
+def glyph_atlas(coverage, fg, bg):
+    # atlas[glyph, i] is the RGB cell of every glyph drawn in fg[i] over bg[i].
+    a = coverage[:, None, :, :, None]
+    return ((bg[None, :, None, None] * (255 - a) + fg[None, :, None, None] * a + 127) // 255).astype(np.uint8)
+
 def start_monitor():
     pygame.init()
     screen = pygame.display.set_mode((800, 400))
     vga_font = pygame.font.SysFont("Courier New", 16)
-    char_cache = {}
-    for c_idx, color in enumerate(COLORS):
-        char_cache[c_idx] = {
-            i: vga_font.render(chr(i), True, color) 
-            for i in range(32, 127)
-    }
+    colors = np.array(COLORS, dtype=np.uint16)
+    attrs = np.arange(256)
+    atlas = glyph_atlas(glyph_coverage(vga_font), colors[attrs & 0x0F], colors[attrs >> 4])
+
+    # The text surface shares its pixels with text_pixels, laid out as 25 rows x 16 lines x 80 cells x 10 pixels.
+    text_pixels = np.zeros((25, CELL_H, 80, CELL_W, 3), dtype=np.uint8)
+    text_surface = pygame.image.frombuffer(text_pixels, (80 * CELL_W, 25 * CELL_H), "RGB")
+    shown_cells = np.full(2000, -1, dtype=np.intp)
 
     shm = None
     
@@ -77,28 +101,19 @@ def start_monitor():
                 caption = f"VM | {int(ips)} Hz"
             pygame.display.set_caption(caption)
 
-            screen.fill((0, 0, 0))
-
+            # Each cell is keyed by glyph slot and attribute; mode 0 is green on black.
+            vram = np.frombuffer(vram_data, dtype=np.uint8)
             if video_mode == 0:
-                for i in range(2000):
-                    char_code = vram_data[i]
-                    if 32 <= char_code <= 126:
-                        x = (i % 80) * 10
-                        y = (i // 80) * 16
-                        screen.blit(char_cache[2][char_code], (x, y))
+                cells = GLYPH[vram[:2000]] * 256 + 0x02
             elif video_mode == 1:
-                for i in range(2000):
-                    vram_idx = i * 2
-                    char_code = vram_data[vram_idx]
-                    attr_byte = vram_data[vram_idx + 1]
-                    fg_idx = attr_byte & 0x0F
-                    bg_idx = (attr_byte >> 4) & 0x0F
-                    x = (i % 80) * 10
-                    y = (i // 80) * 16
-                    if bg_idx != 0:
-                        pygame.draw.rect(screen, COLORS[bg_idx], (x, y, 10, 16))
-                    if 32 <= char_code <= 126:
-                        screen.blit(char_cache[fg_idx][char_code], (x, y))
+                cells = GLYPH[vram[0::2]] * 256 + vram[1::2]
+            else:
+                cells = np.zeros(2000, dtype=np.intp)
+            changed = np.flatnonzero(cells != shown_cells)
+            if len(changed):
+                shown_cells[changed] = cells[changed]
+                text_pixels[changed // 80, :, changed % 80] = atlas[cells[changed] >> 8, cells[changed] & 0xFF]
+            screen.blit(text_surface, (0, 0))
 
             pygame.display.flip()
         except Exception as e:
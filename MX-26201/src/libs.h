@@ -1 +1 @@
-{"text_cursor": 2665, "print": 1027, "scroll": 1348, "cls": 1414, "strcmp": 1453, "memcpy": 1681, "memset": 1816, "memset16": 1939, "load": 2059, "draw_asset": 2128, "play_note": 2329, "play_song": 2398}
\ No newline at end of file
+{"text_cursor": 2572, "print": 1027, "scroll": 1318, "cls": 1384, "strcmp": 1423, "memcpy": 1630, "memset": 1762, "memset16": 1882, "load": 1999, "draw_asset": 2062, "play_note": 2257, "play_song": 2320}
\ No newline at end of file
@@ -113,6 +113,7 @@ void VM::execute_16_bit() {
                     if (shared_memory) {
                         shared_memory->video_mode = (uint8_t)data;
                     }
+                    vram_changed = true;
                     break;
                 case 0x30: // Buzzer-Port (Frequenz setzen)
                     buzzer_freq = data;
@@ -958,6 +958,7 @@ void VM::execute_32_bit() {
                             if (shared_memory) {
                                 shared_memory->video_mode = (uint8_t)data;
                             }
+                            vram_changed = true;
                             break;
                         
                         case 0x30: // Buzzer
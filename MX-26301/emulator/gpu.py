@@ -1,12 +1,18 @@
 import os
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+import sys
+import ctypes
 import mmap
-import struct
 import pygame
 import numpy as np
 
-SHM_SIZE = 307215
 SHM_NAME = "Local\\MX-26301_VM_SharedMemory"
+FRAME_EVENT_NAME = "Local\\MX-26301_VM_FrameEvent"
+SYNCHRONIZE = 0x00100000
+FRAME_INTERVAL = 16
+TILE = 32
+SEQLOCK_RETRIES = 3
+CELL_W, CELL_H = 10, 16
 
 COLORS = [
     (0,0,0), (0,0,170), (0,170,0), (0,170,170),
@@ -17,10 +23,82 @@ COLORS = [
 
 WIDTH, HEIGHT = 640, 480
 
-def start_monitor():
+# Mirrors SharedData in shared_struct.hpp (packed, native byte order).
+SHARED_DTYPE = np.dtype([
+    ("vram", np.uint8, WIDTH * HEIGHT),
+    ("ips", np.float64),
+    ("video_mode", np.uint8),
+    ("key", np.uint8),
+    ("mouse_x", np.uint16),
+    ("mouse_y", np.uint16),
+    ("mouse_btn", np.uint8),
+    ("frame_seq", np.uint32),
+    ("double_buffered", np.uint8),
+    ("frame_gen", np.uint32),
+    ("frames", np.uint8, (2, WIDTH * HEIGHT)),
+])
+SHM_SIZE = SHARED_DTYPE.itemsize
+
+# Atlas slot of every character byte; slot 0 is the blank space glyph.
+GLYPH = np.zeros(256, dtype=np.intp)
+GLYPH[32:127] = np.arange(95)
+
+def open_frame_event():
+    try:
+        handle = ctypes.windll.kernel32.OpenEventW(SYNCHRONIZE, False, FRAME_EVENT_NAME)
+    except AttributeError:
+        return None
+    return handle or None
+
+def read_frame(shared, frames, snapshot):
+    # Copies the last completed frame into snapshot and returns its number, or None if the VM
+    # kept overwriting the buffer being copied. frame_gen is 2n - 1 while frame n is written
+    # into frames[n & 1] and 2n once it is complete.
+    for _ in range(SEQLOCK_RETRIES):
+        latest = int(shared["frame_gen"][0]) >> 1
+        np.copyto(snapshot, frames[latest & 1])
+        # The copied buffer is only reused once frame latest + 2 starts, at 2 * latest + 3.
+        if (int(shared["frame_gen"][0]) - 2 * latest) & 0xFFFFFFFF < 3:
+            return latest
+    return None
+
+def dirty_spans(dirty):
+    # Yields (tile row, first column, end column) for each run of changed tiles.
+    for ty in np.flatnonzero(dirty.any(axis=1)):
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], dirty[ty], [False]))))
+        for start, end in zip(edges[::2], edges[1::2]):
+            yield ty, start, end
+
+def glyph_coverage(font):
+    # Alpha of the 95 printable glyphs, moved up just far enough that descenders stay inside the cell.
+    glyphs = [pygame.surfarray.array_alpha(font.render(chr(i), True, (255, 255, 255))).T for i in range(32, 127)]
+    coverage = np.zeros((95, max(CELL_H, max(g.shape[0] for g in glyphs)), CELL_W), dtype=np.uint16)
+    for i, g in enumerate(glyphs):
+        coverage[i, :g.shape[0], :g.shape[1]] = g[:, :CELL_W]
+    ink = np.flatnonzero(coverage.any(axis=(0, 2)))
+    top = min(ink[0], max(0, ink[-1] + 1 - CELL_H)) if len(ink) else 0
+    return coverage[:, top:top + CELL_H]
+
+def glyph_atlas(coverage, fg, bg):
+    # atlas[glyph, i] is the RGB cell of every glyph drawn in fg[i] over bg[i].
+    a = coverage[:, None, :, :, None]
+    return ((bg[None, :, None, None] * (255 - a) + fg[None, :, None, None] * a + 127) // 255).astype(np.uint8)
+
+def start_monitor(wait_for_frames=False):
     pygame.init()
     screen = pygame.display.set_mode((800, 400))
-    pixel_surface = pygame.Surface((WIDTH, HEIGHT), 0, 8)
+
+    target_height = 400
+    target_width = int(target_height * (WIDTH / HEIGHT))
+    x_offset = (800 - target_width) // 2
+    scaled_surface = pygame.Surface((target_width, target_height), 0, 8)
+
+    # Nearest-neighbour source pixel of every scaled pixel, and the scaled bounds of every tile.
+    src_x = np.arange(target_width) * WIDTH // target_width
+    src_y = np.arange(target_height) * HEIGHT // target_height
+    tile_x = np.searchsorted(src_x, np.arange(0, WIDTH + 1, TILE))
+    tile_y = np.searchsorted(src_y, np.arange(0, HEIGHT + 1, TILE))
+    previous = np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
 
     palette = []
     for i in range(256):
@@ -28,33 +106,38 @@ def start_monitor():
         g = ((i >> 2) & 0x07) * 36
         b = (i & 0x03) * 85
         palette.append((r, g, b))
-    pixel_surface.set_palette(palette)
+    scaled_surface.set_palette(palette)
 
     vga_font = pygame.font.SysFont("Courier New", 16)
-    char_cache = {}
-    for c_idx, color in enumerate(COLORS):
-        char_cache[c_idx] = {
-            i: vga_font.render(chr(i), True, color) 
-            for i in range(32, 127)
-        }
+    colors = np.array(COLORS, dtype=np.uint16)
+    attrs = np.arange(256)
+    atlas = glyph_atlas(glyph_coverage(vga_font), colors[attrs & 0x0F], colors[attrs >> 4])
+
+    # The text surface shares its pixels with text_pixels, laid out as 25 rows x 16 lines x 80 cells x 10 pixels.
+    text_pixels = np.zeros((25, CELL_H, 80, CELL_W, 3), dtype=np.uint8)
+    text_surface = pygame.image.frombuffer(text_pixels, (80 * CELL_W, 25 * CELL_H), "RGB")
+    shown_cells = np.full(2000, -1, dtype=np.intp)
 
     shm = None
+    shared = None
+    frame_event = None
     video_mode = 0
+    last_frame = None
+    last_caption = None
+    redraw = False
     
     running = True
     while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.VIDEOEXPOSE:
+                redraw = True
             elif event.type == pygame.KEYDOWN:
-                if event.unicode and shm:
+                if event.unicode and shared is not None:
                     char_code = ord(event.unicode)
-                    if char_code < 256:
-                        # KEYBOARD BUFFER: 307209
-                        shm.seek(307209)
-                        if shm.read(1) == b'\x00': 
-                            shm.seek(307209)
-                            shm.write(struct.pack('B', char_code))
+                    if char_code < 256 and shared["key"][0] == 0:
+                        shared["key"][0] = char_code
 
         if shm is None:
             try:
@@ -65,20 +148,31 @@ def start_monitor():
                 continue
 
         try:
-            shm.seek(0)
-            all_data = shm.read(SHM_SIZE)
+            if shared is None:
+                shared = np.frombuffer(shm, dtype=SHARED_DTYPE, count=1)
+                double_buffered = None
+                if wait_for_frames and frame_event is None:
+                    frame_event = open_frame_event()
+
+            # Persistent views into the mapping, so reading a frame copies nothing. A double
+            # buffered VM is instead read through one consistent snapshot per frame. The flag is
+            # checked on every pass, since the monitor may start first or the VM may restart.
+            if bool(shared["double_buffered"][0]) != double_buffered:
+                double_buffered = bool(shared["double_buffered"][0])
+                if double_buffered:
+                    frames = shared["frames"][0]
+                    vram = np.zeros(WIDTH * HEIGHT, dtype=np.uint8)
+                else:
+                    frames = None
+                    vram = shared["vram"][0]
+                frame = vram.reshape((HEIGHT, WIDTH))
+                last_frame = None
 
-            vram_data = all_data[:307200]
-            ips_data = all_data[307200:307208]
-            video_mode = all_data[307208]
+            video_mode = int(shared["video_mode"][0])
 
             mx, my = pygame.mouse.get_pos()
             mb = pygame.mouse.get_pressed()
 
-            target_height = 400
-            target_width = int(target_height * (WIDTH / HEIGHT))
-            x_offset = (800 - target_width) // 2
-
             if video_mode == 2:
                 rel_x = mx - x_offset
                 m_grid_x = max(0, min(WIDTH - 1, int((rel_x / target_width) * WIDTH)))
@@ -89,55 +183,84 @@ def start_monitor():
             
             m_click = 1 if mb[0] else 0
 
-            shm.seek(307210)
-            shm.write(struct.pack('HHB', m_grid_x, m_grid_y, m_click))
+            shared["mouse_x"][0] = m_grid_x
+            shared["mouse_y"][0] = m_grid_y
+            shared["mouse_btn"][0] = m_click
 
-            ips = struct.unpack('d', ips_data)[0]
+            ips = float(shared["ips"][0])
             if ips >= 1000000:
                 caption = f"VM | {ips / 1000000:.2f} MHz"
             elif ips >= 1000:
                 caption = f"VM | {ips / 1000:.2f} kHz"
             else:
                 caption = f"VM | {int(ips)} Hz"
-            pygame.display.set_caption(caption)
-
-            screen.fill((0, 0, 0))
-
-            if video_mode == 0:
-                for i in range(2000):
-                    char_code = vram_data[i]
-                    if 32 <= char_code <= 126:
-                        x = (i % 80) * 10
-                        y = (i // 80) * 16
-                        screen.blit(char_cache[2][char_code], (x, y))
-            elif video_mode == 1:
-                for i in range(2000):
-                    vram_idx = i * 2
-                    char_code = vram_data[vram_idx]
-                    attr_byte = vram_data[vram_idx + 1]
-                    fg_idx = attr_byte & 0x0F
-                    bg_idx = (attr_byte >> 4) & 0x0F
-                    x = (i % 80) * 10
-                    y = (i // 80) * 16
-                    if bg_idx != 0:
-                        pygame.draw.rect(screen, COLORS[bg_idx], (x, y, 10, 16))
-                    if 32 <= char_code <= 126:
-                        screen.blit(char_cache[fg_idx][char_code], (x, y))
-            elif video_mode == 2:
-                frame = np.frombuffer(vram_data, dtype=np.uint8).reshape((HEIGHT, WIDTH)).T
-                pygame.surfarray.blit_array(pixel_surface, frame)
-
-                scaled_surface = pygame.transform.scale(pixel_surface, (target_width, target_height))
-                screen.blit(scaled_surface, (x_offset, 0))
-
-            pygame.display.flip()
+            if caption != last_caption:
+                pygame.display.set_caption(caption)
+                last_caption = caption
+
+            # Only convert, scale and present when the VM published a new frame. A frame the VM
+            # overtook while it was copied is retried on the next pass instead of waiting for it.
+            current_frame = (int(shared["frame_seq"][0]), video_mode)
+            if (current_frame != last_frame or redraw) and (frames is None or read_frame(shared, frames, vram) is not None):
+                full = redraw or last_frame is None or last_frame[1] != video_mode
+                last_frame = current_frame
+                redraw = False
+
+                if full or video_mode != 2:
+                    screen.fill((0, 0, 0))
+
+                if video_mode in (0, 1):
+                    # Each cell is keyed by glyph slot and attribute; mode 0 is green on black.
+                    if video_mode == 0:
+                        cells = GLYPH[vram[:2000]] * 256 + 0x02
+                    else:
+                        cells = GLYPH[vram[0:4000:2]] * 256 + vram[1:4000:2]
+                    changed = np.flatnonzero(cells != shown_cells)
+                    if len(changed):
+                        shown_cells[changed] = cells[changed]
+                        text_pixels[changed // 80, :, changed % 80] = atlas[cells[changed] >> 8, cells[changed] & 0xFF]
+                    screen.blit(text_surface, (0, 0))
+                elif video_mode == 2:
+                    if full:
+                        dirty = np.ones((HEIGHT // TILE, WIDTH // TILE), dtype=bool)
+                    else:
+                        dirty = (frame != previous).reshape(HEIGHT // TILE, TILE, WIDTH // TILE, TILE).any(axis=(1, 3))
+
+                    # Changed tiles are copied into previous first and scaled from there, so a write
+                    # landing after the comparison is still seen as a change in the next frame.
+                    rects = []
+                    pixels = pygame.surfarray.pixels2d(scaled_surface)
+                    for ty, tx0, tx1 in dirty_spans(dirty):
+                        rows = slice(ty * TILE, (ty + 1) * TILE)
+                        cols = slice(tx0 * TILE, tx1 * TILE)
+                        previous[rows, cols] = frame[rows, cols]
+                        x0, x1, y0, y1 = tile_x[tx0], tile_x[tx1], tile_y[ty], tile_y[ty + 1]
+                        pixels[x0:x1, y0:y1] = previous[src_y[y0:y1, None], src_x[None, x0:x1]].T
+                        rects.append(pygame.Rect(x0, y0, x1 - x0, y1 - y0))
+                    del pixels
+
+                    for rect in rects:
+                        screen.blit(scaled_surface, rect.move(x_offset, 0), rect)
+                    if not full:
+                        pygame.display.update([rect.move(x_offset, 0) for rect in rects])
+
+                if full or video_mode != 2:
+                    pygame.display.flip()
         except Exception as e:
             print(f"Error: {e}")
-            shm = None
+            shm = shared = None
 
-        pygame.time.wait(16)
+        if frame_event:
+            # Wakes as soon as the VM publishes a frame, but still polls input every interval.
+            ctypes.windll.kernel32.WaitForSingleObject(frame_event, FRAME_INTERVAL)
+        else:
+            pygame.time.wait(FRAME_INTERVAL)
 
-    if shm: shm.close()
+    if shm:
+        # The mapping can only be closed once no view exports its buffer.
+        shared = vram = frame = frames = None
+        shm.close()
+    if frame_event: ctypes.windll.kernel32.CloseHandle(frame_event)
 
 if __name__ == "__main__":
-    start_monitor()
\ No newline at end of file
+    start_monitor(wait_for_frames="-wait" in sys.argv)
\ No newline at end of file
@@ -11,6 +11,8 @@ MX-26301
 #include <conio.h>
 #include <windows.h>
 #include <csignal>
+#include <atomic>
+#include <string>
 
 #include "vm.hpp"
 #include "shared_struct.hpp"
@@ -58,9 +60,14 @@ void VM::setupSharedMemory() {
         FILE_MAP_ALL_ACCESS,
         0, 0, sizeof(SharedData)
     );
+
+    if (shared_memory) shared_memory->double_buffered = double_buffered;
+
+    // Auto-reset event the monitor can block on until the next frame is published.
+    hFrameEvent = CreateEventA(NULL, FALSE, FALSE, "Local\\MX-26301_VM_FrameEvent");
 }
 
-VM::VM() : regs(16, 0), memory(4294967296, 0) {
+VM::VM(bool double_buffered) : regs(16, 0), memory(4294967296, 0), double_buffered(double_buffered) {
     setupSharedMemory();
 
     // BIOS (bleibt 16 bit für legacy-support)
@@ -104,12 +111,26 @@ VM::VM() : regs(16, 0), memory(4294967296, 0) {
 VM::~VM() {
     UnmapViewOfFile(shared_memory);
     CloseHandle(hMapFile);
+    if (hFrameEvent) CloseHandle(hFrameEvent);
 }
 
 void VM::updateSharedMemory(double current_ips) {
     if (shared_memory) {
-        memcpy(shared_memory->vram, &memory[VRAM_START], 307200);
+        if (double_buffered) {
+            // The monitor keeps reading the previous frame from the other buffer meanwhile.
+            uint32_t gen = shared_memory->frame_gen + 1;
+            shared_memory->frame_gen = gen;
+            std::atomic_thread_fence(std::memory_order_release);
+            memcpy(shared_memory->frames[((gen + 1) >> 1) & 1], &memory[VRAM_START], 307200);
+            std::atomic_thread_fence(std::memory_order_release);
+            shared_memory->frame_gen = gen + 1;
+        } else {
+            memcpy(shared_memory->vram, &memory[VRAM_START], 307200);
+        }
         shared_memory->ips = current_ips;
+        std::atomic_thread_fence(std::memory_order_release);
+        shared_memory->frame_seq++;
+        if (hFrameEvent) SetEvent(hFrameEvent);
     }
 }
 
@@ -138,8 +159,7 @@ void VM::run() {
         if (!(cycles_since_last_ips & 8191)) {
             handleInput();
             if (vram_changed && shared_memory) {
-                memcpy(shared_memory->vram, &memory[VRAM_START], 307200);
-                shared_memory->ips = current_ips;
+                updateSharedMemory(current_ips);
                 vram_changed = false;
             }
         }
@@ -176,8 +196,9 @@ void handle_ctrl_c(int signum) {
     }
 }
 
-int main() {
-    VM vm = VM();
+int main(int argc, char* argv[]) {
+    bool double_buffered = argc > 1 && std::string(argv[1]) == "-double-buffer";
+    VM vm = VM(double_buffered);
     g_vm_ptr = &vm;
     std::signal(SIGINT, handle_ctrl_c);
     vm.run();
@@ -0,0 +1,65 @@
+import sys
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from gpu import SHARED_DTYPE, SHM_SIZE, WIDTH, HEIGHT, read_frame
+
+# Stress test for the double buffered frame transport: a writer process publishes frames as fast
+# as it can, the same way VM::updateSharedMemory does, and every frame n is filled with n & 0xFF
+# so that a torn copy shows up as a snapshot that is not uniform.
+
+def write_frames(name, stop):
+    shm = shared_memory.SharedMemory(name=name)
+    shared = np.ndarray(1, dtype=SHARED_DTYPE, buffer=shm.buf)
+    frames = shared["frames"][0]
+    while not stop.is_set():
+        gen = int(shared["frame_gen"][0]) + 1
+        shared["frame_gen"][0] = gen
+        frames[((gen + 1) >> 1) & 1].fill(((gen + 1) >> 1) & 0xFF)
+        shared["frame_gen"][0] = gen + 1
+        shared["frame_seq"][0] += 1
+    del shared, frames
+    shm.close()
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+
+    shm = shared_memory.SharedMemory(create=True, size=SHM_SIZE)
+    shared = np.ndarray(1, dtype=SHARED_DTYPE, buffer=shm.buf)
+    shared["double_buffered"][0] = 1
+    frames = shared["frames"][0]
+    snapshot = np.zeros(WIDTH * HEIGHT, dtype=np.uint8)
+
+    stop = multiprocessing.Event()
+    writer = multiprocessing.Process(target=write_frames, args=(shm.name, stop))
+    writer.start()
+
+    reads = skipped = torn = 0
+    last = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        latest = read_frame(shared, frames, snapshot)
+        if latest is None:
+            skipped += 1
+            continue
+        reads += 1
+        if latest < last or snapshot.min() != snapshot.max() or snapshot[0] != latest & 0xFF:
+            torn += 1
+        last = latest
+
+    stop.set()
+    writer.join()
+    written = int(shared["frame_gen"][0]) >> 1
+    del shared, frames
+    shm.close()
+    shm.unlink()
+
+    print(f"[Stats] Frames written: {written}, frames read: {reads}, skipped: {skipped}, torn: {torn}")
+    if torn:
+        print("[Error] The reader saw torn frames.")
+        sys.exit(1)
+    print("[Success] Every frame read was complete.")
+
+if __name__ == "__main__":
+    main()
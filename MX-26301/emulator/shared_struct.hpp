@@ -12,6 +12,10 @@ struct SharedData {
     uint16_t mouse_x;
     uint16_t mouse_y;
     uint8_t mouse_btn;
+    uint32_t frame_seq; // advanced by the VM after every published frame
+    uint8_t double_buffered; // frames are published through frames[] instead of vram
+    uint32_t frame_gen; // seqlock over frames[]: 2n - 1 while frame n is written into frames[n & 1], 2n once done
+    uint8_t frames[2][307200];
 };
 #pragma pack(pop)
 
@@ -22,6 +22,7 @@ private:
     
     bool running = true;
     bool vram_changed = false;
+    bool double_buffered = false;
     uint32_t disk_buffer_sector = 0;
     uint32_t disk_buffer_addr = 0;
     uint32_t buzzer_freq = 0;
@@ -30,6 +31,7 @@ private:
 
     SharedData* shared_memory = nullptr;
     HANDLE hMapFile = NULL;
+    HANDLE hFrameEvent = NULL;
 
     uint8_t* jit_buffer = nullptr;
     size_t jit_ptr = 0;
@@ -44,7 +46,7 @@ private:
     void setupSharedMemory();
 
 public:
-    VM();
+    VM(bool double_buffered = false);
     ~VM();
     
     void step();
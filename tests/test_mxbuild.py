@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+import mxbuild
+
+def test_int_option_rejects_non_numeric_jobs():
+    with pytest.raises(mxbuild.BuildError):
+        mxbuild.int_option(["-j", "many"], "-j", minimum=1)
+
+def test_int_option_consumes_the_value():
+    args = ["src", "-j", "4", "-n"]
+    assert mxbuild.int_option(args, "-j", minimum=1) == 4
+    assert args == ["src", "-n"]
+
+def test_names_inside_literals_are_not_references():
+    module = mxbuild.Module("main.c", 'def uint8 msg = "run helper";\ndef uint8 c = \'"\';\nout 2, lib_add(1, 2);\n')
+    assert "lib_add" in module.referenced
+    assert "helper" not in module.referenced and "run" not in module.referenced
@@ -0,0 +1,20 @@
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+import mxc16
+
+HEADER = "#org 0x2000\n#sector 1\n#sectors 1\n"
+
+def listing(code, **options):
+    return mxc16.compile_source(HEADER + code, {}, want_listing=True, **options)["listing"]
+
+def test_while_loop_is_tested_at_the_bottom():
+    code = "def uint16 i = 0;\nwhile uint16 $i < 5 {\n    out 1, 65;\n    uint16 i = uint16 $i + 1;\n}\n"
+    asm = listing(code)
+    n = re.search(r"_while_start_(\d+):", asm).group(1)
+    entry, start, cond, end = (asm.index(s) for s in (f"movi r15, _while_cond_{n}", f"_while_start_{n}:", f"_while_cond_{n}:", f"_while_end_{n}:"))
+    assert entry < start < cond < end
+    assert f"_while_start_{n}\n" in asm[cond:end]
+    assert f"_while_end_{n}\n" not in asm[entry:end]
@@ -0,0 +1,182 @@
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+import mxc32
+import vm32
+
+HEADER = "#org 0x400\n#sector 1\n#sectors 1\n"
+LIBRARY = (
+    "#org 0x8000\n#sector 2\n#sectors 1\n#export add3\n"
+    "def uint32 x;\ndef uint32 y;\ndef uint32 z;\n"
+    "void add3(x, y, z) {\n    return uint32 $x + uint32 $y + uint32 $z;\n}\n"
+)
+
+def listing(code, **options):
+    return mxc32.compile_source(HEADER + code, {}, want_listing=True, **options)["listing"]
+
+def outputs(code, **options):
+    return vm32.run(mxc32.compile_source(HEADER + code, {}, **options))
+
+def test_float_fold_beyond_float32_is_left_to_the_vm():
+    code = "def float32 x;\nfloat32 x = 300000000000000000000000000000000000000.0 * 10.0;\n"
+    assert "fmul" in listing(code)
+
+def test_float_fold_within_float32():
+    code = "def float32 x;\nfloat32 x = 1.5 * 2.0;\n"
+    asm = listing(code)
+    assert "fmul" not in asm
+    assert "0x40400000" in asm
+
+def test_deep_expression_spills_and_keeps_its_value():
+    count = 32
+    code = "".join(f"def uint32 v{i} = {i + 3};\n" for i in range(count))
+    expr, expected = "uint32 $v31", 34
+    for i in range(count - 3, -1, -2):
+        expr = f"uint32 $v{i} + uint32 $v{i + 1} * ({expr})"
+        expected = ((i + 3 + i + 4) * expected) & 0xFFFFFFFF  # MX-C evaluates strictly left to right
+    code += f"out 2, {expr};\n"
+    assert "_spill_" in listing(code)
+    assert outputs(code) == [(2, expected)]
+
+def test_cached_global_is_reread_after_a_call():
+    code = (
+        "def uint32 g;\n"
+        "void bump() {\n    uint32 g = uint32 $g + 10;\n    return;\n}\n"
+        "uint32 g = 5;\nout 2, uint32 $g;\nbump();\nout 2, uint32 $g;\n"
+    )
+    assert outputs(code) == [(2, 5), (2, 15)]
+
+def test_cached_global_is_reread_after_an_asm_block():
+    code = (
+        "def uint32 g;\n"
+        "uint32 g = 5;\nout 2, uint32 $g;\n"
+        "asm {\n    mov r1, g; mov r2, 7; mov.d [r1], r2\n}\n"
+        "out 2, uint32 $g;\n"
+    )
+    assert outputs(code) == [(2, 5), (2, 7)]
+
+def test_store_source_is_read_before_a_call_in_the_target():
+    code = (
+        "def uint32 a = 5;\ndef uint32 buf;\n"
+        "void idx() {\n    uint32 a = 9;\n    return 0;\n}\n"
+        "uint32 $(buf + idx()) = uint32 $a;\nout 2, uint32 $buf;\n"
+    )
+    asm = listing(code)
+    assert "], [" not in asm[asm.index("call idx"):asm.index("_program_halt")]
+    assert outputs(code) == [(2, 5)]
+
+def test_register_argument_count_is_exported():
+    assert mxc32.compile_source(LIBRARY, {})["exports"]["add3@regs"] == 3
+    assert "add3@regs" not in mxc32.compile_source(LIBRARY, {}, reg_args=False)["exports"]
+
+def test_register_and_stack_argument_modules_call_each_other():
+    for library_regs in (True, False):
+        library = mxc32.compile_source(LIBRARY, {}, reg_args=library_regs)
+        for caller_regs in (True, False):
+            main = mxc32.compile_source(HEADER + "out 2, add3(1, 2, 3);\n", library["exports"], reg_args=caller_regs)
+            assert vm32.run(main, modules=[(library, 0x8000)]) == [(2, 6)]
+
+def test_while_loop_is_tested_at_the_bottom():
+    code = "def uint32 i = 0;\nwhile uint32 $i < 5 {\n    out 2, uint32 $i;\n    uint32 i = uint32 $i + 1;\n}\n"
+    asm = listing(code)
+    n = re.search(r"_while_start_(\d+):", asm).group(1)
+    entry, start, cond, end = (asm.index(s) for s in (f"jmp _while_cond_{n}", f"_while_start_{n}:", f"_while_cond_{n}:", f"_while_end_{n}:"))
+    assert entry < start < cond < end
+    assert asm[cond:end].count("_while_start_" + n) == 1
+    assert "jmp _while_start_" not in asm
+    assert outputs(code) == [(2, i) for i in range(5)]
+    assert outputs(code.replace("< 5", "< 0")) == []
+
+def test_power_of_two_arithmetic_uses_shifts_and_masks():
+    code = "def uint32 a = 1000;\nout 2, uint32 $a * 8;\nout 2, uint32 $a / 16;\nout 2, uint32 $a % 32;\n"
+    asm = listing(code)
+    assert "shl" in asm and "shr" in asm and "and" in asm
+    assert not any(op in asm for op in ("mul", "div", "mod"))
+    assert outputs(code) == [(2, 8000), (2, 62), (2, 8)]
+
+def test_array_index_becomes_a_running_pointer():
+    code = (
+        "def uint32 words = {1, 2, 3, 4, 5, 6};\ndef uint32 i = 0;\ndef uint32 sum = 0;\n"
+        "while uint32 $i < 6 {\n"
+        "    uint32 sum = uint32 $sum + uint32 $(uint32 $i * 4 + words);\n"
+        "    uint32 i = uint32 $i + 1;\n"
+        "}\nout 2, uint32 $sum;\n"
+    )
+    asm = listing(code)
+    n = re.search(r"_while_start_(\d+):", asm).group(1)
+    body = asm[asm.index(f"_while_start_{n}:"):asm.index(f"_while_cond_{n}:")]
+    assert "shl" not in body and "mul" not in body
+    assert ", 0x4\n" in body
+    assert outputs(code) == [(2, 21)]
+
+def test_unreachable_objects_are_removed():
+    code = (
+        "def uint32 used = 4;\ndef uint32 unused = 5;\n"
+        "void dead() {\n    return 1;\n}\n"
+        "out 2, uint32 $used;\n"
+    )
+    result = mxc32.compile_source(HEADER + code, {}, want_listing=True)
+    assert set(result["removed"]) == {"dead", "unused"}
+    assert "dead:" not in result["listing"] and "unused:" not in result["listing"]
+    assert "dead" in mxc32.compile_source(HEADER + code, {}, opt_level=0, want_listing=True)["listing"]
+    assert outputs(code) == [(2, 4)]
+
+def test_exported_and_asm_referenced_objects_stay_alive():
+    code = (
+        "#export shown\n"
+        "def uint32 g = 0;\n"
+        "void shown() {\n    return 1;\n}\n"
+        "void poke() {\n    uint32 g = 7;\n    return 0;\n}\n"
+        "asm {\n call poke\n}\n"
+        "out 2, uint32 $g;\n"
+    )
+    result = mxc32.compile_source(HEADER + code, {}, want_listing=True)
+    assert result["removed"] == {}
+    assert "shown:" in result["listing"] and "poke:" in result["listing"]
+    assert outputs(code) == [(2, 7)]
+
+def switch_code(values, k):
+    cases = "".join(f"case {value}: out 2, {value};\n" for value in values)
+    return f"def uint32 k = {k};\nswitch uint32 $k {{\n{cases}default: out 2, 99;\n}}\n"
+
+def test_dense_switch_uses_a_jump_table():
+    values = range(10, 17)
+    asm = listing(switch_code(values, 12))
+    assert "_switch_table_" in asm and "jmp [" in asm
+    for k in (9, 10, 12, 16, 17, 1000):
+        assert outputs(switch_code(values, k)) == [(2, k if k in values else 99)]
+
+def test_sparse_switch_uses_a_compare_tree():
+    values = (1, 40, 300, 2000, 50000, 700000)
+    asm = listing(switch_code(values, 300))
+    assert "_switch_table_" not in asm and "jmp [" not in asm
+    assert "jl " in asm and "je " in asm
+    for k in (0, 1, 39, 300, 2000, 700000, 700001):
+        assert outputs(switch_code(values, k)) == [(2, k if k in values else 99)]
+
+INLINE_CODE = (
+    "#export twice\n"
+    "def uint32 a = 5;\ndef uint32 r;\ndef uint32 p;\ndef uint32 q;\ndef uint32 n;\n"
+    "void add1(p) {\n    return uint32 $p + 1;\n}\n"
+    "void twice(q) {\n    return uint32 $q * 2;\n}\n"
+    "void count(n) {\n    if uint32 $n == 0 {\n        return 0;\n    }\n    return count(uint32 $n - 1) + 1;\n}\n"
+    "uint32 r = add1(uint32 $a);\nout 2, uint32 $r;\nuint32 r = twice(uint32 $a);\nout 2, uint32 $r;\nuint32 r = count(3);\nout 2, uint32 $r;\n"
+)
+
+def test_small_functions_are_inlined():
+    result = mxc32.compile_source(HEADER + INLINE_CODE, {}, want_listing=True)
+    assert set(result["inlined"]) == {"add1"}
+    assert "call add1" not in result["listing"]
+    assert outputs(INLINE_CODE) == [(2, 6), (2, 10), (2, 3)]
+
+def test_recursive_and_exported_functions_are_never_inlined():
+    asm = listing(INLINE_CODE, inline_limit=1000)
+    assert "call twice" in asm and "call count" in asm
+
+def test_inline_limit_zero_disables_inlining():
+    result = mxc32.compile_source(HEADER + INLINE_CODE, {}, want_listing=True, inline_limit=0)
+    assert result["inlined"] == {}
+    assert "call add1" in result["listing"]
+    assert outputs(INLINE_CODE, inline_limit=0) == [(2, 6), (2, 10), (2, 3)]
@@ -0,0 +1,14 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+import mxcache
+
+def test_cache_size_is_read_from_the_environment(monkeypatch):
+    monkeypatch.setenv("MXC_CACHE_SIZE", "1024")
+    assert mxcache.cache_limit() == 1024
+
+def test_invalid_cache_size_falls_back_to_the_default(monkeypatch, capsys):
+    monkeypatch.setenv("MXC_CACHE_SIZE", "64M")
+    assert mxcache.cache_limit() == mxcache.CACHE_LIMIT
+    assert "[Warning]" in capsys.readouterr().out
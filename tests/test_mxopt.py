@@ -0,0 +1,16 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+import mxa
+import mxopt
+
+def optimize(source, bits=32):
+    return mxa.format_asm(mxopt.peephole(mxa.parse_text(source, bits=bits), bits)).splitlines()
+
+def test_stack_pointer_reload_after_push_and_pop_is_kept():
+    source = "mov r14, 0x1000\npush r1\nmov r14, 0x1000\npop r2\nmov r14, 0x1000\n"
+    assert optimize(source).count("mov r14, 0x1000") == 3
+
+def test_redundant_constant_load_is_removed():
+    assert optimize("mov r1, 0x5\nmov r1, 0x5\nout r1, r1\n").count("mov r1, 0x5") == 1
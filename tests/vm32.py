@@ -0,0 +1,129 @@
+import math
+import struct
+
+# A small model of execute32 in MX-26301/emulator/execute32.cpp, enough to run compiled test programs.
+# Memory is big-endian like the VM, `out` is recorded instead of performed, and a jump to itself halts.
+
+OPS = {
+    0x00: "nop", 0x01: "halt", 0x02: "jmp", 0x03: "je", 0x04: "jne", 0x05: "jg", 0x06: "jge", 0x07: "jl", 0x08: "jle",
+    0x09: "call", 0x0A: "ret", 0x10: "mov", 0x11: "push", 0x12: "pop",
+    0x20: "add", 0x21: "sub", 0x22: "mul", 0x23: "div", 0x24: "mod",
+    0x30: "and", 0x31: "or", 0x32: "xor", 0x33: "not", 0x40: "shl", 0x41: "shr", 0x42: "sar",
+    0x50: "fadd", 0x51: "fsub", 0x52: "fmul", 0x53: "fdiv", 0x54: "fmod", 0x64: "f2i", 0x65: "i2f", 0xF0: "out",
+}
+CONDITIONS = {
+    "je": lambda a, b: a == b, "jne": lambda a, b: a != b, "jg": lambda a, b: a > b,
+    "jge": lambda a, b: a >= b, "jl": lambda a, b: a < b, "jle": lambda a, b: a <= b,
+}
+ALU = {
+    "add": lambda a, b: a + b, "sub": lambda a, b: a - b, "mul": lambda a, b: a * b,
+    "div": lambda a, b: a // b, "mod": lambda a, b: a % b,
+    "and": lambda a, b: a & b, "or": lambda a, b: a | b, "xor": lambda a, b: a ^ b,
+    "shl": lambda a, b: a << b, "shr": lambda a, b: a >> b,
+    "sar": lambda a, b: ((a ^ 0x80000000) - 0x80000000) >> b,
+}
+FLOAT_ALU = {
+    "fadd": lambda a, b: a + b, "fsub": lambda a, b: a - b, "fmul": lambda a, b: a * b,
+    "fdiv": lambda a, b: a / b, "fmod": math.fmod,
+}
+MASK = 0xFFFFFFFF
+SIZES = {0: 1, 1: 2, 2: 4}
+
+def to_float(bits):
+    return struct.unpack("<f", struct.pack("<I", bits))[0]
+
+def from_float(value):
+    try:
+        return struct.unpack("<I", struct.pack("<f", value))[0]
+    except OverflowError:
+        return struct.unpack("<I", struct.pack("<f", math.copysign(math.inf, value)))[0]
+
+class VM:
+    def __init__(self, image, org, mem_size=0x100000):
+        self.mem = bytearray(mem_size)
+        self.mem[org:org + len(image)] = image
+        self.regs = [0] * 16
+        self.regs[14] = mem_size - 16
+        self.regs[15] = org
+        self.outs = []
+        self.steps = 0
+
+    def load(self, addr, size=4):
+        return int.from_bytes(self.mem[addr:addr + size], "big")
+
+    def store(self, addr, value, size=4):
+        self.mem[addr:addr + size] = (value & ((1 << (8 * size)) - 1)).to_bytes(size, "big")
+
+    def run(self, max_steps=1000000):
+        regs, mem = self.regs, self.mem
+        while self.steps < max_steps:
+            pc = regs[15]
+            name = OPS[mem[pc]]
+            ra, rb, rc, mode = mem[pc + 1] >> 4, mem[pc + 1] & 15, mem[pc + 2] >> 4, mem[pc + 3]
+            imm = self.load(pc + 4)
+            use_imm, src_ptr, dst_ptr, size = mode & 1, mode & 2, mode & 4, SIZES[(mode >> 4) & 3]
+            target = imm if use_imm else (self.load(regs[rc]) if dst_ptr else regs[rc])
+            self.steps += 1
+            next_pc = pc + 8
+
+            if name == "halt":
+                return
+            elif name == "jmp":
+                if target == pc:
+                    return
+                next_pc = target
+            elif name in CONDITIONS:
+                if CONDITIONS[name](regs[ra], regs[rb]):
+                    next_pc = target
+            elif name == "call":
+                regs[14] = (regs[14] - 4) & MASK
+                self.store(regs[14], pc + 8)
+                next_pc = imm if use_imm else (self.load(regs[ra]) if dst_ptr else regs[ra])
+            elif name == "ret":
+                next_pc = self.load(regs[14])
+                regs[14] = (regs[14] + 4) & MASK
+            elif name == "mov":
+                if use_imm:
+                    regs[ra] = imm
+                elif dst_ptr and src_ptr:
+                    self.store(regs[ra], self.load(regs[rb], size), size)
+                elif dst_ptr:
+                    self.store(regs[ra], regs[rb], size)
+                elif src_ptr:
+                    regs[ra] = self.load(regs[rb], size)
+                else:
+                    regs[ra] = regs[rb]
+                if ra == 15:
+                    next_pc = regs[15]
+            elif name == "push":
+                regs[14] = (regs[14] - 4) & MASK
+                self.store(regs[14], imm if use_imm else regs[ra])
+            elif name == "pop":
+                regs[ra] = self.load(regs[14])
+                regs[14] = (regs[14] + 4) & MASK
+                if ra == 15:
+                    next_pc = regs[15]
+            elif name in ALU:
+                b = imm if use_imm else regs[rb]
+                if name in ("shl", "shr", "sar"):
+                    b &= 0x1F
+                regs[ra] = ALU[name](regs[ra], b) & MASK
+            elif name == "not":
+                regs[ra] = ~regs[ra] & MASK
+            elif name in FLOAT_ALU:
+                regs[ra] = from_float(FLOAT_ALU[name](to_float(regs[ra]), to_float(regs[rb])))
+            elif name == "f2i":
+                regs[ra] = int(to_float(regs[ra])) & MASK
+            elif name == "i2f":
+                regs[ra] = from_float(float((regs[ra] ^ 0x80000000) - 0x80000000))
+            elif name == "out":
+                self.outs.append((regs[ra], regs[rb]))
+            regs[15] = next_pc
+        raise RuntimeError("step limit reached")
+
+def run(result, org=0x400, modules=()):
+    vm = VM(result["bytecode"], org)
+    for module, module_org in modules:
+        vm.mem[module_org:module_org + len(module["bytecode"])] = module["bytecode"]
+    vm.run()
+    return vm.outs
@@ -1,6 +1,9 @@
 import sys
 import os
+import re
 import struct
+import functools
+import mxdisk
 
 isa16 = {
     "nop": 0x0, "mov": 0x1, "movi": 0x2, "add": 0x3,
@@ -35,9 +38,89 @@ isa32 = {
     "out": 0xF0, "in": 0xF1
 }
 
+SIZE_SUFFIXES = {8: ".b", 16: ".w", 32: ".d"}
+SIZE_CODES = {8: 0, 16: 1, 32: 2, None: 2}
+
+class Reg:
+    __slots__ = ("num", "ptr")
+    def __init__(self, num, ptr=False):
+        self.num = num
+        self.ptr = ptr
+    def __eq__(self, other): return isinstance(other, Reg) and self.num == other.num and self.ptr == other.ptr
+    def __hash__(self): return hash(("r", self.num, self.ptr))
+    def __str__(self): return f"[r{self.num}]" if self.ptr else f"r{self.num}"
+    def __repr__(self): return f"Reg({self})"
+
+class Imm:
+    __slots__ = ("value", "ptr")
+    def __init__(self, value, ptr=False):
+        self.value = value
+        self.ptr = ptr
+    def __eq__(self, other): return isinstance(other, Imm) and self.value == other.value and self.ptr == other.ptr
+    def __hash__(self): return hash(("i", self.value, self.ptr))
+    def __str__(self):
+        text = hex(self.value) if isinstance(self.value, int) else str(self.value)
+        return f"[{text}]" if self.ptr else text
+    def __repr__(self): return f"Imm({self})"
+
+def mem(operand):
+    if isinstance(operand, Reg):
+        return Reg(operand.num, ptr=True)
+    return Imm(operand.value, ptr=True)
+
+class Instr:
+    __slots__ = ("op", "operands", "size", "signed", "source_line")
+    def __init__(self, op, operands=(), size=None, signed=False, source_line=None):
+        self.op = op
+        self.operands = operands
+        self.size = size
+        self.signed = signed
+        self.source_line = source_line
+    def __str__(self):
+        mnemonic = self.op + SIZE_SUFFIXES.get(self.size, "") + (".s" if self.signed else "")
+        if not self.operands:
+            return mnemonic
+        return f"{mnemonic} " + ", ".join(str(o) for o in self.operands)
+    def __repr__(self): return f"Instr({self})"
+
+class Label:
+    __slots__ = ("name",)
+    def __init__(self, name):
+        self.name = name
+    def __str__(self): return f"{self.name}:"
+
+class Data:
+    __slots__ = ("directive", "values")
+    WIDTHS = {".db": 1, ".dw": 2, ".dd": 4}
+    def __init__(self, directive, values):
+        self.directive = directive
+        self.values = values
+    def __str__(self):
+        return f"{self.directive} " + ", ".join(hex(v) if isinstance(v, int) else str(v) for v in self.values)
+
+class Directive:
+    __slots__ = ("name", "value")
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+    def __str__(self):
+        return f"{self.name} {hex(self.value) if self.name != '.bits' else self.value}"
+
+class Comment:
+    __slots__ = ("text",)
+    def __init__(self, text):
+        self.text = text
+    def __str__(self): return f"\n{self.text}"
+
+def format_asm(items):
+    return "\n".join(str(item) for item in items)
+
 def get_val(s, labels):
     if s in labels:
         return labels[s]
+    if "+" in s:
+        parts = [get_val(part.strip(), labels) for part in s.split("+")]
+        return None if None in parts else sum(parts)
     try:
         if "." in s:
             f_val = float(s)
@@ -46,183 +129,237 @@ def get_val(s, labels):
     except Exception as e:
         print(f"Error at value {s}: {e}")
 
-def assemble_16(line, labels):
-    parts = line.replace(",", "").split()
-    if not parts: return b""
-    
-    mnemonic = parts[0].lower()
-    opcode = isa16[mnemonic]
-
-    def reg(s):
-        return int(s.lower().replace("r", ""))
+def resolve(value, labels):
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return struct.unpack('>I', struct.pack('>f', value))[0]
+    return get_val(value.strip(), labels)
+
+LINE_RE = re.compile(r"""\s*(?:
+        (?P<label>[^\s:;]*)\s*:
+      | (?P<directive>\.(?:org|align|bits))\s+(?P<value>[^\s;]+)
+      | (?P<data>\.d[bwd])(?P<values>[^;]*)
+      | (?P<mnemonic>[^\s:;.]+)(?P<suffix>\.[^\s;]*)?\s*(?P<args>[^;]*)
+    )?""", re.X)
+REG_RE = re.compile(r"[rR](\d+)")
+INT_RE = re.compile(r"-?(?:0[xX][0-9a-fA-F]+|0[bB][01]+|0[oO][0-7]+|[1-9][0-9]*|0+)")
+FLOAT_RE = re.compile(r"-?(?:[0-9]+\.[0-9]*|\.[0-9]+)")
+PARSE_CACHE_SIZE = 4096
+
+def build_mnemonic_table(isa):
+    table = {}
+    for name in isa:
+        table[name] = (name, None, False)
+        table[f"{name}.s"] = (name, None, True)
+        for suffix, size in (("b", 8), ("w", 16), ("d", 32)):
+            table[f"{name}.{suffix}"] = (name, size, False)
+            table[f"{name}.{suffix}.s"] = (name, size, True)
+            table[f"{name}.s.{suffix}"] = (name, size, True)
+    return table
+
+MNEMONICS_32 = build_mnemonic_table(isa32)
+OPCODES_16 = {name: opcode << 4 for name, opcode in isa16.items()}
+
+def parse_value(s):
+    if INT_RE.fullmatch(s):
+        return int(s, 0)
+    if FLOAT_RE.fullmatch(s):
+        return struct.unpack('>I', struct.pack('>f', float(s)))[0]
+    return s
 
-    reg_a = reg(parts[1])
-    b1 = (opcode << 4) | (reg_a & 0x0F)
+def parse_mnemonic_32(mnemonic_full):
+    entry = MNEMONICS_32.get(mnemonic_full)
+    if entry:
+        return entry
 
-    if mnemonic in ["movi"]:
-        val = get_val(parts[2], labels)
+    size = None
+    is_signed = False
+    tokens = mnemonic_full.split('.')
+    for suffix in tokens[1:]:
+        if suffix == "b": size = 8
+        elif suffix == "w": size = 16
+        elif suffix == "d": size = 32
+        elif suffix == "s": is_signed = True
+    return tokens[0], size, is_signed
+
+def parse_operand(arg):
+    is_ptr = arg[0] == "[" and arg[-1] == "]"
+    if is_ptr:
+        arg = arg.strip("[] ")
+    m = REG_RE.fullmatch(arg)
+    if m:
+        return Reg(int(m.group(1)), is_ptr)
+    return Imm(parse_value(arg), is_ptr)
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_operands(args):
+    return tuple(parse_operand(a) for a in (a.strip() for a in args.split(",")) if a)
+
+def parse_16(line):
+    m = LINE_RE.match(line)
+    return instr_16(m) if m.group("mnemonic") else None
+
+def parse_32(line):
+    m = LINE_RE.match(line)
+    return instr_32(m) if m.group("mnemonic") else None
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_registers(args):
+    return tuple(Reg(int(part.lower().replace("r", ""))) for part in args.replace(",", " ").split())
+
+def instr_16(m):
+    mnemonic = m.group("mnemonic").lower()
+    if mnemonic == "movi":
+        return Instr(mnemonic, parse_operands(m.group("args")))
+    return Instr(mnemonic, parse_registers(m.group("args")))
+
+def instr_32(m):
+    mnemonic = m.group("mnemonic").lower()
+    suffix = m.group("suffix")
+    op, size, is_signed = parse_mnemonic_32(mnemonic + suffix if suffix else mnemonic)
+    return Instr(op, parse_operands(m.group("args")), size=size, signed=is_signed)
+
+def encode_16(instr, labels):
+    operands = instr.operands
+
+    reg_a = operands[0].num
+    b1 = OPCODES_16[instr.op] | (reg_a & 0x0F)
+
+    if instr.op == "movi":
+        val = resolve(operands[1].value, labels)
         b2 = (val >> 8) & 0xFF
         b3 = val & 0xFF
     else:
-        reg_b = reg(parts[2]) if len(parts) > 2 else 0
-        reg_c = reg(parts[3]) if len(parts) > 3 else 0
+        reg_b = operands[1].num if len(operands) > 1 else 0
+        reg_c = operands[2].num if len(operands) > 2 else 0
         b2 = (reg_b << 4) | (reg_c & 0x0F)
         b3 = 0x00
 
     return bytes([b1, b2, b3])
 
-def assemble_32(line, labels):
-    raw_parts = line.split()
-    if not raw_parts: return b""
-    
-    mnemonic_full = raw_parts[0].lower()
-
-    remaining_line = " ".join(raw_parts[1:])
-    args = [a.strip() for a in remaining_line.split(",") if a.strip()]
-
-    size = 2
-    is_signed = False
-
-    tokens = mnemonic_full.split('.')
-    mnemonic = tokens[0]
-    for suffix in tokens[1:]:
-        if suffix == "b": size = 0
-        elif suffix == "w": size = 1
-        elif suffix == "d": size = 2
-        elif suffix == "s": is_signed = True
-
-    if mnemonic not in isa32:
-        print(f"Unknown command: {mnemonic}")
+def encode_32(instr, labels):
+    if instr.op not in isa32:
+        print(f"Unknown command: {instr.op}")
         return b""
-        
-    opcode = isa32[mnemonic]
-    res = bytearray(8)
-    res[0] = opcode
-
-    use_imm = False
-    use_indirect_src = False
-    use_indirect_dest = False
-
-    def parse_arg(arg):
-        nonlocal use_indirect_src, use_indirect_dest
-        arg = arg.strip()
-        is_ptr = arg.startswith("[") and arg.endswith("]")
-        clean = arg.strip("[] ").strip() 
-        return is_ptr, clean
-
-    parsed_args = [parse_arg(a) for a in args]
 
     reg_idx = 0
     regs = [0, 0, 0]
     imm_val = 0
+    mode = 0
 
-    for i, (is_ptr, val) in enumerate(parsed_args):
-        if val.lower().startswith("r") and any(char.isdigit() for char in val):
-            r_num = int(''.join(filter(str.isdigit, val)))
-            if i == 0 and is_ptr: use_indirect_dest = True
-            elif i > 0 and is_ptr: use_indirect_src = True
+    for i, operand in enumerate(instr.operands):
+        if isinstance(operand, Reg):
             if reg_idx < 3:
-                regs[reg_idx] = r_num
+                regs[reg_idx] = operand.num
                 reg_idx += 1
         else:
-            use_imm = True
-            imm_val = get_val(val, labels)
-            if i == 0 and is_ptr: use_indirect_dest = True
-            elif i > 0 and is_ptr: use_indirect_src = True
+            mode |= 0x01
+            imm_val = resolve(operand.value, labels)
+        if operand.ptr:
+            mode |= 0x04 if i == 0 else 0x02
 
-    res[1] = (regs[0] << 4) | (regs[1] & 0x0F)
-    res[2] = (regs[2] << 4)
+    if instr.op == "jmp" and reg_idx == 1:
+        regs[2] = regs[0]
+    if instr.signed: mode |= 0x08
+    mode |= (SIZE_CODES[instr.size] << 4)
 
-    mode = 0
-    if use_imm:          mode |= 0x01
-    if use_indirect_src:  mode |= 0x02
-    if use_indirect_dest: mode |= 0x04
-    if is_signed:         mode |= 0x08
-    mode |= (size << 4)
-    res[3] = mode
-
-    res[4] = (imm_val >> 24) & 0xFF
-    res[5] = (imm_val >> 16) & 0xFF
-    res[6] = (imm_val >> 8) & 0xFF
-    res[7] = imm_val & 0xFF
-        
-    return bytes(res)
+    return struct.pack(">BBBBI", isa32[instr.op], (regs[0] << 4) | (regs[1] & 0x0F), regs[2] << 4, mode, imm_val & 0xFFFFFFFF)
+
+def assemble_16(line, labels):
+    instr = parse_16(line)
+    return encode_16(instr, labels) if instr else b""
+
+def assemble_32(line, labels):
+    instr = parse_32(line)
+    return encode_32(instr, labels) if instr else b""
+
+def parse_text(source, bits=16, keep_comments=False):
+    if isinstance(source, str):
+        source = source.splitlines()
+
+    items = []
+    for line_num, line in enumerate(source, 1):
+        if keep_comments and line.lstrip().startswith(";"):
+            items.append(Comment(line.strip()))
+            continue
+        m = LINE_RE.match(line)
+
+        if m.group("mnemonic"):
+            instr = instr_32(m) if bits == 32 else instr_16(m)
+            instr.source_line = line_num
+            items.append(instr)
+        elif m.group("data"):
+            items.append(Data(m.group("data"), [parse_value(v.strip()) for v in m.group("values").split(",")]))
+        elif m.group("directive"):
+            value = int(m.group("value"), 0)
+            if m.group("directive") == ".bits":
+                bits = value
+            items.append(Directive(m.group("directive"), value))
+        elif m.group("label") is not None:
+            items.append(Label(m.group("label")))
+
+    return items
 
 start_address = 0x200
 def assemble(filename, external_labels=None):
+    with open(filename, "r") as f:
+        return assemble_text(f, external_labels)
+
+def assemble_text(source, external_labels=None):
+    return assemble_ir(parse_text(source), external_labels)
+
+def assemble_ir(items, external_labels=None):
     labels = external_labels.copy() if external_labels else {}
     current_address = 0x200
+    start_address = 0x200
     current_bits = 16
-    lines_to_process = []
-
-    with open(filename, "r") as f:
-        for line in f:
-            line = line.strip().split(";")[0]
-            if not line: continue
-            
-            if line.startswith(".org"):
-                current_address = int(line.split()[1], 0)
+    to_process = []
+
+    for item in items:
+        if isinstance(item, Instr):
+            item_size = 8 if current_bits == 32 else 3
+            to_process.append((current_address, item, current_bits, item_size))
+            current_address += item_size
+        elif isinstance(item, Label):
+            labels[item.name] = current_address
+        elif isinstance(item, Data):
+            item_size = len(item.values) * Data.WIDTHS[item.directive]
+            to_process.append((current_address, item, current_bits, item_size))
+            current_address += item_size
+        elif isinstance(item, Directive):
+            if item.name == ".org":
+                current_address = item.value
                 start_address = current_address
-            elif line.startswith(".align"):
-                alignment = int(line.split()[1], 0)
+            elif item.name == ".align":
+                alignment = item.value
                 current_address = (current_address + alignment - 1) & ~(alignment - 1)
-            elif ":" in line:
-                label_part = line.split(":")[0].strip()
-                labels[label_part] = current_address
-                remaining = line.split(":")[1].strip()
-                if not remaining:
-                    continue
-                line = remaining
-            elif line.startswith(".db"):
-                data_parts = line[3:].split(",")
-                lines_to_process.append((current_address, line, current_bits))
-                current_address += len(data_parts)
-            elif line.startswith(".dw"):
-                data_parts = line[3:].split(",")
-                lines_to_process.append((current_address, line, current_bits))
-                current_address += len(data_parts) * 2
-            elif line.startswith(".dd"):
-                data_parts = line[3:].split(",")
-                lines_to_process.append((current_address, line, current_bits))
-                current_address += len(data_parts) * 4
-            elif line.startswith(".bits"):
-                current_bits = int(line.split()[1])
-                continue
+            elif item.name == ".bits":
+                current_bits = item.value
+
+    image_size = 0
+    for addr, item, bits, item_size in to_process:
+        image_size = max(image_size, addr - start_address + item_size)
+
+    binary = bytearray(image_size)
+    for addr, item, bits, item_size in to_process:
+        offset = addr - start_address
+
+        if isinstance(item, Data):
+            if item.directive == ".db":
+                values = [resolve(v, labels) for v in item.values]
+                struct.pack_into(f">{len(values)}B", binary, offset, *values)
+            elif item.directive == ".dw":
+                values = [resolve(v, labels) & 0xFFFF for v in item.values]
+                struct.pack_into(f">{len(values)}H", binary, offset, *values)
             else:
-                lines_to_process.append((current_address, line, current_bits))
-                current_address += 8 if current_bits == 32 else 3
-
-    binary = b""
-    for addr, line, bits in lines_to_process:
-        while len(binary) < (addr - start_address):
-            binary += b'\x00'
-
-        if line.startswith(".db"):
-            data_parts = line[3:].split(",")
-            for val_str in data_parts:
-                binary += bytes([int(val_str.strip(), 0)])
-        elif line.startswith(".dw"):
-            data_parts = line[3:].split(",")
-            for val_str in data_parts:
-                val = 0
-                val_str = val_str.strip()
-                if val_str in labels:
-                    val = labels[val_str]
-                else:
-                    val = int(val_str, 0)
-                binary += bytes([(val >> 8) & 0xFF, val & 0xFF])
-        elif line.startswith(".dd"):
-            data_parts = line[3:].split(",")
-            for val_str in data_parts:
-                val_str = val_str.strip()
-                val = labels[val_str] if val_str in labels else int(val_str, 0)
-                binary += bytes([(val >> 24) & 0xFF, (val >> 16) & 0xFF, (val >> 8) & 0xFF, val & 0xFF])
+                values = [resolve(v, labels) & 0xFFFFFFFF for v in item.values]
+                struct.pack_into(f">{len(values)}I", binary, offset, *values)
         else:
-            if bits == 32:
-                binary += assemble_32(line, labels)
-            else:
-                binary += assemble_16(line, labels)
+            code = encode_32(item, labels) if bits == 32 else encode_16(item, labels)
+            binary[offset:offset + len(code)] = code
     
+    binary = bytes(binary)
     return binary, labels
 
 if __name__ == "__main__":
@@ -238,23 +375,10 @@ if __name__ == "__main__":
     if len(bytecode) > 512:
         print(f"[Assembler Warning] {input_file} is {len(bytecode)} bytes long and too large for a single sector.")
 
-    if len(bytecode) > 0:
-        target_size = ((len(bytecode) - 1) // 512 + 1) * 512
-    else:
-        target_size = 512
-
-    padded_bytecode = bytecode.ljust(target_size, b'\x00')
-
-    disk_path = "disk.bin"
-    if not os.path.exists(disk_path):
-        potential_path = os.path.join("..", "emulator", "disk.bin")
-        if os.path.exists(potential_path):
-            disk_path = potential_path
-            
+    disk = mxdisk.DiskImage(mxdisk.find_disk())
     try:
-        with open(disk_path, "r+b") as f:
-            f.seek(target_sector * 512)
-            f.write(padded_bytecode)
-        print(f"[Success] Wrote {len(bytecode)} bytes to sector {target_sector} in {disk_path}.")
-    except FileNotFoundError:
-        print(f"[Assembler Error] disk.bin not found.")
\ No newline at end of file
+        disk.place(target_sector, bytecode)
+        disk.write()
+        print(f"[Success] Wrote {len(bytecode)} bytes to sector {target_sector} in {disk.path}.")
+    except mxdisk.DiskError as e:
+        print(f"[Assembler Error] {e.message}")
@@ -0,0 +1,273 @@
+import sys
+import os
+import io
+import contextlib
+import time
+import tempfile
+import struct
+import mxa
+
+def legacy_get_val(s, labels):
+    if s in labels:
+        return labels[s]
+    try:
+        if "." in s:
+            f_val = float(s)
+            return struct.unpack('>I', struct.pack('>f', f_val))[0]
+        return int(s, 0)
+    except Exception as e:
+        print(f"Error at value {s}: {e}")
+
+def legacy_assemble_32(line, labels):
+    raw_parts = line.split()
+    if not raw_parts: return b""
+    
+    mnemonic_full = raw_parts[0].lower()
+
+    remaining_line = " ".join(raw_parts[1:])
+    args = [a.strip() for a in remaining_line.split(",") if a.strip()]
+
+    size = 2
+    is_signed = False
+
+    tokens = mnemonic_full.split('.')
+    mnemonic = tokens[0]
+    for suffix in tokens[1:]:
+        if suffix == "b": size = 0
+        elif suffix == "w": size = 1
+        elif suffix == "d": size = 2
+        elif suffix == "s": is_signed = True
+
+    if mnemonic not in mxa.isa32:
+        print(f"Unknown command: {mnemonic}")
+        return b""
+        
+    opcode = mxa.isa32[mnemonic]
+    res = bytearray(8)
+    res[0] = opcode
+
+    use_imm = False
+    use_indirect_src = False
+    use_indirect_dest = False
+
+    def parse_arg(arg):
+        nonlocal use_indirect_src, use_indirect_dest
+        arg = arg.strip()
+        is_ptr = arg.startswith("[") and arg.endswith("]")
+        clean = arg.strip("[] ").strip() 
+        return is_ptr, clean
+
+    parsed_args = [parse_arg(a) for a in args]
+
+    reg_idx = 0
+    regs = [0, 0, 0]
+    imm_val = 0
+
+    for i, (is_ptr, val) in enumerate(parsed_args):
+        if val.lower().startswith("r") and any(char.isdigit() for char in val):
+            r_num = int(''.join(filter(str.isdigit, val)))
+            if i == 0 and is_ptr: use_indirect_dest = True
+            elif i > 0 and is_ptr: use_indirect_src = True
+            if reg_idx < 3:
+                regs[reg_idx] = r_num
+                reg_idx += 1
+        else:
+            use_imm = True
+            imm_val = legacy_get_val(val, labels)
+            if i == 0 and is_ptr: use_indirect_dest = True
+            elif i > 0 and is_ptr: use_indirect_src = True
+
+    res[1] = (regs[0] << 4) | (regs[1] & 0x0F)
+    res[2] = (regs[2] << 4)
+
+    mode = 0
+    if use_imm:          mode |= 0x01
+    if use_indirect_src:  mode |= 0x02
+    if use_indirect_dest: mode |= 0x04
+    if is_signed:         mode |= 0x08
+    mode |= (size << 4)
+    res[3] = mode
+
+    res[4] = (imm_val >> 24) & 0xFF
+    res[5] = (imm_val >> 16) & 0xFF
+    res[6] = (imm_val >> 8) & 0xFF
+    res[7] = imm_val & 0xFF
+        
+    return bytes(res)
+
+def legacy_assemble_16(line, labels):
+    parts = line.replace(",", "").split()
+    if not parts: return b""
+    
+    mnemonic = parts[0].lower()
+    opcode = mxa.isa16[mnemonic]
+
+    def reg(s):
+        return int(s.lower().replace("r", ""))
+
+    reg_a = reg(parts[1])
+    b1 = (opcode << 4) | (reg_a & 0x0F)
+
+    if mnemonic in ["movi"]:
+        val = legacy_get_val(parts[2], labels)
+        b2 = (val >> 8) & 0xFF
+        b3 = val & 0xFF
+    else:
+        reg_b = reg(parts[2]) if len(parts) > 2 else 0
+        reg_c = reg(parts[3]) if len(parts) > 3 else 0
+        b2 = (reg_b << 4) | (reg_c & 0x0F)
+        b3 = 0x00
+
+    return bytes([b1, b2, b3])
+
+def generate_asm_source(line_count):
+    lines = [".bits 32", ".org 0x400", "_start:"]
+    i = 0
+    while len(lines) < line_count:
+        k = i % 8
+        if k == 0:
+            lines.append(f"_label_{i}:")
+        elif k == 1:
+            lines.append(f"mov r{i % 14}, {hex(i & 0xFFFF)}")
+        elif k == 2:
+            lines.append(f"add r{i % 14}, r{(i + 1) % 14}")
+        elif k == 3:
+            lines.append(f"mov.d r{i % 14}, [r{(i + 2) % 14}]")
+        elif k == 4:
+            lines.append(f"jne r0, r1, _label_{i - 4}")
+        elif k == 5:
+            lines.append(".db " + ", ".join(hex((i + j) & 0xFF) for j in range(16)))
+        elif k == 6:
+            lines.append(f".dd _label_{i - 6}, {hex(i)}")
+        else:
+            lines.append(f"mov.b [r{i % 14}], r{(i + 3) % 14}")
+        i += 1
+    return "\n".join(lines) + "\n"
+
+def time_per_line(func, lines, labels, rounds, repeats=5):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for line in lines:
+                func(line, labels)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / (rounds * len(lines)) * 1e6
+
+def bench_line_parser(rounds):
+    labels = {"_loop": 0x400, "font_array": 0x1234}
+    lines_32 = [
+        "mov r0, 0x20", "mov.d r3, [r0]", "mov.b [r7], r1", "add r6, 1",
+        "jne r6, r8, _loop", "mov r1, font_array", "fmul r2, r3", "mov r4, 1.5",
+        "shl.s r2, r3", "call _loop", "push r5", "mov.w [font_array], r2",
+    ]
+    lines_16 = ["movi r1, 0x8000", "add r1, r2", "poke r3, r1, r0", "jne r1, r2, r3", "movi r15, _loop"]
+
+    for legacy, current, lines in ((legacy_assemble_32, mxa.assemble_32, lines_32), (legacy_assemble_16, mxa.assemble_16, lines_16)):
+        for line in lines:
+            if legacy(line, labels) != current(line, labels):
+                print(f"Mismatch: {line}")
+
+    print(f"{'isa':>6} {'legacy us/line':>16} {'current us/line':>16} {'speedup':>8}")
+    for name, legacy, current, lines in (("32", legacy_assemble_32, mxa.assemble_32, lines_32), ("16", legacy_assemble_16, mxa.assemble_16, lines_16)):
+        t_legacy = time_per_line(legacy, lines, labels, rounds)
+        t_current = time_per_line(current, lines, labels, rounds)
+        print(f"{name:>6} {t_legacy:>16.2f} {t_current:>16.2f} {t_legacy / t_current:>7.2f}x")
+
+def bench_tokenizer(rounds, source_file=None):
+    import mxc32
+    if source_file is None:
+        source_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MX-26301", "src", "main.c")
+    code, _ = mxc32.preprocess(source_file)
+
+    token_count = sum(1 for _ in mxc32.tokenize(code))
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in mxc32.tokenize(code):
+            pass
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    print(f"{'bytes':>10} {'tokens':>10} {'ms':>10} {'tokens/sec':>12} {'MB/sec':>8}")
+    print(f"{len(code):>10} {token_count:>10} {best * 1000:>10.2f} {token_count / best:>12.0f} {len(code) / best / 1e6:>8.2f}")
+
+def bench_assembler(sizes):
+    print(f"{'lines':>10} {'bytes':>10} {'seconds':>10} {'lines/sec':>12}")
+    for line_count in sizes:
+        source = generate_asm_source(line_count)
+
+        fd, asm_path = tempfile.mkstemp(suffix=".asm")
+        with os.fdopen(fd, "w") as f:
+            f.write(source)
+
+        try:
+            start = time.perf_counter()
+            bytecode, _ = mxa.assemble(asm_path)
+            elapsed = time.perf_counter() - start
+        finally:
+            os.remove(asm_path)
+
+        print(f"{line_count:>10} {len(bytecode):>10} {elapsed:>10.3f} {line_count / elapsed:>12.0f}")
+
+PEEPHOLE_TARGETS = (("MX-26101", "mxc16"), ("MX-26201", "mxc16"), ("MX-26301", "mxc32"))
+
+def compile_project(compiler, src_dir, opt_level):
+    import mxbuild
+    modules = mxbuild.scan_modules(compiler, mxbuild.find_modules([src_dir]))
+    pending = list(modules)
+    while pending:
+        module = next(m for m in pending if all(dep.result is not None for dep in m.deps))
+        imports = {}
+        for dep in module.deps:
+            imports.update(dep.result["exports"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            module.result = compiler.compile_source(compiler.get_combined_source(module.path), imports, True, opt_level)
+        pending.remove(module)
+    return modules
+
+def bench_peephole():
+    import importlib
+    import mxopt
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    totals = {}
+    print(f"{'source':>20} {'instrs -O0':>11} {'instrs -O1':>11} {'bytes -O0':>10} {'bytes -O1':>10} {'saved':>7}")
+    for project, compiler_name in PEEPHOLE_TARGETS:
+        compiler = importlib.import_module(compiler_name)
+        bits = 32 if compiler_name == "mxc32" else 16
+        src_dir = os.path.join(root, project, "src")
+        before = compile_project(compiler, src_dir, 0)
+        after = compile_project(compiler, src_dir, 1)
+        for m0, m1 in zip(before, after):
+            n0 = mxopt.count_instructions(mxa.parse_text(m0.result["listing"], bits))
+            n1 = mxopt.count_instructions(mxa.parse_text(m1.result["listing"], bits))
+            b0, b1 = len(m0.result["bytecode"]), len(m1.result["bytecode"])
+            print(f"{project + '/' + m0.name:>20} {n0:>11} {n1:>11} {b0:>10} {b1:>10} {(n0 - n1) / n0 * 100:>6.1f}%")
+            for name, count in m1.result["peephole"].items():
+                totals[name] = totals.get(name, 0) + count
+
+    print()
+    print(f"{'rule':>20} {'hits':>6}")
+    for name, _ in mxopt.RULES:
+        print(f"{name:>20} {totals.get(name, 0):>6}")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python mxbench.py <asm|parse|tokenize|peephole> [line counts... | rounds]")
+        sys.exit(1)
+
+    mode = sys.argv[1]
+    sizes = [int(a) for a in sys.argv[2:]]
+
+    if mode == "asm":
+        bench_assembler(sizes or [1000, 10000, 100000])
+    elif mode == "parse":
+        bench_line_parser(sizes[0] if sizes else 5000)
+    elif mode == "tokenize":
+        bench_tokenizer(sizes[0] if sizes else 20)
+    elif mode == "peephole":
+        bench_peephole()
+    else:
+        print(f"Unknown benchmark: {mode}")
+        sys.exit(1)
@@ -0,0 +1,2 @@
+@echo off
+python "%~dp0mxbuild.py" %*
\ No newline at end of file
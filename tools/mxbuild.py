@@ -0,0 +1,222 @@
+import os
+import io
+import re
+import sys
+import json
+import importlib
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import mxdisk
+
+COMPILERS = ("mxc16", "mxc32")
+
+NAME_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+LITERAL_PATTERN = re.compile(r'"[^"]*"|\'.\'')
+EXPORT_PATTERN = re.compile(r'#export\s+([A-Za-z_][A-Za-z0-9_]*)')
+DEFINITION_PATTERN = re.compile(r'\bdef\s+\w+\s+([A-Za-z_][A-Za-z0-9_]*)|\bvoid\s+([A-Za-z_][A-Za-z0-9_]*)|^\s*([A-Za-z_][A-Za-z0-9_]*):', re.M)
+INCLUDE_PATTERN = re.compile(r'#include\s+"([^"]+)"')
+SECTOR_PATTERN = re.compile(r'^\s*#sector\s', re.M)
+
+class BuildError(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self):
+        return f"\n[Build Error] {self.message}"
+
+class Module:
+    def __init__(self, path, source):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.exports = EXPORT_PATTERN.findall(source)
+        self.defined = set()
+        for m in DEFINITION_PATTERN.finditer(source):
+            self.defined.add(m.group(1) or m.group(2) or m.group(3))
+        self.referenced = set(NAME_PATTERN.findall(LITERAL_PATTERN.sub(" ", source))) - self.defined
+        self.deps = set()
+        self.result = None
+
+def find_modules(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(".c"))
+        else:
+            files.append(path)
+
+    included = set()
+    roots = []
+    for path in files:
+        with open(path, "r") as f:
+            code = f.read()
+        for name in INCLUDE_PATTERN.findall(code):
+            included.add(os.path.normpath(os.path.join(os.path.dirname(path), name)))
+        if SECTOR_PATTERN.search(code):
+            roots.append(path)
+
+    return [path for path in roots if os.path.normpath(path) not in included]
+
+def scan_modules(compiler, paths):
+    modules = [Module(path, compiler.get_combined_source(path)) for path in paths]
+
+    exporters = {}
+    for module in modules:
+        for name in module.exports:
+            if name in exporters:
+                raise BuildError(f"'{name}' is exported by both {exporters[name].name} and {module.name}.")
+            exporters[name] = module
+
+    for module in modules:
+        for name in module.referenced:
+            exporter = exporters.get(name)
+            if exporter is not None and exporter is not module:
+                module.deps.add(exporter)
+
+    return modules
+
+def compile_module(compiler_name, path, external_symbols, use_cache, options):
+    compiler = importlib.import_module(compiler_name)
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            result = compiler.compile_file(path, external_symbols, use_cache=use_cache, **options)
+    except compiler.CompilerError as e:
+        return None, output.getvalue() + str(e).lstrip("\n") + "\n"
+    except Exception as e:
+        return None, output.getvalue() + f"[Fatal Error] {e}\n"
+
+    missing = [name for name in result["export_list"] if name not in result["exports"]]
+    if missing:
+        return None, output.getvalue() + f"[Compiler Error] Export-Label '{missing[0]}' was not found in source code.\n"
+    return result, output.getvalue()
+
+def build(compiler_name, modules, external_symbols, use_cache=True, jobs=None, options=None):
+    options = options or {}
+    pending = set(modules)
+    running = {}
+    failed = False
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            if not failed:
+                for module in sorted(pending, key=lambda m: m.name):
+                    if all(dep.result is not None for dep in module.deps):
+                        imports = dict(external_symbols)
+                        for dep in module.deps:
+                            imports.update(dep.result["exports"])
+                        running[pool.submit(compile_module, compiler_name, module.path, imports, use_cache, options)] = module
+                        pending.discard(module)
+
+            if not running:
+                if pending and not failed:
+                    names = ", ".join(sorted(m.name for m in pending))
+                    raise BuildError(f"Circular export/import dependency between: {names}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                module = running.pop(future)
+                result, output = future.result()
+                print(f"--- {module.name} ---")
+                print(output, end="")
+                if result is None:
+                    failed = True
+                else:
+                    module.result = result
+
+    if failed:
+        raise BuildError("Build failed.")
+
+def place_modules(disk, modules):
+    for module in modules:
+        try:
+            disk.place(module.result["sector"], module.result["bytecode"], module.result["sectors"], module.name)
+        except mxdisk.DiskError as e:
+            raise BuildError(e.message)
+    try:
+        disk.check()
+    except mxdisk.DiskError as e:
+        raise BuildError(e.message)
+
+def option_value(args, name):
+    idx = args.index(name)
+    if idx + 1 >= len(args):
+        raise BuildError(f"Missing value for {name}.")
+    value = args[idx + 1]
+    del args[idx:idx + 2]
+    return value
+
+def int_option(args, name, minimum=0):
+    value = option_value(args, name)
+    if not value.isdigit() or int(value) < minimum:
+        raise BuildError(f"Invalid value '{value}' for {name}. Usage: {name} <n> with n >= {minimum}.")
+    return int(value)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in COMPILERS:
+        print("Usage: python mxbuild.py <mxc16|mxc32> <source dir | files...> [flags]")
+        print("Flags: -n, -no-cache, -O0, -O1, -stack-args (mxc32), -inline-limit <n> (mxc32), -j <jobs>, -disk <file>, -import <file>, -export-dir <dir>")
+        sys.exit(1)
+
+    compiler_name = sys.argv[1]
+    args = sys.argv[2:]
+
+    try:
+        jobs = int_option(args, "-j", minimum=1) if "-j" in args else None
+        disk_path = option_value(args, "-disk") if "-disk" in args else None
+        import_file = option_value(args, "-import") if "-import" in args else None
+        export_dir = option_value(args, "-export-dir") if "-export-dir" in args else None
+        inline_limit = int_option(args, "-inline-limit") if "-inline-limit" in args else None
+        flags = {a for a in args if a.startswith("-")}
+        sources = [a for a in args if not a.startswith("-")]
+
+        external_symbols = {}
+        if import_file:
+            try:
+                with open(import_file, "r") as f:
+                    external_symbols = json.load(f)
+            except (OSError, ValueError):
+                raise BuildError(f"Could not load symbol file {import_file}.")
+
+        compiler = importlib.import_module(compiler_name)
+        modules = scan_modules(compiler, find_modules(sources))
+        if not modules:
+            raise BuildError("No modules with a #sector directive found.")
+
+        for module in modules:
+            deps = ", ".join(sorted(d.name for d in module.deps)) or "-"
+            print(f"[Info] {module.name} depends on: {deps}")
+
+        options = {"opt_level": 0 if "-O0" in flags else 1}
+        if compiler_name == "mxc32":
+            options["reg_args"] = "-stack-args" not in flags
+            if inline_limit is not None:
+                options["inline_limit"] = inline_limit
+        build(compiler_name, modules, external_symbols, use_cache="-no-cache" not in flags, jobs=jobs, options=options)
+
+        if export_dir:
+            os.makedirs(export_dir, exist_ok=True)
+            for module in modules:
+                if module.exports:
+                    h_file = os.path.join(export_dir, os.path.splitext(module.name)[0] + ".json")
+                    with open(h_file, "w") as f:
+                        json.dump(module.result["exports"], f)
+                    print(f"[Success] {len(module.result['exports'])} symbols exported to {h_file}.")
+
+        disk = mxdisk.DiskImage(disk_path or mxdisk.find_disk(sources))
+        place_modules(disk, modules)
+
+        if "-n" in flags:
+            print(f"[Info] Dry run: disk.bin was not modified.")
+        else:
+            try:
+                disk.write()
+            except mxdisk.DiskError as e:
+                raise BuildError(e.message)
+            for module in sorted(modules, key=lambda m: m.result["sector"]):
+                print(f"[Success] Wrote {len(module.result['bytecode'])} bytes of {module.name} to sector {module.result['sector']}.")
+
+    except BuildError as e:
+        print(e)
+        sys.exit(1)
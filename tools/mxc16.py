@@ -1,8 +1,14 @@
 import os
+import io
+import contextlib
 import datetime
 import sys
 import re
-from mxa import assemble
+import mxa
+import mxcache
+import mxopt
+import mxdisk
+from mxa import assemble_text, assemble_ir, format_asm, parse_text
 
 class CompilerError(Exception):
     def __init__(self, message, line=None, token=None):
@@ -124,6 +130,13 @@ class WhileNode:
         self.block = block
         self.source_line = source_line
 
+class SwitchNode:
+    def __init__(self, value, cases, default=None, source_line=None):
+        self.value = value
+        self.cases = cases
+        self.default = default
+        self.source_line = source_line
+
 class GlobalVarNode:
     def __init__(self, name, size, value, source_line=None):
         self.name = name
@@ -137,185 +150,281 @@ class ArrayNode:
         self.size = size
         self.source_line = source_line
 
+TOKEN_NAMES = ['STRUCT', 'DEF', 'ASM', 'TYPE', 'DIRECTIVE', 'NUMBER', 'IF', 'WHILE', 'ELSE', 'SWITCH', 'CASE', 'EQ', 'NE', 'LE', 'GE', 'LT', 'GT', 'ASSIGN', 'DEREF', 'OP', 'SEMICOLON', 'LBRACE', 'RBRACE', 'LBRACK', 'RBRACK', 'LPAREN', 'RPAREN', 'GOTO', 'OUT', 'FN', 'RETURN', 'CHAR', 'STRING', 'LABEL', 'NAME', 'COMMA', 'COLON', 'WHITESPACE', 'MISMATCH']
+(STRUCT, DEF, ASM, TYPE, DIRECTIVE, NUMBER, IF, WHILE, ELSE, SWITCH, CASE, EQ, NE, LE, GE, LT, GT, ASSIGN, DEREF, OP, SEMICOLON, LBRACE, RBRACE, LBRACK, RBRACK, LPAREN, RPAREN, GOTO, OUT, FN, RETURN, CHAR, STRING, LABEL, NAME, COMMA, COLON, WHITESPACE, MISMATCH) = range(len(TOKEN_NAMES))
+
+KEYWORDS = {
+    'struct': STRUCT, 'def': DEF, 'asm': ASM, 'if': IF, 'while': WHILE, 'else': ELSE,
+    'switch': SWITCH, 'case': CASE,
+    'goto': GOTO, 'out': OUT, 'void': FN, 'return': RETURN,
+    'uint8': TYPE, 'uint16': TYPE,
+}
+
 TOKEN_SPEC = [
-    ('STRUCT',       r'struct\b'),
-    ('DEF',       r'def\b'),
-    ('ASM',       r'asm\b'),
-    ('TYPE',       r'uint8\b|uint16\b'),
-    ('DIRECTIVE', r'#[A-Za-z_]+'),
-    ('NUMBER',    r'(0x[0-9A-Fa-f]+|\d+)'),
-    ('IF',        r'if\b'),
-    ('WHILE',        r'while\b'),
-    ('ELSE',       r'else\b'),
-    ('EQ',        r'=='),
-    ('NE',        r'!='),
-    ('LE', r'<='),
-    ('GE', r'>='),
-    ('LT', r'<'),
-    ('GT', r'>'),
-    ('ASSIGN',    r'='),
-    ('DEREF',     r'\$'),
-    ('OP',        r'[+\-*/%]'),
-    ('SEMICOLON', r';'),
-    ('LBRACE',    r'\{'),
-    ('RBRACE',    r'\}'),
-    ('LBRACK',    r'\['),
-    ('RBRACK',    r'\]'),
-    ('LPAREN',    r'\('),
-    ('RPAREN',    r'\)'),
-    ('GOTO',      r'goto'),
-    ('OUT', r'out\b'),
-    ('FN',      r'void\b'),
-    ('RETURN',  r'return\b'),
-    ('CHAR', r"'.'"),
-    ('STRING',     r'"[^"]*"'),
-    ('LABEL',     r'[A-Za-z_][A-Za-z0-9_]*:'),
-    ('NAME',      r'[A-Za-z_][A-Za-z0-9_]*'),
-    ('COMMA',     r','),
-    ('WHITESPACE', r'\s+'),
+    (WHITESPACE, r'\s+'),
+    (LABEL,     r'[A-Za-z_][A-Za-z0-9_]*:'),
+    (NAME,      r'[A-Za-z_][A-Za-z0-9_]*'),
+    (NUMBER,    r'0x[0-9A-Fa-f]+|\d+'),
+    (COMMA,     r','),
+    (COLON,     r':'),
+    (SEMICOLON, r';'),
+    (LPAREN,    r'\('),
+    (RPAREN,    r'\)'),
+    (DEREF,     r'\$'),
+    (DIRECTIVE, r'#[A-Za-z_]+'),
+    (EQ,        r'=='),
+    (NE,        r'!='),
+    (LE, r'<='),
+    (GE, r'>='),
+    (LT, r'<'),
+    (GT, r'>'),
+    (ASSIGN,    r'='),
+    (OP,        r'[+\-*/%]'),
+    (LBRACE,    r'\{'),
+    (RBRACE,    r'\}'),
+    (LBRACK,    r'\['),
+    (RBRACK,    r'\]'),
+    (CHAR, r"'.'"),
+    (STRING,     r'"[^"]*"'),
+    (MISMATCH,  r'.'),
 ]
 
+TOKEN_REGEX = re.compile('|'.join('(%s)' % pattern for _, pattern in TOKEN_SPEC))
+GROUP_KINDS = [None] + [kind for kind, _ in TOKEN_SPEC]
+
 def strip_comments(code):
     code = re.sub(r'/\*.*?\*/', lambda m: '\n' * m.group().count('\n'), code, flags=re.DOTALL)
     code = re.sub(r'//.*', '', code)
     return code
 
-def get_combined_source(filepath):
-    if not os.path.exists(filepath):
-        print(f"[Warning] File {filepath} not found!")
-        return f"// Error: {filepath} not found"
+INCLUDE_PATTERN = re.compile(r'#include\s+"([^"]+)"')
 
-    with open(filepath, "r") as f:
-        code = f.read()
+include_cache = {}
 
-    code = strip_comments(code)
+def find_include_guard(code):
+    lines = [line.strip() for line in code.split("\n") if line.strip()]
+    if len(lines) < 3 or not lines[0].startswith("#ifndef") or not lines[-1].startswith("#endif"):
+        return None
 
-    include_pattern = r'#include\s+"([^"]+)"'
-    
-    def replace_match(match):
-        filename = match.group(1)
-        full_path = os.path.join(os.path.dirname(filepath), filename)
-        return get_combined_source(full_path)
+    parts = lines[0].split()
+    if len(parts) != 2 or lines[1].split()[:2] != ["#define", parts[1]]:
+        return None
 
-    code = re.sub(include_pattern, replace_match, code)
-    return code
+    depth = 0
+    for i, line in enumerate(lines):
+        if line.startswith("#ifdef") or line.startswith("#ifndef"):
+            depth += 1
+        elif line.startswith("#endif"):
+            depth -= 1
+            if depth == 0 and i != len(lines) - 1:
+                return None
+    return parts[1]
+
+def split_includes(code, guarded):
+    parts = []
+    text = []
+    depth = 0
+    for line in code.split("\n"):
+        stripped = line.strip()
+        if stripped.startswith("#ifdef") or stripped.startswith("#ifndef"):
+            depth += 1
+        elif stripped.startswith("#endif"):
+            depth -= 1
+
+        if "#include" in line:
+            pos = 0
+            for m in INCLUDE_PATTERN.finditer(line):
+                text.append(line[pos:m.start()])
+                parts.append("".join(text))
+                parts.append((m.group(1), depth == (1 if guarded else 0)))
+                text = []
+                pos = m.end()
+            line = line[pos:]
+        text.append(line)
+        text.append("\n")
+
+    text.pop()
+    parts.append("".join(text))
+    return parts
+
+def load_source(filepath):
+    path = os.path.abspath(filepath)
+    mtime = os.path.getmtime(path)
+    entry = include_cache.get(path)
+    if entry is None or entry[0] != mtime:
+        with open(path, "r") as f:
+            code = strip_comments(f.read())
+        guard = find_include_guard(code)
+        entry = (mtime, guard, split_includes(code, guard is not None))
+        include_cache[path] = entry
+    return entry[1], entry[2]
+
+def get_combined_source(filepath, seen_guards=None, unconditional=True):
+    if not os.path.exists(filepath):
+        print(f"[Warning] File {filepath} not found!")
+        return f"// Error: {filepath} not found"
+
+    guard, parts = load_source(filepath)
+    if seen_guards is None:
+        seen_guards = set()
+    if guard is not None:
+        if guard in seen_guards:
+            return ""
+        if unconditional:
+            seen_guards.add(guard)
+
+    code = []
+    for part in parts:
+        if isinstance(part, str):
+            code.append(part)
+        else:
+            filename, top_level = part
+            full_path = os.path.join(os.path.dirname(filepath), filename)
+            code.append(get_combined_source(full_path, seen_guards, unconditional and top_level))
+    return "".join(code)
+
+WORD_PATTERN = re.compile(r'\w+')
+LOGIC_DIRECTIVE_PATTERN = re.compile(r'#(export|info|debug|warn|error)\s+(.*)')
+EXPORT_NAME_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+MESSAGE_PATTERN = re.compile(r'"([^"]+)"')
+MESSAGE_LEVELS = {"info": "[Info]", "debug": "[Debug]", "warn": "[Warning]"}
+WHILE_JUMPS = {"==": ("je", False), "!=": ("jne", False), "<": ("jlt", False), ">": ("jge", False), ">=": ("jge", False), "<=": ("jge", True)}
+LINEAR_SWITCH_CASES = 3
+JUMP_TABLE_MIN_CASES = 6
 
 def handle_conditionals_and_defines(code):
     lines = code.splitlines()
     output = []
     defines = {}
+    directives = []
     active_stack = [True]
     condition_met_stack = [True]
 
     for line_num, line in enumerate(lines, 1):
         stripped = line.strip()
 
-        if stripped.startswith("#define") and active_stack[-1]:
-            parts = stripped.split()
-            if len(parts) >= 2:
-                name = parts[1]
-                value = " ".join(parts[2:]) if len(parts) > 2 else ""
-                defines[name] = value
-            continue
-
-        if stripped.startswith("#ifdef"):
-            name = stripped.split()[1] if len(stripped.split()) > 1 else ""
-            met = (name in defines)
-            condition_met_stack.append(met)
-            active_stack.append(met and active_stack[-1])
-            continue
-            
-        elif stripped.startswith("#ifndef"):
-            name = stripped.split()[1] if len(stripped.split()) > 1 else ""
-            met = (name not in defines)
-            condition_met_stack.append(met)
-            active_stack.append(met and active_stack[-1])
-            continue
-
-        elif stripped.startswith("#else"):
-            if len(active_stack) <= 1:
-                raise CompilerError(f"Line {line_num}: #else without #ifdef/#ifndef")
-            last_met = condition_met_stack[-1]
-            parent_active = active_stack[-2]
-            active_stack[-1] = (not last_met) and parent_active
-            continue
-
-        elif stripped.startswith("#endif"):
-            if len(active_stack) <= 1:
-                raise CompilerError(f"Line {line_num}: #endif without matching #ifdef")
-            active_stack.pop()
-            condition_met_stack.pop()
-            continue
+        if stripped[:1] == "#":
+            if stripped.startswith("#define") and active_stack[-1]:
+                parts = stripped.split()
+                if len(parts) >= 2:
+                    name = parts[1]
+                    value = " ".join(parts[2:]) if len(parts) > 2 else ""
+                    defines[name] = value
+                continue
+
+            if stripped.startswith("#ifdef"):
+                name = stripped.split()[1] if len(stripped.split()) > 1 else ""
+                met = (name in defines)
+                condition_met_stack.append(met)
+                active_stack.append(met and active_stack[-1])
+                continue
+                
+            elif stripped.startswith("#ifndef"):
+                name = stripped.split()[1] if len(stripped.split()) > 1 else ""
+                met = (name not in defines)
+                condition_met_stack.append(met)
+                active_stack.append(met and active_stack[-1])
+                continue
+
+            elif stripped.startswith("#else"):
+                if len(active_stack) <= 1:
+                    raise CompilerError(f"Line {line_num}: #else without #ifdef/#ifndef")
+                last_met = condition_met_stack[-1]
+                parent_active = active_stack[-2]
+                active_stack[-1] = (not last_met) and parent_active
+                continue
+
+            elif stripped.startswith("#endif"):
+                if len(active_stack) <= 1:
+                    raise CompilerError(f"Line {line_num}: #endif without matching #ifdef")
+                active_stack.pop()
+                condition_met_stack.pop()
+                continue
 
         if active_stack[-1]:
+            if "#" in line:
+                m = LOGIC_DIRECTIVE_PATTERN.search(line)
+                if m:
+                    directives.append((m.group(1), m.group(2)))
+                    line = line[:m.start()]
             output.append(line)
 
     if len(active_stack) > 1:
         raise CompilerError("Missing #endif at end of file.")
 
-    return "\n".join(output), defines
+    return "\n".join(output), defines, directives
 
-def apply_defines(code, defines):
-    for name in sorted(defines.keys(), key=len, reverse=True):
-        value = defines[name]
-        code = re.sub(r'\b' + re.escape(name) + r'\b', value, code)
+def build_define_table(defines):
+    table = {}
+    fallback = []
+    for name in reversed(sorted(defines.keys(), key=len, reverse=True)):
+        if WORD_PATTERN.fullmatch(name):
+            table[name] = apply_defines(defines[name], table)
+        else:
+            fallback.append((name, defines[name]))
+    return table, fallback[::-1]
+
+def apply_defines(code, table, fallback=()):
+    if table:
+        get = table.get
+        code = WORD_PATTERN.sub(lambda m: get(m[0], m[0]), code)
+    for name, value in fallback:
+        code = re.sub(r'\b' + re.escape(name) + r'\b', lambda m: value, code)
     return code
 
-def process_logic_directives(code):
-    exports = re.findall(r'#export\s+([A-Za-z_][A-Za-z0-9_]*)', code)
+def process_logic_directives(directives, table, fallback):
+    exports = []
+    messages = {level: [] for level in MESSAGE_LEVELS}
+    errors = []
 
-    levels = {"#info": "[Info]", "#debug": "[Debug]", "#warn": "[Warning]"}
-    for prefix, tag in levels.items():
-        messages = re.findall(rf'{prefix}\s+"([^"]+)"', code)
-        for msg in messages:
+    for kind, text in directives:
+        text = apply_defines(text, table, fallback)
+        if kind == "export":
+            m = EXPORT_NAME_PATTERN.match(text)
+            if m: exports.append(m.group())
+            continue
+        m = MESSAGE_PATTERN.match(text)
+        if not m: continue
+        if kind == "error":
+            errors.append(m.group(1))
+        else:
+            messages[kind].append(m.group(1))
+
+    for level, tag in MESSAGE_LEVELS.items():
+        for msg in messages[level]:
             print(f"{tag} {msg}")
 
-    errors = re.findall(r'#error\s+"([^"]+)"', code)
     if errors:
         raise CompilerError(f"[FATAL] #error: {errors[0]}")
 
-    clean_code = re.sub(r'#(export|info|debug|warn|error)\s+.*', '', code)
-    
-    return clean_code, exports
+    return exports
 
-def preprocess(main_file):
-    code = get_combined_source(main_file)
-    code, defines = handle_conditionals_and_defines(code)
-    code = apply_defines(code, defines)
-    final_source, export_list = process_logic_directives(code)
+def preprocess(main_file, code=None):
+    if code is None:
+        code = get_combined_source(main_file)
+    code, defines, directives = handle_conditionals_and_defines(code)
+    table, fallback = build_define_table(defines)
+    final_source = apply_defines(code, table, fallback)
+    export_list = process_logic_directives(directives, table, fallback)
     
     return final_source, export_list
 
 def tokenize(code):
-    tokens = []
     line_num = 1
-    last_pos = 0
+    keywords = KEYWORDS
+    kinds = GROUP_KINDS
 
-    tok_regex = '|'.join('(?P<%s>%s)' % pair for pair in TOKEN_SPEC)
-    for mo in re.finditer(tok_regex, code):
-        kind = mo.lastgroup
+    for mo in TOKEN_REGEX.finditer(code):
+        kind = kinds[mo.lastindex]
         value = mo.group()
-        start_pos = mo.start()
-
-        if start_pos > last_pos:
-            skipped = code[last_pos:start_pos]
-            if skipped.strip():
-                bad_char = skipped.strip()[0]
-                raise CompilerError(f"Illegal character: '{bad_char}'", line=line_num)
-
-        if kind == 'WHITESPACE':
+        if kind == WHITESPACE:
             line_num += value.count('\n')
-        else:
-            tokens.append((kind, value, line_num))
-        
-        last_pos = mo.end()
-
-    if last_pos < len(code):
-        remaining = code[last_pos:].strip()
-        if remaining:
-            raise CompilerError(f"Illegal character at end: '{remaining[0]}'", line=line_num)
-
-    return tokens
+            continue
+        if kind == NAME:
+            kind = keywords.get(value, NAME)
+        elif kind == MISMATCH:
+            raise CompilerError(f"Illegal character: '{value}'", line=line_num)
+        yield (kind, value, line_num)
 
 class RegisterManager:
     def __init__(self):
@@ -347,8 +456,11 @@ class RegisterManager:
 
 class Parser:
     def __init__(self, tokens, full_source, external_symbols=None):
-        self.tokens = tokens
-        self.pos = 0
+        self.tokens = iter(tokens)
+        self.current = next(self.tokens, None)
+        self.following = None
+        self.has_following = False
+        self.last_line = None
         self.source_lines = full_source.split('\n')
         self.external_symbols = external_symbols if external_symbols else {}
         self.defined_globals = set()
@@ -363,18 +475,28 @@ class Parser:
         token = self.peek_token()
         if token:
             raise CompilerError(message, line=token[2], token=token[1])
-        last_line = self.tokens[-1][2] if self.tokens else None
-        raise CompilerError(message, line=last_line)
+        raise CompilerError(message, line=self.last_line)
 
     def peek_token(self):
-        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+        return self.current
+
+    def peek_next_token(self):
+        if not self.has_following:
+            self.following = next(self.tokens, None)
+            self.has_following = True
+        return self.following
 
     def eat(self, expected_type=None):
-        token = self.peek_token()
+        token = self.current
         if not token: self.error("Unexpected ending. Perhaps a bracket is missing.")
-        if expected_type and token[0] != expected_type:
-            self.error(f"Expected {expected_type}, got {token[0]}.")
-        self.pos += 1
+        if expected_type is not None and token[0] != expected_type:
+            self.error(f"Expected {TOKEN_NAMES[expected_type]}, got {TOKEN_NAMES[token[0]]}.")
+        if self.has_following:
+            self.current = self.following
+            self.has_following = False
+        else:
+            self.current = next(self.tokens, None)
+        self.last_line = token[2]
         return token
 
     def parse_factor(self, size=None):
@@ -382,33 +504,33 @@ class Parser:
         t = self.peek_token()
         if not t: return None
 
-        if t[0] == 'STRING':
-            val = self.eat('STRING')[1]
+        if t[0] == STRING:
+            val = self.eat(STRING)[1]
             val = val.strip('"').replace('\\n', '\n').replace('\\r', '\r').replace('\\t', '\t')
             return StringNode(val)
 
-        if t[0] == 'TYPE':
-            type_str = self.eat('TYPE')[1]
+        if t[0] == TYPE:
+            type_str = self.eat(TYPE)[1]
             current_size = 8 if type_str == 'uint8' else 16
             t = self.peek_token()
 
-        if t[0] == 'LPAREN':
-            self.eat('LPAREN')
+        if t[0] == LPAREN:
+            self.eat(LPAREN)
             node = self.parse_expression()
-            self.eat('RPAREN')
+            self.eat(RPAREN)
             return node
 
-        if t[0] == 'CHAR':
-            val = ord(self.eat('CHAR')[1][1])
+        if t[0] == CHAR:
+            val = ord(self.eat(CHAR)[1][1])
             return NumberNode(val, size=8)
-        elif t[0] == 'DEREF':
+        elif t[0] == DEREF:
             if current_size is None:
                 self.error("Explicit type required before dereference.")
-            self.eat('DEREF')
+            self.eat(DEREF)
             addr = self.parse_factor(size=16) 
             return DerefNode(addr, size=current_size)
-        elif t[0] == 'NUMBER':
-            val_str = self.eat('NUMBER')[1]
+        elif t[0] == NUMBER:
+            val_str = self.eat(NUMBER)[1]
             if current_size is None: current_size = 16 
             try:
                 val_int = int(val_str, 0)
@@ -416,26 +538,26 @@ class Parser:
                 val_int = 0
             return NumberNode(val_int, size=current_size)
 
-        if t[0] == 'NAME':
-            name = self.eat('NAME')[1]
-            if self.peek_token() and self.peek_token()[0] == 'LPAREN':
-                self.eat('LPAREN')
+        if t[0] == NAME:
+            name = self.eat(NAME)[1]
+            if self.peek_token() and self.peek_token()[0] == LPAREN:
+                self.eat(LPAREN)
                 args = []
-                if self.peek_token() and self.peek_token()[0] != 'RPAREN':
+                if self.peek_token() and self.peek_token()[0] != RPAREN:
                     args.append(self.parse_expression())
-                    while self.peek_token() and self.peek_token()[0] == 'COMMA':
-                        self.eat('COMMA')
+                    while self.peek_token() and self.peek_token()[0] == COMMA:
+                        self.eat(COMMA)
                         args.append(self.parse_expression())
-                self.eat('RPAREN')
+                self.eat(RPAREN)
                 return CallNode(name, args)
 
             node = NumberNode(name, size=16)
 
-            if self.peek_token() and self.peek_token()[0] == 'LBRACK':
-                while self.peek_token() and self.peek_token()[0] == 'LBRACK':
-                    self.eat('LBRACK')
+            if self.peek_token() and self.peek_token()[0] == LBRACK:
+                while self.peek_token() and self.peek_token()[0] == LBRACK:
+                    self.eat(LBRACK)
                     index_expr = self.parse_expression()
-                    self.eat('RBRACK')
+                    self.eat(RBRACK)
 
                     if current_size == 16:
                         index_expr = BinOpNode(index_expr, '*', NumberNode(2, size=16))
@@ -449,8 +571,8 @@ class Parser:
 
     def parse_expression(self, size=None):
         node = self.parse_factor(size=size)
-        while self.peek_token() and self.peek_token()[0] == 'OP':
-            op = self.eat('OP')[1]
+        while self.peek_token() and self.peek_token()[0] == OP:
+            op = self.eat(OP)[1]
             node = BinOpNode(node, op, self.parse_factor(size=size))
         return node
 
@@ -460,21 +582,21 @@ class Parser:
 
         current_line_text = self.get_source_comment(t[2])
 
-        if t[0] == 'DEF':
+        if t[0] == DEF:
             if self.nesting_level > 0:
                 self.error("Can't define global variables inside nested blocks.")
 
-            self.eat('DEF')
-            type_token = self.eat('TYPE')
+            self.eat(DEF)
+            type_token = self.eat(TYPE)
             size = 8 if type_token[1] == 'uint8' else 16
 
-            var_name = self.eat('NAME')[1]
+            var_name = self.eat(NAME)[1]
 
             explicit_array_size = None
-            if self.peek_token() and self.peek_token()[0] == 'LBRACK':
-                self.eat('LBRACK')
-                explicit_array_size = int(self.eat('NUMBER')[1], 0)
-                self.eat('RBRACK')
+            if self.peek_token() and self.peek_token()[0] == LBRACK:
+                self.eat(LBRACK)
+                explicit_array_size = int(self.eat(NUMBER)[1], 0)
+                self.eat(RBRACK)
 
             if var_name in self.defined_globals:
                 self.error(f"Variable '{var_name}' already exists.")
@@ -484,17 +606,17 @@ class Parser:
             val_node = None
             next_t = self.peek_token()
 
-            if next_t and next_t[0] == 'ASSIGN':
-                self.eat('ASSIGN')
-                if self.peek_token() and self.peek_token()[0] == 'LBRACE':
-                    self.eat('LBRACE')
+            if next_t and next_t[0] == ASSIGN:
+                self.eat(ASSIGN)
+                if self.peek_token() and self.peek_token()[0] == LBRACE:
+                    self.eat(LBRACE)
                     elements = []
-                    if self.peek_token() and self.peek_token()[0] != 'RBRACE':
+                    if self.peek_token() and self.peek_token()[0] != RBRACE:
                         elements.append(self.parse_expression(size=size))
-                        while self.peek_token() and self.peek_token()[0] == 'COMMA':
-                            self.eat('COMMA')
+                        while self.peek_token() and self.peek_token()[0] == COMMA:
+                            self.eat(COMMA)
                             elements.append(self.parse_expression(size=size))
-                    self.eat('RBRACE')
+                    self.eat(RBRACE)
 
                     if explicit_array_size is not None:
                         while len(elements) < explicit_array_size:
@@ -511,7 +633,7 @@ class Parser:
             else:
                 val_node = NumberNode(0, size=size, source_line=current_line_text)
 
-            self.eat('SEMICOLON')
+            self.eat(SEMICOLON)
 
             total_bits = size
             if isinstance(val_node, ArrayNode):
@@ -519,52 +641,52 @@ class Parser:
 
             return GlobalVarNode(var_name, total_bits, val_node, source_line=current_line_text)
 
-        if t[0] == 'ASM':
-            self.eat('ASM')
-            self.eat('LBRACE')
+        if t[0] == ASM:
+            self.eat(ASM)
+            self.eat(LBRACE)
             asm_content = ""
-            while self.peek_token() and self.peek_token()[0] != 'RBRACE':
+            while self.peek_token() and self.peek_token()[0] != RBRACE:
                 token_type, token_value, _ = self.eat()
                 
-                if token_type == 'SEMICOLON':
+                if token_type == SEMICOLON:
                     asm_content += "\n"
-                elif token_type == 'LABEL':
+                elif token_type == LABEL:
                     asm_content += token_value.strip() + "\n"
                 else:
                     asm_content += token_value + " "
             
-            self.eat('RBRACE')
+            self.eat(RBRACE)
             return InlineAsmNode(asm_content, source_line=current_line_text)
 
-        if t[0] == 'FN':
-            fn_token = self.eat('FN')
+        if t[0] == FN:
+            fn_token = self.eat(FN)
             start_line = fn_token[2]
-            name = self.eat('NAME')[1]
-            self.eat('LPAREN')
+            name = self.eat(NAME)[1]
+            self.eat(LPAREN)
             params = []
-            if self.peek_token()[0] != 'RPAREN':
+            if self.peek_token()[0] != RPAREN:
                 param_token = self.peek_token()
-                if param_token[0] == 'NAME' or param_token[0] == 'NUMBER':
+                if param_token[0] == NAME or param_token[0] == NUMBER:
                     params.append(self.eat()[1])
-                while self.peek_token()[0] == 'COMMA':
-                    self.eat('COMMA')
+                while self.peek_token()[0] == COMMA:
+                    self.eat(COMMA)
                     next_param = self.peek_token()
-                    if next_param[0] in ['NAME', 'NUMBER']:
+                    if next_param[0] in [NAME, NUMBER]:
                         params.append(self.eat()[1])
                     else:
                         self.error("Expected parameter name or number")
-            self.eat('RPAREN')
-            self.eat('LBRACE')
+            self.eat(RPAREN)
+            self.eat(LBRACE)
             self.nesting_level += 1
 
             block = []
-            while self.peek_token() and self.peek_token()[0] != 'RBRACE':
+            while self.peek_token() and self.peek_token()[0] != RBRACE:
                 block.append(self.parse_statement())
             
-            if not self.peek_token() or self.peek_token()[0] != 'RBRACE':
+            if not self.peek_token() or self.peek_token()[0] != RBRACE:
                 raise CompilerError(f"Unclosed function '{name}'. Started in line {start_line}", line=start_line)
 
-            self.eat('RBRACE')
+            self.eat(RBRACE)
             self.nesting_level -= 1
 
             def check_for_return(stmts):
@@ -573,83 +695,91 @@ class Parser:
                     if isinstance(s, IfNode):
                         if check_for_return(s.block): return True
                         if s.else_block and check_for_return(s.else_block): return True
+                    if isinstance(s, SwitchNode):
+                        if any(check_for_return(b) for _, b in s.cases): return True
+                        if s.default and check_for_return(s.default): return True
                 return False
 
             if not check_for_return(block): self.error(f"Missing return at function '{name}'.")
 
             return FunctionDefNode(name, params, block, source_line=current_line_text)
 
-        if t[0] == 'RETURN':
-            self.eat('RETURN')
+        if t[0] == RETURN:
+            self.eat(RETURN)
             value_node = None
-            if self.peek_token() and self.peek_token()[0] != 'SEMICOLON':
+            if self.peek_token() and self.peek_token()[0] != SEMICOLON:
                 value_node = self.parse_expression()
-            self.eat('SEMICOLON')
+            self.eat(SEMICOLON)
             return ReturnNode(value_node, source_line=current_line_text)
 
-        if t[0] == 'NAME':
-            next_t = self.tokens[self.pos + 1] if self.pos + 1 < len(self.tokens) else None
-            if next_t and next_t[0] == 'LPAREN':
-                name = self.eat('NAME')[1]
-                self.eat('LPAREN')
+        if t[0] == NAME:
+            next_t = self.peek_next_token()
+            if next_t and next_t[0] == LPAREN:
+                name = self.eat(NAME)[1]
+                self.eat(LPAREN)
                 args = []
-                if self.peek_token() and self.peek_token()[0] != 'RPAREN':
+                if self.peek_token() and self.peek_token()[0] != RPAREN:
                     args.append(self.parse_expression())
-                    while self.peek_token() and self.peek_token()[0] == 'COMMA':
-                        self.eat('COMMA')
+                    while self.peek_token() and self.peek_token()[0] == COMMA:
+                        self.eat(COMMA)
                         args.append(self.parse_expression())
-                self.eat('RPAREN')
-                self.eat('SEMICOLON')
+                self.eat(RPAREN)
+                self.eat(SEMICOLON)
                 return CallNode(name, args, source_line=current_line_text)
             return NumberNode(name, size=current_size if current_size else 16)
 
-        if t[0] == 'LABEL': 
-            return LabelNode(self.eat('LABEL')[1], source_line=current_line_text)
+        if t[0] == LABEL: 
+            return LabelNode(self.eat(LABEL)[1], source_line=current_line_text)
         
-        if t[0] == 'DIRECTIVE':
+        if t[0] == DIRECTIVE:
             node = self.parse_directive()
             node.source_line = current_line_text
             return node
 
-        if t[0] == 'GOTO':
+        if t[0] == GOTO:
             node = self.parse_goto()
             node.source_line = current_line_text
             return node
 
-        if t[0] == 'IF':
+        if t[0] == IF:
             node = self.parse_if()
             node.source_line = current_line_text
             return node
 
-        if t[0] == 'WHILE':
+        if t[0] == WHILE:
             node = self.parse_while()
             node.source_line = current_line_text
             return node
 
-        if t[0] == 'OUT':
-            self.eat('OUT')
+        if t[0] == SWITCH:
+            node = self.parse_switch()
+            node.source_line = current_line_text
+            return node
+
+        if t[0] == OUT:
+            self.eat(OUT)
             port = self.parse_expression()
-            self.eat('COMMA')
+            self.eat(COMMA)
             data = self.parse_expression()
-            self.eat('SEMICOLON')
+            self.eat(SEMICOLON)
             return OutNode(port, data, source_line=current_line_text)
 
-        if t[0] == 'TYPE':
-            type_token = self.eat('TYPE')
+        if t[0] == TYPE:
+            type_token = self.eat(TYPE)
             current_size = 8 if type_token[1] == 'uint8' else 16
 
             t = self.peek_token()
-            if t and t[0] in ['NUMBER', 'DEREF', 'NAME']:
+            if t and t[0] in [NUMBER, DEREF, NAME]:
                 node = self.parse_assignment(current_size)
-                self.eat('SEMICOLON')
+                self.eat(SEMICOLON)
                 return node
             else:
                 self.error(f"Expected assignment after type '{type_token[1]}'")
 
-        if t[0] in ['NUMBER', 'DEREF']:
+        if t[0] in [NUMBER, DEREF]:
             self.error(f"Explicit type required for assignment at '{t[1]}'")
 
-        if t[0] == 'NAME':
+        if t[0] == NAME:
             self.error(f"Explicit type required before variable/address '{t[1]}'")
         
         self.error(f"Syntax error at {t}")
@@ -659,68 +789,110 @@ class Parser:
         if isinstance(target, DerefNode):
             target.size = size
 
-        self.eat('ASSIGN')
+        self.eat(ASSIGN)
         value = self.parse_expression(size=size)
         return AssignNode(target, value, size=size)
 
     def parse_goto(self):
-        self.eat('GOTO')
+        self.eat(GOTO)
         target = self.parse_expression()
-        self.eat('SEMICOLON')
+        self.eat(SEMICOLON)
         return GotoNode(target)
 
     def parse_directive(self):
-        name = self.eat('DIRECTIVE')[1]
-        val = self.eat('NUMBER')[1]
+        name = self.eat(DIRECTIVE)[1]
+        val = self.eat(NUMBER)[1]
         return DirectiveNode(name, val)
 
     def parse_if(self):
-        if_token = self.eat('IF')
+        if_token = self.eat(IF)
         start_line = if_token[2]
         
         left = self.parse_expression()
         op = self.eat()[1]
         right = self.parse_expression()
         
-        self.eat('LBRACE')
+        self.eat(LBRACE)
         self.nesting_level += 1
         block = []
-        while self.peek_token() and self.peek_token()[0] != 'RBRACE':
+        while self.peek_token() and self.peek_token()[0] != RBRACE:
             block.append(self.parse_statement())
-        self.eat('RBRACE')
+        self.eat(RBRACE)
         self.nesting_level -= 1
 
         else_block = None
-        if self.peek_token() and self.peek_token()[0] == 'ELSE':
-            self.eat('ELSE')
-            self.eat('LBRACE')
+        if self.peek_token() and self.peek_token()[0] == ELSE:
+            self.eat(ELSE)
+            self.eat(LBRACE)
             self.nesting_level += 1
             else_block = []
-            while self.peek_token() and self.peek_token()[0] != 'RBRACE':
+            while self.peek_token() and self.peek_token()[0] != RBRACE:
                 else_block.append(self.parse_statement())
-            self.eat('RBRACE')
+            self.eat(RBRACE)
             self.nesting_level -= 1
             
         return IfNode(left, op, right, block, else_block)
 
     def parse_while(self):
-        while_token = self.eat('WHILE')
+        while_token = self.eat(WHILE)
         start_line = while_token[2]
         
         left = self.parse_expression()
         op = self.eat()[1]
         right = self.parse_expression()
         
-        self.eat('LBRACE')
+        self.eat(LBRACE)
         self.nesting_level += 1
         block = []
-        while self.peek_token() and self.peek_token()[0] != 'RBRACE':
+        while self.peek_token() and self.peek_token()[0] != RBRACE:
             block.append(self.parse_statement())
-        self.eat('RBRACE')
+        self.eat(RBRACE)
         self.nesting_level -= 1
             
         return WhileNode(left, op, right, block)
 
+    def parse_switch(self):
+        self.eat(SWITCH)
+        value = self.parse_expression()
+
+        self.eat(LBRACE)
+        self.nesting_level += 1
+        cases, default, seen = [], None, set()
+        while self.peek_token() and self.peek_token()[0] != RBRACE:
+            t = self.peek_token()
+            if t[0] == CASE:
+                self.eat(CASE)
+                values = [self.parse_case_value(seen)]
+                while self.peek_token() and self.peek_token()[0] == COMMA:
+                    self.eat(COMMA)
+                    values.append(self.parse_case_value(seen))
+                self.eat(COLON)
+                block = []
+                cases.append((values, block))
+            elif t[0] == LABEL and t[1] == "default:":
+                if default is not None: self.error("Duplicate 'default' in switch.")
+                self.eat(LABEL)
+                block = default = []
+            elif not cases and default is None:
+                self.error("Expected 'case' or 'default' in switch.")
+            else:
+                block.append(self.parse_statement())
+        self.eat(RBRACE)
+        self.nesting_level -= 1
+
+        if not cases: self.error("Switch needs at least one case.")
+        return SwitchNode(value, cases, default)
+
+    def parse_case_value(self, seen):
+        node = self.parse_expression()
+        if not isinstance(node, NumberNode) or not isinstance(node.value, int):
+            self.error("Case values must be integer constants.")
+        value = node.value & 0xFFFF
+        if value in seen:
+            self.error(f"Duplicate case value {value}.")
+        seen.add(value)
+        return value
+
     def parse_program(self):
         stmts = []
         while self.peek_token(): stmts.append(self.parse_statement())
@@ -936,46 +1108,122 @@ def generate_asm(statements, is_sub_block=False, rm=None, strings_to_embed=None,
             rm.usage_map = {reg: False for reg in rm.available_regs}
             rm.cache.clear()
 
+        elif isinstance(stmt, SwitchNode):
+            if_label_count += 1
+            switch_id = if_label_count
+            label_end = f"_switch_end_{switch_id}"
+            labels = [f"_case_{switch_id}_{i}" for i in range(len(stmt.cases))]
+            label_default = f"_default_{switch_id}" if stmt.default is not None else label_end
+            targets = sorted((value, label) for (values, _), label in zip(stmt.cases, labels) for value in values)
+            low, high = targets[0][0], targets[-1][0]
+
+            def operand(node):
+                o_asm, o_reg = generate_expression_asm(node, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
+                if o_asm: asm.append(o_asm)
+                rm.usage_map[o_reg] = True
+                return o_reg
+
+            def jump(op, reg, value, label):
+                c_reg = operand(NumberNode(value))
+                t_reg = rm.allocate()
+                asm.append(f"movi {t_reg}, {label}")
+                asm.append(f"{op} {reg}, {c_reg}, {t_reg}")
+                rm.free(c_reg)
+                rm.free(t_reg)
+
+            def jump_always(label):
+                t_reg = rm.allocate()
+                asm.append(f"movi {t_reg}, {label}")
+                asm.append(f"mov r15, {t_reg}")
+                rm.free(t_reg)
+
+            value_reg = operand(stmt.value)
+            if len(targets) >= JUMP_TABLE_MIN_CASES and high - low < 2 * len(targets):
+                label_table = f"_switch_table_{switch_id}"
+                entries = [label_default] * (high - low + 1)
+                for value, label in targets: entries[value - low] = label
+
+                index_reg = rm.allocate()
+                asm.append(f"mov {index_reg}, {value_reg}")
+                rm.free(value_reg)
+                if low:
+                    low_reg = operand(NumberNode(low))
+                    asm.append(f"sub {index_reg}, {low_reg}")
+                    rm.free(low_reg)
+                jump("jge", index_reg, high - low + 1, label_default)
+                asm.append(f"add {index_reg}, {index_reg}")
+                t_reg = rm.allocate()
+                asm.append(f"movi {t_reg}, {label_table}")
+                asm.append(f"add {index_reg}, {t_reg}")
+                rm.free(t_reg)
+                mode_reg = operand(NumberNode(0))
+                asm.append(f"peek {index_reg}, {index_reg}, {mode_reg}")
+                asm.append(f"mov r15, {index_reg}")
+                asm.append(f"{label_table}:")
+                asm.append(f".dw {', '.join(entries)}")
+            else:
+                def dispatch(cases):
+                    if len(cases) <= LINEAR_SWITCH_CASES:
+                        for value, label in cases:
+                            jump("je", value_reg, value, label)
+                        jump_always(label_default)
+                        return
+                    middle = len(cases) // 2
+                    label_lower = f"_switch_below_{switch_id}_{cases[middle][0]}"
+                    jump("jlt", value_reg, cases[middle][0], label_lower)
+                    dispatch(cases[middle:])
+                    asm.append(f"{label_lower}:")
+                    dispatch(cases[:middle])
+
+                dispatch(targets)
+
+            blocks = [block for _, block in stmt.cases] + ([stmt.default] if stmt.default is not None else [])
+            for i, (label, block) in enumerate(zip(labels + [label_default], blocks)):
+                asm.append(f"{label}:")
+                rm.usage_map = {reg: False for reg in rm.available_regs}
+                rm.cache.clear()
+                asm.append(generate_asm(block, is_sub_block=True, rm=rm, strings_to_embed=strings_to_embed, external_symbols=external_symbols))
+                if i < len(blocks) - 1:
+                    jump_always(label_end)
+
+            asm.append(f"{label_end}:")
+
+            rm.usage_map = {reg: False for reg in rm.available_regs}
+            rm.cache.clear()
+
         elif isinstance(stmt, WhileNode):
             if_label_count += 1
             label_start = f"_while_start_{if_label_count}"
             label_end = f"_while_end_{if_label_count}"
+            label_cond = f"_while_cond_{if_label_count}"
 
-            asm.append(f"{label_start}:")
-
+            rm.cache.clear()
+            cond_asm = []
             l_asm, l_reg = generate_expression_asm(stmt.left, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
-            if l_asm: asm.append(l_asm)
+            if l_asm: cond_asm.append(l_asm)
             rm.usage_map[l_reg] = True
 
             r_asm, r_reg = generate_expression_asm(stmt.right, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
-            if r_asm: asm.append(r_asm)
+            if r_asm: cond_asm.append(r_asm)
             rm.usage_map[r_reg] = True
 
             t_reg = rm.allocate()
-            asm.append(f"movi {t_reg}, {label_end}")
+            cond_asm.append(f"movi {t_reg}, {label_start}")
 
-            if stmt.op == "==":
-                asm.append(f"jne {l_reg}, {r_reg}, {t_reg}")
-            elif stmt.op == "!=":
-                asm.append(f"je {l_reg}, {r_reg}, {t_reg}")
-            elif stmt.op == "<":
-                asm.append(f"jge {l_reg}, {r_reg}, {t_reg}")
-            elif stmt.op == ">":
-                asm.append(f"jlt {l_reg}, {r_reg}, {t_reg}")
-            elif stmt.op == ">=":
-                asm.append(f"jlt {l_reg}, {r_reg}, {t_reg}")
-            elif stmt.op == "<=":
-                asm.append(f"jgt {l_reg}, {r_reg}, {t_reg}")
+            if stmt.op in WHILE_JUMPS:
+                op, swap = WHILE_JUMPS[stmt.op]
+                cond_asm.append(f"{op} {r_reg}, {l_reg}, {t_reg}" if swap else f"{op} {l_reg}, {r_reg}, {t_reg}")
+            else:
+                cond_asm.append(f"mov r15, {t_reg}")
 
             rm.free(l_reg); rm.free(r_reg); rm.free(t_reg)
 
+            asm.append(f"movi r15, {label_cond}")
+            asm.append(f"{label_start}:")
             asm.append(generate_asm(stmt.block, is_sub_block=True, rm=rm, strings_to_embed=strings_to_embed, external_symbols=external_symbols))
 
-            jump_reg = rm.allocate()
-            asm.append(f"movi {jump_reg}, {label_start}")
-            asm.append(f"mov r15, {jump_reg}")
-            rm.free(jump_reg)
-
+            asm.append(f"{label_cond}:")
+            asm.extend(cond_asm)
             asm.append(f"{label_end}:")
             
             rm.usage_map = {reg: False for reg in rm.available_regs}
@@ -1096,6 +1344,10 @@ def generate_expression_asm(node, rm, external_symbols=None, is_statement=False,
         left_asm, left_reg = generate_expression_asm(node.left, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
         rm.usage_map[left_reg] = True
 
+        if node.op == "*" and isinstance(node.right, NumberNode) and node.right.value == 2:
+            if left_reg in rm.cache: del rm.cache[left_reg]
+            return f"{left_asm}\nadd {left_reg}, {left_reg}", left_reg
+
         right_asm, right_reg = generate_expression_asm(node.right, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
         rm.usage_map[right_reg] = True
 
@@ -1133,10 +1385,77 @@ def generate_expression_asm(node, rm, external_symbols=None, is_statement=False,
 
     return "", None
 
+def compile_source(code, external_symbols, want_listing=False, opt_level=1):
+    source_code, export_list = preprocess(None, code)
+    tokens = tokenize(source_code)
+    parser = Parser(tokens, source_code, external_symbols)
+    statements = parser.parse_program()
+
+    target_sector = None
+    reserved_sectors = 0
+    
+    for s in statements:
+        if isinstance(s, DirectiveNode):
+            if s.name == "#sector":
+                target_sector = s.value
+            elif s.name == "#sectors":
+                reserved_sectors = s.value
+
+    if target_sector is None:
+        raise CompilerError("Missing or invalid '#sector' directive.")
+
+    if reserved_sectors <= 0:
+        raise CompilerError("Missing or invalid '#sectors' directive. Must be at least 1.")
+
+    asm_code = generate_asm(statements, external_symbols=external_symbols)
+    peephole_stats = {}
+    if opt_level > 0:
+        items = mxopt.peephole(parse_text(asm_code, keep_comments=True), 16, peephole_stats)
+        bytecode, symbols = assemble_ir(items, external_symbols)
+        listing = format_asm(items) if want_listing else None
+    else:
+        bytecode, symbols = assemble_text(asm_code, external_symbols)
+        listing = asm_code if want_listing else None
+
+    return {
+        "bytecode": bytecode,
+        "sector": target_sector,
+        "sectors": reserved_sectors,
+        "export_list": export_list,
+        "exports": {name: symbols[name] for name in export_list if name in symbols},
+        "listing": listing,
+        "peephole": peephole_stats,
+    }
+
+def compile_file(input_file, external_symbols=None, use_cache=True, want_listing=False, opt_level=1):
+    if external_symbols is None: external_symbols = {}
+    code = get_combined_source(input_file)
+
+    cache_key = None
+    if use_cache:
+        cache_key = mxcache.make_key(code, external_symbols, [__file__, mxa.__file__, mxopt.__file__], [f"-O{opt_level}"])
+        entry = mxcache.load(cache_key)
+        if entry is not None:
+            print(entry["messages"], end="")
+            print(f"[Info] Build cache hit for {input_file}.")
+            return entry
+
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            entry = compile_source(code, external_symbols, want_listing or use_cache, opt_level)
+    finally:
+        print(output.getvalue(), end="")
+
+    entry["messages"] = output.getvalue()
+    if cache_key:
+        mxcache.store(cache_key, entry)
+    return entry
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage: python compiler.py <source.c> [flags]")
-        print("Flags: -n, -info, -asm, -export <file>, -import <file>")
+        print("Flags: -n, -info, -asm, -no-cache, -O0, -O1, -export <file>, -import <file>")
         sys.exit(1)
 
     input_file = sys.argv[1]
@@ -1156,44 +1475,26 @@ if __name__ == "__main__":
             except:
                 raise CompilerError("[Error] Could not load symbol file.")
 
-        source_code, export_list = preprocess(input_file)
-        tokens = tokenize(source_code)
-        parser = Parser(tokens, source_code, external_symbols)
-        statements = parser.parse_program()
-
-        target_sector = None
-        reserved_sectors = 0
-        
-        for s in statements:
-            if isinstance(s, DirectiveNode):
-                if s.name == "#sector":
-                    target_sector = s.value
-                elif s.name == "#sectors":
-                    reserved_sectors = s.value
-
-        if target_sector is None:
-            raise CompilerError("Missing or invalid '#sector' directive.")
-
-        if reserved_sectors <= 0:
-            raise CompilerError("Missing or invalid '#sectors' directive. Must be at least 1.")
-
-        asm_code = generate_asm(statements, external_symbols=external_symbols)
+        result = compile_file(input_file, external_symbols, use_cache="-no-cache" not in flags, want_listing="-asm" in flags, opt_level=0 if "-O0" in flags else 1)
+        bytecode = result["bytecode"]
+        target_sector = result["sector"]
+        reserved_sectors = result["sectors"]
 
-        timestamp = datetime.datetime.now().strftime('%H%M%S')
-        asm_file_name = f"temp_{timestamp}.asm"
-        with open(asm_file_name, "w") as f:
-            f.write(asm_code)
-
-        bytecode, symbols = assemble(asm_file_name, external_symbols)
+        if "-asm" in flags:
+            timestamp = datetime.datetime.now().strftime('%H%M%S')
+            asm_file_name = f"temp_{timestamp}.asm"
+            with open(asm_file_name, "w") as f:
+                f.write(result["listing"])
+            print(f"[Info] Assembly written to {asm_file_name}.")
 
         if "-export" in flags:
             idx = sys.argv.index("-export")
             h_file = sys.argv[idx + 1]
 
             smart_symbols = {}
-            for name in export_list:
-                if name in symbols:
-                    smart_symbols[name] = symbols[name]
+            for name in result["export_list"]:
+                if name in result["exports"]:
+                    smart_symbols[name] = result["exports"][name]
                 else:
                     raise CompilerError(f"Export-Label '{name}' was not found in source code.")
             
@@ -1202,11 +1503,8 @@ if __name__ == "__main__":
                 json.dump(smart_symbols, f)
             print(f"[Success] {len(smart_symbols)} symbols exported to {h_file}.")
 
-        if "-asm" not in flags:
-            os.remove(asm_file_name)
-
         actual_size = len(bytecode)
-        needed_sectors = ((actual_size - 1) // 512 + 1) if actual_size > 0 else 1
+        needed_sectors = mxdisk.sectors_needed(actual_size)
 
         final_sector_count = max(needed_sectors, reserved_sectors)
 
@@ -1216,26 +1514,20 @@ if __name__ == "__main__":
         if "-n" in flags:
             print(f"[Info] Dry run: disk.bin was not modified.")
         else:
-            target_size = final_sector_count * 512
-            padded_bytecode = bytecode.ljust(target_size, b'\x00')
-
-            disk_path = "disk.bin"
-            if not os.path.exists(disk_path):
-                potential_path = os.path.join("..", "emulator", "disk.bin")
-                if os.path.exists(potential_path):
-                    disk_path = potential_path
-            
+            disk = mxdisk.DiskImage(mxdisk.find_disk())
             try:
-                with open(disk_path, "r+b") as f:
-                    f.seek(target_sector * 512)
-                    f.write(padded_bytecode)
-                print(f"[Success] Wrote {actual_size} bytes to sector {target_sector} in {disk_path}.")
-            except FileNotFoundError:
-                raise CompilerError(f"disk.bin not found.")
+                disk.place(target_sector, bytecode, reserved_sectors)
+                disk.write()
+            except mxdisk.DiskError as e:
+                raise CompilerError(e.message)
+            print(f"[Success] Wrote {actual_size} bytes to sector {target_sector} in {disk.path}.")
 
         if "-info" in flags:
             usage = (actual_size / (final_sector_count * 512)) * 100
             print(f"[Stats] Size: {actual_size} bytes / Usage: {usage:.1f}% of allocated space.")
+            if result["peephole"]:
+                hits = ", ".join(f"{name} {count}" for name, count in result["peephole"].items())
+                print(f"[Stats] Peephole: {hits}.")
 
     except CompilerError as e:
         print(e)
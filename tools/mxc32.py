@@ -1,9 +1,17 @@
 import os
+import io
+import contextlib
 import datetime
 import sys
 import re
 import struct
-from mxa import assemble
+import math
+import copy
+import mxa
+import mxcache
+import mxopt
+import mxdisk
+from mxa import assemble_ir, format_asm, parse_text, Instr, Reg, Imm, Label, Data, Directive, Comment, mem
 
 class CompilerError(Exception):
     def __init__(self, message, line=None, token=None):
@@ -127,6 +135,13 @@ class WhileNode:
         self.block = block
         self.source_line = source_line
 
+class SwitchNode:
+    def __init__(self, value, cases, default=None, source_line=None):
+        self.value = value
+        self.cases = cases
+        self.default = default
+        self.source_line = source_line
+
 class GlobalVarNode:
     def __init__(self, name, total_bits, value, size=32, source_line=None):
         self.name = name
@@ -141,220 +156,364 @@ class ArrayNode:
         self.size = size
         self.source_line = source_line
 
+TOKEN_NAMES = ['STRUCT', 'DEF', 'ASM', 'TYPE', 'DIRECTIVE', 'NUMBER', 'IF', 'WHILE', 'ELSE', 'SWITCH', 'CASE', 'SHL', 'SHR', 'EQ', 'NE', 'LE', 'GE', 'LT', 'GT', 'ASSIGN', 'DEREF', 'OP', 'SEMICOLON', 'LBRACE', 'RBRACE', 'LBRACK', 'RBRACK', 'LPAREN', 'RPAREN', 'GOTO', 'OUT', 'FN', 'RETURN', 'CHAR', 'STRING', 'LABEL', 'NAME', 'COMMA', 'COLON', 'WHITESPACE', 'MISMATCH']
+(STRUCT, DEF, ASM, TYPE, DIRECTIVE, NUMBER, IF, WHILE, ELSE, SWITCH, CASE, SHL, SHR, EQ, NE, LE, GE, LT, GT, ASSIGN, DEREF, OP, SEMICOLON, LBRACE, RBRACE, LBRACK, RBRACK, LPAREN, RPAREN, GOTO, OUT, FN, RETURN, CHAR, STRING, LABEL, NAME, COMMA, COLON, WHITESPACE, MISMATCH) = range(len(TOKEN_NAMES))
+
+KEYWORDS = {
+    'struct': STRUCT, 'def': DEF, 'asm': ASM, 'if': IF, 'while': WHILE, 'else': ELSE, 'switch': SWITCH, 'case': CASE,
+    'goto': GOTO, 'out': OUT, 'void': FN, 'return': RETURN,
+    'uint8': TYPE, 'uint16': TYPE, 'uint32': TYPE, 'float32': TYPE, 'int32': TYPE,
+}
+
 TOKEN_SPEC = [
-    ('STRUCT',       r'struct\b'),
-    ('DEF',       r'def\b'),
-    ('ASM',       r'asm\b'),
-    ('TYPE',       r'uint8\b|uint16\b|uint32\b|float32\b|int32\b'),
-    ('DIRECTIVE', r'[#\.][A-Za-z_]+'),
-    ('NUMBER',    r'(0x[0-9A-Fa-f]+|\d+\.\d+|\d+)'),
-    ('IF',        r'if\b'),
-    ('WHILE',        r'while\b'),
-    ('ELSE',       r'else\b'),
-    ('SHL',        r'<<'),
-    ('SHR',        r'>>'),
-    ('EQ',        r'=='),
-    ('NE',        r'!='),
-    ('LE', r'<='),
-    ('GE', r'>='),
-    ('LT', r'<'),
-    ('GT', r'>'),
-    ('ASSIGN',    r'='),
-    ('DEREF',     r'\$'),
-    ('OP',         r'[+\-*/%&|^]'),
-    ('SEMICOLON', r';'),
-    ('LBRACE',    r'\{'),
-    ('RBRACE',    r'\}'),
-    ('LBRACK',    r'\['),
-    ('RBRACK',    r'\]'),
-    ('LPAREN',    r'\('),
-    ('RPAREN',    r'\)'),
-    ('GOTO',      r'goto'),
-    ('OUT', r'out\b'),
-    ('FN',      r'void\b'),
-    ('RETURN',  r'return\b'),
-    ('CHAR', r"'.'"),
-    ('STRING',     r'"[^"]*"'),
-    ('LABEL',     r'[A-Za-z_][A-Za-z0-9_]*:'),
-    ('NAME',       r'[A-Za-z_][A-Za-z0-9_\.]*'),
-    ('COMMA',     r','),
-    ('WHITESPACE', r'\s+'),
+    (WHITESPACE, r'\s+'),
+    (LABEL,     r'[A-Za-z_][A-Za-z0-9_]*:'),
+    (NAME,      r'[A-Za-z_][A-Za-z0-9_\.]*'),
+    (NUMBER,    r'0x[0-9A-Fa-f]+|\d+\.\d+|\d+'),
+    (COMMA,     r','),
+    (COLON,     r':'),
+    (SEMICOLON, r';'),
+    (LPAREN,    r'\('),
+    (RPAREN,    r'\)'),
+    (DEREF,     r'\$'),
+    (DIRECTIVE, r'[#\.][A-Za-z_]+'),
+    (SHL,        r'<<'),
+    (SHR,        r'>>'),
+    (EQ,        r'=='),
+    (NE,        r'!='),
+    (LE, r'<='),
+    (GE, r'>='),
+    (LT, r'<'),
+    (GT, r'>'),
+    (ASSIGN,    r'='),
+    (OP,        r'[+\-*/%&|^]'),
+    (LBRACE,    r'\{'),
+    (RBRACE,    r'\}'),
+    (LBRACK,    r'\['),
+    (RBRACK,    r'\]'),
+    (CHAR, r"'.'"),
+    (STRING,     r'"[^"]*"'),
+    (MISMATCH,  r'.'),
 ]
 
+TOKEN_REGEX = re.compile('|'.join('(%s)' % pattern for _, pattern in TOKEN_SPEC))
+GROUP_KINDS = [None] + [kind for kind, _ in TOKEN_SPEC]
+
 def strip_comments(code):
     code = re.sub(r'/\*.*?\*/', lambda m: '\n' * m.group().count('\n'), code, flags=re.DOTALL)
     code = re.sub(r'//.*', '', code)
     return code
 
-def get_combined_source(filepath):
+INCLUDE_PATTERN = re.compile(r'#include\s+"([^"]+)"')
+
+include_cache = {}
+
+def find_include_guard(code):
+    lines = [line.strip() for line in code.split("\n") if line.strip()]
+    if len(lines) < 3 or not lines[0].startswith("#ifndef") or not lines[-1].startswith("#endif"):
+        return None
+
+    parts = lines[0].split()
+    if len(parts) != 2 or lines[1].split()[:2] != ["#define", parts[1]]:
+        return None
+
+    depth = 0
+    for i, line in enumerate(lines):
+        if line.startswith("#ifdef") or line.startswith("#ifndef"):
+            depth += 1
+        elif line.startswith("#endif"):
+            depth -= 1
+            if depth == 0 and i != len(lines) - 1:
+                return None
+    return parts[1]
+
+def split_includes(code, guarded):
+    parts = []
+    text = []
+    depth = 0
+    for line in code.split("\n"):
+        stripped = line.strip()
+        if stripped.startswith("#ifdef") or stripped.startswith("#ifndef"):
+            depth += 1
+        elif stripped.startswith("#endif"):
+            depth -= 1
+
+        if "#include" in line:
+            pos = 0
+            for m in INCLUDE_PATTERN.finditer(line):
+                text.append(line[pos:m.start()])
+                parts.append("".join(text))
+                parts.append((m.group(1), depth == (1 if guarded else 0)))
+                text = []
+                pos = m.end()
+            line = line[pos:]
+        text.append(line)
+        text.append("\n")
+
+    text.pop()
+    parts.append("".join(text))
+    return parts
+
+def load_source(filepath):
+    path = os.path.abspath(filepath)
+    mtime = os.path.getmtime(path)
+    entry = include_cache.get(path)
+    if entry is None or entry[0] != mtime:
+        with open(path, "r") as f:
+            code = strip_comments(f.read())
+        guard = find_include_guard(code)
+        entry = (mtime, guard, split_includes(code, guard is not None))
+        include_cache[path] = entry
+    return entry[1], entry[2]
+
+def get_combined_source(filepath, seen_guards=None, unconditional=True):
     if not os.path.exists(filepath):
         print(f"[Warning] File {filepath} not found!")
         return f"// Error: {filepath} not found"
 
-    with open(filepath, "r") as f:
-        code = f.read()
-
-    code = strip_comments(code)
-
-    include_pattern = r'#include\s+"([^"]+)"'
-    
-    def replace_match(match):
-        filename = match.group(1)
-        full_path = os.path.join(os.path.dirname(filepath), filename)
-        return get_combined_source(full_path)
+    guard, parts = load_source(filepath)
+    if seen_guards is None:
+        seen_guards = set()
+    if guard is not None:
+        if guard in seen_guards:
+            return ""
+        if unconditional:
+            seen_guards.add(guard)
+
+    code = []
+    for part in parts:
+        if isinstance(part, str):
+            code.append(part)
+        else:
+            filename, top_level = part
+            full_path = os.path.join(os.path.dirname(filepath), filename)
+            code.append(get_combined_source(full_path, seen_guards, unconditional and top_level))
+    return "".join(code)
 
-    code = re.sub(include_pattern, replace_match, code)
-    return code
+WORD_PATTERN = re.compile(r'\w+')
+LOGIC_DIRECTIVE_PATTERN = re.compile(r'#(export|info|debug|warn|error)\s+(.*)')
+EXPORT_NAME_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+MESSAGE_PATTERN = re.compile(r'"([^"]+)"')
+MESSAGE_LEVELS = {"info": "[Info]", "debug": "[Debug]", "warn": "[Warning]"}
 
 def handle_conditionals_and_defines(code):
     lines = code.splitlines()
     output = []
     defines = {}
+    directives = []
     active_stack = [True]
     condition_met_stack = [True]
 
     for line_num, line in enumerate(lines, 1):
         stripped = line.strip()
 
-        if stripped.startswith("#define") and active_stack[-1]:
-            parts = stripped.split()
-            if len(parts) >= 2:
-                name = parts[1]
-                value = " ".join(parts[2:]) if len(parts) > 2 else ""
-                defines[name] = value
-            continue
-
-        if stripped.startswith("#ifdef"):
-            name = stripped.split()[1] if len(stripped.split()) > 1 else ""
-            met = (name in defines)
-            condition_met_stack.append(met)
-            active_stack.append(met and active_stack[-1])
-            continue
-            
-        elif stripped.startswith("#ifndef"):
-            name = stripped.split()[1] if len(stripped.split()) > 1 else ""
-            met = (name not in defines)
-            condition_met_stack.append(met)
-            active_stack.append(met and active_stack[-1])
-            continue
-
-        elif stripped.startswith("#else"):
-            if len(active_stack) <= 1:
-                raise CompilerError(f"Line {line_num}: #else without #ifdef/#ifndef")
-            last_met = condition_met_stack[-1]
-            parent_active = active_stack[-2]
-            active_stack[-1] = (not last_met) and parent_active
-            continue
-
-        elif stripped.startswith("#endif"):
-            if len(active_stack) <= 1:
-                raise CompilerError(f"Line {line_num}: #endif without matching #ifdef")
-            active_stack.pop()
-            condition_met_stack.pop()
-            continue
+        if stripped[:1] == "#":
+            if stripped.startswith("#define") and active_stack[-1]:
+                parts = stripped.split()
+                if len(parts) >= 2:
+                    name = parts[1]
+                    value = " ".join(parts[2:]) if len(parts) > 2 else ""
+                    defines[name] = value
+                continue
+
+            if stripped.startswith("#ifdef"):
+                name = stripped.split()[1] if len(stripped.split()) > 1 else ""
+                met = (name in defines)
+                condition_met_stack.append(met)
+                active_stack.append(met and active_stack[-1])
+                continue
+                
+            elif stripped.startswith("#ifndef"):
+                name = stripped.split()[1] if len(stripped.split()) > 1 else ""
+                met = (name not in defines)
+                condition_met_stack.append(met)
+                active_stack.append(met and active_stack[-1])
+                continue
+
+            elif stripped.startswith("#else"):
+                if len(active_stack) <= 1:
+                    raise CompilerError(f"Line {line_num}: #else without #ifdef/#ifndef")
+                last_met = condition_met_stack[-1]
+                parent_active = active_stack[-2]
+                active_stack[-1] = (not last_met) and parent_active
+                continue
+
+            elif stripped.startswith("#endif"):
+                if len(active_stack) <= 1:
+                    raise CompilerError(f"Line {line_num}: #endif without matching #ifdef")
+                active_stack.pop()
+                condition_met_stack.pop()
+                continue
 
         if active_stack[-1]:
+            if "#" in line:
+                m = LOGIC_DIRECTIVE_PATTERN.search(line)
+                if m:
+                    directives.append((m.group(1), m.group(2)))
+                    line = line[:m.start()]
             output.append(line)
 
     if len(active_stack) > 1:
         raise CompilerError("Missing #endif at end of file.")
 
-    return "\n".join(output), defines
+    return "\n".join(output), defines, directives
 
-def apply_defines(code, defines):
-    for name in sorted(defines.keys(), key=len, reverse=True):
-        value = defines[name]
-        code = re.sub(r'\b' + re.escape(name) + r'\b', value, code)
+def build_define_table(defines):
+    table = {}
+    fallback = []
+    for name in reversed(sorted(defines.keys(), key=len, reverse=True)):
+        if WORD_PATTERN.fullmatch(name):
+            table[name] = apply_defines(defines[name], table)
+        else:
+            fallback.append((name, defines[name]))
+    return table, fallback[::-1]
+
+def apply_defines(code, table, fallback=()):
+    if table:
+        get = table.get
+        code = WORD_PATTERN.sub(lambda m: get(m[0], m[0]), code)
+    for name, value in fallback:
+        code = re.sub(r'\b' + re.escape(name) + r'\b', lambda m: value, code)
     return code
 
-def process_logic_directives(code):
-    exports = re.findall(r'#export\s+([A-Za-z_][A-Za-z0-9_]*)', code)
+def process_logic_directives(directives, table, fallback):
+    exports = []
+    messages = {level: [] for level in MESSAGE_LEVELS}
+    errors = []
 
-    levels = {"#info": "[Info]", "#debug": "[Debug]", "#warn": "[Warning]"}
-    for prefix, tag in levels.items():
-        messages = re.findall(rf'{prefix}\s+"([^"]+)"', code)
-        for msg in messages:
+    for kind, text in directives:
+        text = apply_defines(text, table, fallback)
+        if kind == "export":
+            m = EXPORT_NAME_PATTERN.match(text)
+            if m: exports.append(m.group())
+            continue
+        m = MESSAGE_PATTERN.match(text)
+        if not m: continue
+        if kind == "error":
+            errors.append(m.group(1))
+        else:
+            messages[kind].append(m.group(1))
+
+    for level, tag in MESSAGE_LEVELS.items():
+        for msg in messages[level]:
             print(f"{tag} {msg}")
 
-    errors = re.findall(r'#error\s+"([^"]+)"', code)
     if errors:
         raise CompilerError(f"[FATAL] #error: {errors[0]}")
 
-    clean_code = re.sub(r'#(export|info|debug|warn|error)\s+.*', '', code)
-    
-    return clean_code, exports
+    return exports
 
-def preprocess(main_file):
-    code = get_combined_source(main_file)
-    code, defines = handle_conditionals_and_defines(code)
-    code = apply_defines(code, defines)
-    final_source, export_list = process_logic_directives(code)
+def preprocess(main_file, code=None):
+    if code is None:
+        code = get_combined_source(main_file)
+    code, defines, directives = handle_conditionals_and_defines(code)
+    table, fallback = build_define_table(defines)
+    final_source = apply_defines(code, table, fallback)
+    export_list = process_logic_directives(directives, table, fallback)
     
     return final_source, export_list
 
 def tokenize(code):
-    tokens = []
     line_num = 1
-    last_pos = 0
+    keywords = KEYWORDS
+    kinds = GROUP_KINDS
 
-    tok_regex = '|'.join('(?P<%s>%s)' % pair for pair in TOKEN_SPEC)
-    for mo in re.finditer(tok_regex, code):
-        kind = mo.lastgroup
+    for mo in TOKEN_REGEX.finditer(code):
+        kind = kinds[mo.lastindex]
         value = mo.group()
-        start_pos = mo.start()
-
-        if start_pos > last_pos:
-            skipped = code[last_pos:start_pos]
-            if skipped.strip():
-                bad_char = skipped.strip()[0]
-                raise CompilerError(f"Illegal character: '{bad_char}'", line=line_num)
-
-        if kind == 'WHITESPACE':
+        if kind == WHITESPACE:
             line_num += value.count('\n')
-        else:
-            tokens.append((kind, value, line_num))
-        
-        last_pos = mo.end()
-
-    if last_pos < len(code):
-        remaining = code[last_pos:].strip()
-        if remaining:
-            raise CompilerError(f"Illegal character at end: '{remaining[0]}'", line=line_num)
-
-    return tokens
+            continue
+        if kind == NAME:
+            kind = keywords.get(value, NAME)
+        elif kind == MISMATCH:
+            raise CompilerError(f"Illegal character: '{value}'", line=line_num)
+        yield (kind, value, line_num)
+
+FIRST_VIRTUAL_REG = 16
+ALLOCATABLE_REGS = 14
+MAX_HOISTED_CONSTANTS = 6
+MAX_INDUCTION_POINTERS = 4
+LINEAR_SWITCH_CASES = 3
+JUMP_TABLE_MIN_CASES = 6
+INLINE_LIMIT = 24
+SPILL_SCRATCH = (Reg(12), Reg(13))
+ARG_REGS = (Reg(1), Reg(2), Reg(3), Reg(4))
 
 class RegisterManager:
-    def __init__(self):
-        self.available_regs = [f"r{i}" for i in range(14)]
+    def __init__(self, cacheable=None, escaped=None, reg_args=None, readers=None):
+        self.next_reg = FIRST_VIRTUAL_REG
+        self.cache = {}
+        self.reachable = True
+        self.shared = set()
+        self.cacheable = cacheable if cacheable is not None else {}
+        self.escaped = escaped if escaped is not None else set()
+        self.reg_args = reg_args if reg_args is not None else {}
+        self.readers = readers if readers is not None else {}
+        self.loaded = set()
+        self.spill_slots = []
+        self.loop_depth = 0
+
+    def allocate(self):
+        reg = Reg(self.next_reg)
+        self.next_reg += 1
+        return reg
+
+    def lookup(self, key):
+        return self.cache.get(key)
+
+    def remember(self, key, reg):
+        self.cache[key] = reg
+        self.shared.add(reg)
+
+    def forget_globals(self, names=None):
+        for key in [k for k in self.cache if isinstance(k, tuple) and (names is None or k[0] in names)]:
+            del self.cache[key]
+
+    def forget(self, keys):
+        for key in keys:
+            self.cache.pop(key, None)
+
+    def clear(self, reachable=True):
         self.cache = {}
-        self.usage_map = {reg: False for reg in self.available_regs}
+        self.reachable = reachable
 
-    def get_reg_with_value(self, value):
-        for reg, val in self.cache.items():
-            if val == value:
-                return reg
-        return None
+    def snapshot(self):
+        return dict(self.cache), self.reachable
+
+    def restore(self, state):
+        self.cache = dict(state[0])
+        self.reachable = state[1]
+
+    def merge(self, a, b):
+        if not a[1]: self.restore(b)
+        elif not b[1]: self.restore(a)
+        else:
+            self.cache = {key: reg for key, reg in a[0].items() if b[0].get(key) == reg}
+            self.reachable = True
 
-    def allocate(self, value=None):
-        for reg in self.available_regs:
-            if not self.usage_map[reg]:
-                self.usage_map[reg] = True
-                if reg in self.cache:
-                    del self.cache[reg]
+    def spill_slot(self):
+        label = f"_spill_{len(self.spill_slots)}"
+        self.spill_slots.append(label)
+        return label
 
-                if value is not None and isinstance(value, int):
-                    self.cache[reg] = value
-                return reg
-        raise CompilerError("Out of registers.")
+class SaveLive:
+    __slots__ = ("call",)
+    def __init__(self, call):
+        self.call = call
 
-    def free(self, reg):
-        if reg in self.usage_map:
-            self.usage_map[reg] = False
+class RestoreLive:
+    __slots__ = ("call",)
+    def __init__(self, call):
+        self.call = call
 
 class Parser:
     def __init__(self, tokens, full_source, external_symbols=None):
-        self.tokens = tokens
-        self.pos = 0
+        self.tokens = iter(tokens)
+        self.current = next(self.tokens, None)
+        self.following = None
+        self.has_following = False
+        self.last_line = None
         self.source_lines = full_source.split('\n')
         self.external_symbols = external_symbols if external_symbols else {}
         self.defined_globals = set()
@@ -369,18 +528,28 @@ class Parser:
         token = self.peek_token()
         if token:
             raise CompilerError(message, line=token[2], token=token[1])
-        last_line = self.tokens[-1][2] if self.tokens else None
-        raise CompilerError(message, line=last_line)
+        raise CompilerError(message, line=self.last_line)
 
     def peek_token(self):
-        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+        return self.current
+
+    def peek_next_token(self):
+        if not self.has_following:
+            self.following = next(self.tokens, None)
+            self.has_following = True
+        return self.following
 
     def eat(self, expected_type=None):
-        token = self.peek_token()
+        token = self.current
         if not token: self.error("Unexpected ending. Perhaps a bracket is missing.")
-        if expected_type and token[0] != expected_type:
-            self.error(f"Expected {expected_type}, got {token[0]}.")
-        self.pos += 1
+        if expected_type is not None and token[0] != expected_type:
+            self.error(f"Expected {TOKEN_NAMES[expected_type]}, got {TOKEN_NAMES[token[0]]}.")
+        if self.has_following:
+            self.current = self.following
+            self.has_following = False
+        else:
+            self.current = next(self.tokens, None)
+        self.last_line = token[2]
         return token
 
     def parse_factor(self, size=None, is_float=False):
@@ -389,13 +558,13 @@ class Parser:
         t = self.peek_token()
         if not t: return None
 
-        if t[0] == 'STRING':
-            val = self.eat('STRING')[1]
+        if t[0] == STRING:
+            val = self.eat(STRING)[1]
             val = val.strip('"').replace('\\n', '\n').replace('\\r', '\r').replace('\\t', '\t')
             return StringNode(val)
 
-        if t[0] == 'TYPE':
-            type_str = self.eat('TYPE')[1]
+        if t[0] == TYPE:
+            type_str = self.eat(TYPE)[1]
             if type_str == 'uint8':
                 current_size = 8
                 current_is_float = False
@@ -410,23 +579,23 @@ class Parser:
                 current_is_float = False
             t = self.peek_token()
 
-        if t[0] == 'LPAREN':
-            self.eat('LPAREN')
+        if t[0] == LPAREN:
+            self.eat(LPAREN)
             node = self.parse_expression()
-            self.eat('RPAREN')
+            self.eat(RPAREN)
             return node
 
-        if t[0] == 'CHAR':
-            val = ord(self.eat('CHAR')[1][1])
+        if t[0] == CHAR:
+            val = ord(self.eat(CHAR)[1][1])
             return NumberNode(val, size=8)
-        elif t[0] == 'DEREF':
+        elif t[0] == DEREF:
             if current_size is None:
                 self.error("Explicit type required before dereference.")
-            self.eat('DEREF')
+            self.eat(DEREF)
             addr = self.parse_factor(size=32) 
             return DerefNode(addr, size=current_size)
-        elif t[0] == 'NUMBER':
-            val_str = self.eat('NUMBER')[1]
+        elif t[0] == NUMBER:
+            val_str = self.eat(NUMBER)[1]
             if current_size is None: current_size = 32
             if '.' in val_str or current_is_float:
                 try:
@@ -441,26 +610,26 @@ class Parser:
                     val_int = 0
                 return NumberNode(val_int, size=current_size, is_float=False)
 
-        if t[0] == 'NAME':
-            name = self.eat('NAME')[1]
-            if self.peek_token() and self.peek_token()[0] == 'LPAREN':
-                self.eat('LPAREN')
+        if t[0] == NAME:
+            name = self.eat(NAME)[1]
+            if self.peek_token() and self.peek_token()[0] == LPAREN:
+                self.eat(LPAREN)
                 args = []
-                if self.peek_token() and self.peek_token()[0] != 'RPAREN':
+                if self.peek_token() and self.peek_token()[0] != RPAREN:
                     args.append(self.parse_expression())
-                    while self.peek_token() and self.peek_token()[0] == 'COMMA':
-                        self.eat('COMMA')
+                    while self.peek_token() and self.peek_token()[0] == COMMA:
+                        self.eat(COMMA)
                         args.append(self.parse_expression())
-                self.eat('RPAREN')
+                self.eat(RPAREN)
                 return CallNode(name, args)
 
             node = NumberNode(name, size=32)
 
-            if self.peek_token() and self.peek_token()[0] == 'LBRACK':
-                while self.peek_token() and self.peek_token()[0] == 'LBRACK':
-                    self.eat('LBRACK')
+            if self.peek_token() and self.peek_token()[0] == LBRACK:
+                while self.peek_token() and self.peek_token()[0] == LBRACK:
+                    self.eat(LBRACK)
                     index_expr = self.parse_expression()
-                    self.eat('RBRACK')
+                    self.eat(RBRACK)
 
                     multiplier = current_size // 8 if current_size else 4
                     if multiplier > 1:
@@ -475,8 +644,8 @@ class Parser:
 
     def parse_expression(self, size=None, is_float=False):
         node = self.parse_factor(size=size, is_float=is_float)
-        while self.peek_token() and self.peek_token()[0] == 'OP':
-            op = self.eat('OP')[1]
+        while self.peek_token() and self.peek_token()[0] == OP:
+            op = self.eat(OP)[1]
             right = self.parse_factor(size=size, is_float=is_float)
             op_is_float = is_float or getattr(node, 'is_float', False) or getattr(right, 'is_float', False)
             node = BinOpNode(node, op, right, is_float=op_is_float)
@@ -488,24 +657,24 @@ class Parser:
 
         current_line_text = self.get_source_comment(t[2])
 
-        if t[0] == 'DEF':
+        if t[0] == DEF:
             if self.nesting_level > 0:
                 self.error("Can't define global variables inside nested blocks.")
 
-            self.eat('DEF')
-            type_token = self.eat('TYPE')
+            self.eat(DEF)
+            type_token = self.eat(TYPE)
             is_float = (type_token[1] == 'float32')
             if type_token[1] == 'uint8': size = 8
             elif type_token[1] == 'uint16': size = 16
             else: size = 32
 
-            var_name = self.eat('NAME')[1]
+            var_name = self.eat(NAME)[1]
 
             explicit_array_size = None
-            if self.peek_token() and self.peek_token()[0] == 'LBRACK':
-                self.eat('LBRACK')
-                explicit_array_size = int(self.eat('NUMBER')[1], 0)
-                self.eat('RBRACK')
+            if self.peek_token() and self.peek_token()[0] == LBRACK:
+                self.eat(LBRACK)
+                explicit_array_size = int(self.eat(NUMBER)[1], 0)
+                self.eat(RBRACK)
 
             if var_name in self.defined_globals:
                 self.error(f"Variable '{var_name}' already exists.")
@@ -515,17 +684,17 @@ class Parser:
             val_node = None
             next_t = self.peek_token()
 
-            if next_t and next_t[0] == 'ASSIGN':
-                self.eat('ASSIGN')
-                if self.peek_token() and self.peek_token()[0] == 'LBRACE':
-                    self.eat('LBRACE')
+            if next_t and next_t[0] == ASSIGN:
+                self.eat(ASSIGN)
+                if self.peek_token() and self.peek_token()[0] == LBRACE:
+                    self.eat(LBRACE)
                     elements = []
-                    if self.peek_token() and self.peek_token()[0] != 'RBRACE':
+                    if self.peek_token() and self.peek_token()[0] != RBRACE:
                         elements.append(self.parse_expression(size=size, is_float=is_float))
-                        while self.peek_token() and self.peek_token()[0] == 'COMMA':
-                            self.eat('COMMA')
+                        while self.peek_token() and self.peek_token()[0] == COMMA:
+                            self.eat(COMMA)
                             elements.append(self.parse_expression(size=size, is_float=is_float))
-                    self.eat('RBRACE')
+                    self.eat(RBRACE)
 
                     if explicit_array_size is not None:
                         while len(elements) < explicit_array_size:
@@ -542,7 +711,7 @@ class Parser:
             else:
                 val_node = NumberNode(0.0 if is_float else 0, size=size, is_float=is_float, source_line=current_line_text)
 
-            self.eat('SEMICOLON')
+            self.eat(SEMICOLON)
 
             total_bits = size
             if isinstance(val_node, ArrayNode):
@@ -550,52 +719,52 @@ class Parser:
 
             return GlobalVarNode(var_name, total_bits, val_node, size=size, source_line=current_line_text)
 
-        if t[0] == 'ASM':
-            self.eat('ASM')
-            self.eat('LBRACE')
+        if t[0] == ASM:
+            self.eat(ASM)
+            self.eat(LBRACE)
             asm_content = ""
-            while self.peek_token() and self.peek_token()[0] != 'RBRACE':
+            while self.peek_token() and self.peek_token()[0] != RBRACE:
                 token_type, token_value, _ = self.eat()
                 
-                if token_type == 'SEMICOLON':
+                if token_type == SEMICOLON:
                     asm_content += "\n"
-                elif token_type == 'LABEL':
+                elif token_type == LABEL:
                     asm_content += token_value.strip() + "\n"
                 else:
                     asm_content += token_value + " "
             
-            self.eat('RBRACE')
+            self.eat(RBRACE)
             return InlineAsmNode(asm_content, source_line=current_line_text)
 
-        if t[0] == 'FN':
-            fn_token = self.eat('FN')
+        if t[0] == FN:
+            fn_token = self.eat(FN)
             start_line = fn_token[2]
-            name = self.eat('NAME')[1]
-            self.eat('LPAREN')
+            name = self.eat(NAME)[1]
+            self.eat(LPAREN)
             params = []
-            if self.peek_token()[0] != 'RPAREN':
+            if self.peek_token()[0] != RPAREN:
                 param_token = self.peek_token()
-                if param_token[0] == 'NAME' or param_token[0] == 'NUMBER':
+                if param_token[0] == NAME or param_token[0] == NUMBER:
                     params.append(self.eat()[1])
-                while self.peek_token()[0] == 'COMMA':
-                    self.eat('COMMA')
+                while self.peek_token()[0] == COMMA:
+                    self.eat(COMMA)
                     next_param = self.peek_token()
-                    if next_param[0] in ['NAME', 'NUMBER']:
+                    if next_param[0] in [NAME, NUMBER]:
                         params.append(self.eat()[1])
                     else:
                         self.error("Expected parameter name or number")
-            self.eat('RPAREN')
-            self.eat('LBRACE')
+            self.eat(RPAREN)
+            self.eat(LBRACE)
             self.nesting_level += 1
 
             block = []
-            while self.peek_token() and self.peek_token()[0] != 'RBRACE':
+            while self.peek_token() and self.peek_token()[0] != RBRACE:
                 block.append(self.parse_statement())
             
-            if not self.peek_token() or self.peek_token()[0] != 'RBRACE':
+            if not self.peek_token() or self.peek_token()[0] != RBRACE:
                 raise CompilerError(f"Unclosed function '{name}'. Started in line {start_line}", line=start_line)
 
-            self.eat('RBRACE')
+            self.eat(RBRACE)
             self.nesting_level -= 1
 
             def check_for_return(stmts):
@@ -604,86 +773,92 @@ class Parser:
                     if isinstance(s, IfNode):
                         if check_for_return(s.block): return True
                         if s.else_block and check_for_return(s.else_block): return True
+                    if isinstance(s, SwitchNode) and any(check_for_return(block) for block in switch_blocks(s)): return True
                 return False
 
             if not check_for_return(block): self.error(f"Missing return at function '{name}'.")
 
             return FunctionDefNode(name, params, block, source_line=current_line_text)
 
-        if t[0] == 'RETURN':
-            self.eat('RETURN')
+        if t[0] == RETURN:
+            self.eat(RETURN)
             value_node = None
-            if self.peek_token() and self.peek_token()[0] != 'SEMICOLON':
+            if self.peek_token() and self.peek_token()[0] != SEMICOLON:
                 value_node = self.parse_expression()
-            self.eat('SEMICOLON')
+            self.eat(SEMICOLON)
             return ReturnNode(value_node, source_line=current_line_text)
 
-        if t[0] == 'NAME':
-            next_t = self.tokens[self.pos + 1] if self.pos + 1 < len(self.tokens) else None
-            if next_t and next_t[0] == 'LPAREN':
-                name = self.eat('NAME')[1]
-                self.eat('LPAREN')
+        if t[0] == NAME:
+            next_t = self.peek_next_token()
+            if next_t and next_t[0] == LPAREN:
+                name = self.eat(NAME)[1]
+                self.eat(LPAREN)
                 args = []
-                if self.peek_token() and self.peek_token()[0] != 'RPAREN':
+                if self.peek_token() and self.peek_token()[0] != RPAREN:
                     args.append(self.parse_expression())
-                    while self.peek_token() and self.peek_token()[0] == 'COMMA':
-                        self.eat('COMMA')
+                    while self.peek_token() and self.peek_token()[0] == COMMA:
+                        self.eat(COMMA)
                         args.append(self.parse_expression())
-                self.eat('RPAREN')
-                self.eat('SEMICOLON')
+                self.eat(RPAREN)
+                self.eat(SEMICOLON)
                 return CallNode(name, args, source_line=current_line_text)
             return NumberNode(name, size=current_size if current_size else 32)
 
-        if t[0] == 'LABEL': 
-            return LabelNode(self.eat('LABEL')[1], source_line=current_line_text)
+        if t[0] == LABEL: 
+            return LabelNode(self.eat(LABEL)[1], source_line=current_line_text)
         
-        if t[0] == 'DIRECTIVE':
+        if t[0] == DIRECTIVE:
             node = self.parse_directive()
             node.source_line = current_line_text
             return node
 
-        if t[0] == 'GOTO':
+        if t[0] == GOTO:
             node = self.parse_goto()
             node.source_line = current_line_text
             return node
 
-        if t[0] == 'IF':
+        if t[0] == IF:
             node = self.parse_if()
             node.source_line = current_line_text
             return node
 
-        if t[0] == 'WHILE':
+        if t[0] == WHILE:
             node = self.parse_while()
             node.source_line = current_line_text
             return node
 
-        if t[0] == 'OUT':
-            self.eat('OUT')
+        if t[0] == SWITCH:
+            node = self.parse_switch()
+            node.source_line = current_line_text
+            return node
+
+        if t[0] == OUT:
+            self.eat(OUT)
             port = self.parse_expression()
-            self.eat('COMMA')
+            self.eat(COMMA)
             data = self.parse_expression()
-            self.eat('SEMICOLON')
+            self.eat(SEMICOLON)
             return OutNode(port, data, source_line=current_line_text)
 
-        if t[0] == 'TYPE':
-            type_token = self.eat('TYPE')
+        if t[0] == TYPE:
+            type_token = self.eat(TYPE)
             is_float = (type_token[1] == 'float32')
             if type_token[1] == 'uint8': current_size = 8
             elif type_token[1] == 'uint16': current_size = 16
             else: current_size = 32
 
             t = self.peek_token()
-            if t and t[0] in ['NUMBER', 'DEREF', 'NAME']:
+            if t and t[0] in [NUMBER, DEREF, NAME]:
                 node = self.parse_assignment(current_size, is_float=is_float)
-                self.eat('SEMICOLON')
+                self.eat(SEMICOLON)
                 return node
             else:
                 self.error(f"Expected assignment after type '{type_token[1]}'")
 
-        if t[0] in ['NUMBER', 'DEREF']:
+        if t[0] in [NUMBER, DEREF]:
             self.error(f"Explicit type required for assignment at '{t[1]}'")
 
-        if t[0] == 'NAME':
+        if t[0] == NAME:
             self.error(f"Explicit type required before variable/address '{t[1]}'")
         
         self.error(f"Syntax error at {t}")
@@ -693,23 +868,23 @@ class Parser:
         if isinstance(target, DerefNode):
             target.size = size
 
-        self.eat('ASSIGN')
+        self.eat(ASSIGN)
         value = self.parse_expression(size=size, is_float=is_float)
         return AssignNode(target, value, size=size)
 
     def parse_goto(self):
-        self.eat('GOTO')
+        self.eat(GOTO)
         target = self.parse_expression()
-        self.eat('SEMICOLON')
+        self.eat(SEMICOLON)
         return GotoNode(target)
 
     def parse_directive(self):
-        name = self.eat('DIRECTIVE')[1]
-        val = self.eat('NUMBER')[1]
+        name = self.eat(DIRECTIVE)[1]
+        val = self.eat(NUMBER)[1]
         return DirectiveNode(name, val)
 
     def parse_if(self):
-        if_token = self.eat('IF')
+        if_token = self.eat(IF)
         start_line = if_token[2]
         
         left = self.parse_expression()
@@ -718,23 +893,23 @@ class Parser:
 
         is_float = getattr(left, 'is_float', False) or getattr(right, 'is_float', False)
         
-        self.eat('LBRACE')
+        self.eat(LBRACE)
         self.nesting_level += 1
         block = []
-        while self.peek_token() and self.peek_token()[0] != 'RBRACE':
+        while self.peek_token() and self.peek_token()[0] != RBRACE:
             block.append(self.parse_statement())
-        self.eat('RBRACE')
+        self.eat(RBRACE)
         self.nesting_level -= 1
 
         else_block = None
-        if self.peek_token() and self.peek_token()[0] == 'ELSE':
-            self.eat('ELSE')
-            self.eat('LBRACE')
+        if self.peek_token() and self.peek_token()[0] == ELSE:
+            self.eat(ELSE)
+            self.eat(LBRACE)
             self.nesting_level += 1
             else_block = []
-            while self.peek_token() and self.peek_token()[0] != 'RBRACE':
+            while self.peek_token() and self.peek_token()[0] != RBRACE:
                 else_block.append(self.parse_statement())
-            self.eat('RBRACE')
+            self.eat(RBRACE)
             self.nesting_level -= 1
             
         node = IfNode(left, op, right, block, else_block)
@@ -742,7 +917,7 @@ class Parser:
         return node
 
     def parse_while(self):
-        while_token = self.eat('WHILE')
+        while_token = self.eat(WHILE)
         start_line = while_token[2]
         
         left = self.parse_expression()
@@ -751,50 +926,1078 @@ class Parser:
 
         is_float = getattr(left, 'is_float', False) or getattr(right, 'is_float', False)
 
-        self.eat('LBRACE')
+        self.eat(LBRACE)
         self.nesting_level += 1
         block = []
-        while self.peek_token() and self.peek_token()[0] != 'RBRACE':
+        while self.peek_token() and self.peek_token()[0] != RBRACE:
             block.append(self.parse_statement())
-        self.eat('RBRACE')
+        self.eat(RBRACE)
         self.nesting_level -= 1
             
         node = WhileNode(left, op, right, block)
         node.is_float = is_float
         return node
 
+    def parse_switch(self):
+        self.eat(SWITCH)
+        value = self.parse_expression()
+
+        self.eat(LBRACE)
+        self.nesting_level += 1
+        cases, default, seen = [], None, set()
+        while self.peek_token() and self.peek_token()[0] != RBRACE:
+            t = self.peek_token()
+            if t[0] == CASE:
+                self.eat(CASE)
+                values = [self.parse_case_value(seen)]
+                while self.peek_token() and self.peek_token()[0] == COMMA:
+                    self.eat(COMMA)
+                    values.append(self.parse_case_value(seen))
+                self.eat(COLON)
+                block = []
+                cases.append((values, block))
+            elif t[0] == LABEL and t[1] == "default:":
+                if default is not None: self.error("Duplicate 'default' in switch.")
+                self.eat(LABEL)
+                block = default = []
+            elif not cases and default is None:
+                self.error("Expected 'case' or 'default' in switch.")
+            else:
+                block.append(self.parse_statement())
+        self.eat(RBRACE)
+        self.nesting_level -= 1
+
+        if not cases: self.error("Switch needs at least one case.")
+        return SwitchNode(value, cases, default)
+
+    def parse_case_value(self, seen):
+        node = fold_expression(self.parse_expression())
+        if not is_int_constant(node):
+            self.error("Case values must be integer constants.")
+        value = node.value & 0xFFFFFFFF
+        if value in seen:
+            self.error(f"Duplicate case value {value}.")
+        seen.add(value)
+        return value
+
     def parse_program(self):
         stmts = []
         while self.peek_token(): stmts.append(self.parse_statement())
         return stmts
 
-def float_to_hex(f):
-    return hex(struct.unpack('<I', struct.pack('<f', f))[0])
+def register_bits(node):
+    if not isinstance(node, NumberNode) or isinstance(node.value, str):
+        return None
+    if node.is_float and isinstance(node.value, float):
+        return float_to_int(node.value)
+    return node.value & 0xFFFFFFFF
+
+def int_to_float(bits):
+    return struct.unpack('<f', struct.pack('<I', bits))[0]
+
+def is_int_constant(node):
+    return isinstance(node, NumberNode) and isinstance(node.value, int) and not node.is_float
+
+def has_call(node):
+    if isinstance(node, CallNode): return True
+    if isinstance(node, BinOpNode): return has_call(node.left) or has_call(node.right)
+    if isinstance(node, DerefNode): return has_call(node.target)
+    return False
+
+def has_jump_target(stmts):
+    for s in stmts:
+        if isinstance(s, (LabelNode, InlineAsmNode, FunctionDefNode)): return True
+        if isinstance(s, IfNode):
+            if has_jump_target(s.block) or (s.else_block and has_jump_target(s.else_block)): return True
+        if isinstance(s, WhileNode) and has_jump_target(s.block): return True
+        if isinstance(s, SwitchNode) and any(has_jump_target(block) for block in switch_blocks(s)): return True
+    return False
+
+def switch_blocks(node):
+    blocks = [block for _, block in node.cases]
+    if node.default is not None: blocks.append(node.default)
+    return blocks
+
+INT_FOLDS = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": lambda a, b: a // b if b else None,
+    "%": lambda a, b: a % b if b else None,
+    "&": lambda a, b: a & b,
+    "|": lambda a, b: a | b,
+    "^": lambda a, b: a ^ b,
+    "<<": lambda a, b: a << (b & 0x1F),
+    ">>": lambda a, b: a >> (b & 0x1F),
+}
+
+FLOAT_FOLDS = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": lambda a, b: a / b if b != 0.0 else None,
+    "%": lambda a, b: math.fmod(a, b) if b != 0.0 else None,
+}
+
+CONDITIONS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<=": lambda a, b: a <= b,
+}
+
+def constant_condition(left, op, right):
+    a, b = register_bits(left), register_bits(right)
+    if a is None or b is None or op not in CONDITIONS:
+        return None
+    return CONDITIONS[op](a, b)
+
+def fold_expression(node):
+    if isinstance(node, BinOpNode):
+        node.left = fold_expression(node.left)
+        node.right = fold_expression(node.right)
+        left, right, op = node.left, node.right, node.op
+
+        if node.is_float:
+            if op in FLOAT_FOLDS and isinstance(left, NumberNode) and isinstance(right, NumberNode):
+                a, b = register_bits(left), register_bits(right)
+                if a is not None and b is not None:
+                    result = FLOAT_FOLDS[op](int_to_float(a), int_to_float(b))
+                    if result is not None and math.isfinite(result):
+                        try:
+                            return NumberNode(int_to_float(float_to_int(result)), size=32, is_float=True)
+                        except OverflowError:
+                            pass # beyond float32, the VM computes it at run time
+            return node
+
+        if is_int_constant(left) and is_int_constant(right) and op in INT_FOLDS:
+            result = INT_FOLDS[op](left.value & 0xFFFFFFFF, right.value & 0xFFFFFFFF)
+            if result is not None:
+                return NumberNode(result & 0xFFFFFFFF, size=32)
+            return node
+
+        if is_int_constant(right):
+            value = right.value & 0xFFFFFFFF
+            if value == 0 and op in ("+", "-", "|", "^", "<<", ">>"): return left
+            if value == 1 and op in ("*", "/"): return left
+            if value == 0xFFFFFFFF and op == "&": return left
+            if value == 0 and op in ("*", "&") and not has_call(left): return NumberNode(0, size=32)
+        elif is_int_constant(left):
+            value = left.value & 0xFFFFFFFF
+            if value == 0 and op in ("+", "|", "^"): return right
+            if value == 1 and op == "*": return right
+            if value == 0xFFFFFFFF and op == "&": return right
+            if value == 0 and op in ("*", "&", "<<", ">>") and not has_call(right): return NumberNode(0, size=32)
+        return reduce_strength(node)
+
+    if isinstance(node, DerefNode):
+        node.target = fold_expression(node.target)
+    elif isinstance(node, CallNode):
+        node.args = [fold_expression(arg) for arg in node.args]
+    return node
+
+def reduce_strength(node):
+    left, right, op = node.left, node.right, node.op
+    if op == "*" and is_int_constant(left):
+        left, right = right, left
+    if not is_int_constant(right) or op not in ("*", "/", "%"):
+        return node
+    value = right.value & 0xFFFFFFFF
+    if value < 2 or value & (value - 1):
+        return node
+    if op == "%":
+        return BinOpNode(left, "&", NumberNode(value - 1, size=32), source_line=node.source_line)
+    shift = NumberNode(value.bit_length() - 1, size=32)
+    return BinOpNode(left, "<<" if op == "*" else ">>", shift, source_line=node.source_line)
+
+def fold_initializer(node, size):
+    folded = fold_expression(node)
+    if folded is not node and is_int_constant(folded):
+        folded.value &= (1 << size) - 1
+        folded.size = size
+    return folded
+
+def fold_constants(statements):
+    result = []
+    for stmt in statements:
+        if isinstance(stmt, GlobalVarNode):
+            if isinstance(stmt.value, ArrayNode):
+                stmt.value.elements = [fold_initializer(el, stmt.size) for el in stmt.value.elements]
+            else:
+                stmt.value = fold_initializer(stmt.value, stmt.size)
+
+        elif isinstance(stmt, FunctionDefNode):
+            stmt.block = fold_constants(stmt.block)
+
+        elif isinstance(stmt, AssignNode):
+            stmt.value = fold_expression(stmt.value)
+            if isinstance(stmt.target, DerefNode):
+                stmt.target.target = fold_expression(stmt.target.target)
+
+        elif isinstance(stmt, (ReturnNode, GotoNode)):
+            attr = "value" if isinstance(stmt, ReturnNode) else "target"
+            if getattr(stmt, attr) is not None:
+                setattr(stmt, attr, fold_expression(getattr(stmt, attr)))
+
+        elif isinstance(stmt, CallNode):
+            stmt.args = [fold_expression(arg) for arg in stmt.args]
+
+        elif isinstance(stmt, OutNode):
+            stmt.port = fold_expression(stmt.port)
+            stmt.data = fold_expression(stmt.data)
+
+        elif isinstance(stmt, IfNode):
+            stmt.left = fold_expression(stmt.left)
+            stmt.right = fold_expression(stmt.right)
+            stmt.block = fold_constants(stmt.block)
+            if stmt.else_block:
+                stmt.else_block = fold_constants(stmt.else_block)
+
+            taken = constant_condition(stmt.left, stmt.op, stmt.right)
+            if taken is not None:
+                kept, dropped = (stmt.block, stmt.else_block or []) if taken else (stmt.else_block or [], stmt.block)
+                if not has_jump_target(dropped):
+                    result.extend(kept)
+                    continue
+
+        elif isinstance(stmt, WhileNode):
+            stmt.left = fold_expression(stmt.left)
+            stmt.right = fold_expression(stmt.right)
+            stmt.block = fold_constants(stmt.block)
+            if constant_condition(stmt.left, stmt.op, stmt.right) is False and not has_jump_target(stmt.block):
+                continue
+
+        elif isinstance(stmt, SwitchNode):
+            stmt.value = fold_expression(stmt.value)
+            stmt.cases = [(values, fold_constants(block)) for values, block in stmt.cases]
+            if stmt.default is not None:
+                stmt.default = fold_constants(stmt.default)
+
+            if is_int_constant(stmt.value) and not any(has_jump_target(block) for block in switch_blocks(stmt)):
+                value = stmt.value.value & 0xFFFFFFFF
+                result.extend(next((block for values, block in stmt.cases if value in values), stmt.default or []))
+                continue
+
+        result.append(stmt)
+    return result
+
+def nested_statements(stmts):
+    for s in stmts:
+        yield s
+        if isinstance(s, (IfNode, WhileNode)):
+            yield from nested_statements(s.block)
+            if isinstance(s, IfNode) and s.else_block:
+                yield from nested_statements(s.else_block)
+        elif isinstance(s, SwitchNode):
+            for block in switch_blocks(s): yield from nested_statements(block)
+
+def map_statement(s, fn):
+    if isinstance(s, AssignNode):
+        s.value = fn(s.value)
+        if isinstance(s.target, DerefNode): s.target.target = fn(s.target.target)
+        else: s.target = fn(s.target)
+    elif isinstance(s, ReturnNode) and s.value is not None:
+        s.value = fn(s.value)
+    elif isinstance(s, GotoNode):
+        s.target = fn(s.target)
+    elif isinstance(s, CallNode):
+        s.args = [fn(arg) for arg in s.args]
+    elif isinstance(s, OutNode):
+        s.port = fn(s.port)
+        s.data = fn(s.data)
+    elif isinstance(s, (IfNode, WhileNode)):
+        s.left = fn(s.left)
+        s.right = fn(s.right)
+    elif isinstance(s, SwitchNode):
+        s.value = fn(s.value)
+
+def map_expression(node, fn):
+    if isinstance(node, BinOpNode):
+        node.left = map_expression(node.left, fn)
+        node.right = map_expression(node.right, fn)
+    elif isinstance(node, DerefNode):
+        node.target = map_expression(node.target, fn)
+    elif isinstance(node, CallNode):
+        node.args = [map_expression(arg, fn) for arg in node.args]
+    return fn(node)
+
+def expression_cost(node):
+    if isinstance(node, BinOpNode): return 1 + expression_cost(node.left) + expression_cost(node.right)
+    if isinstance(node, DerefNode): return 1 + expression_cost(node.target)
+    if isinstance(node, CallNode): return 1 + sum(expression_cost(arg) for arg in node.args)
+    return 1
+
+def inline_cost(stmts):
+    cost = 0
+    def count(node):
+        nonlocal cost
+        cost += expression_cost(node)
+        return node
+    for s in nested_statements(stmts):
+        cost += 1
+        map_statement(s, count)
+    return cost
+
+def called_names(stmts):
+    names = []
+    def collect(node):
+        if isinstance(node, CallNode): names.append(node.name)
+        return node
+    for s in nested_statements(stmts):
+        map_statement(s, lambda node: map_expression(node, collect))
+        if isinstance(s, CallNode): names.append(s.name)
+    return names
+
+def inlinable_body(stmts):
+    if not stmts or not isinstance(stmts[-1], ReturnNode): return False
+    for s in nested_statements(stmts[:-1]):
+        if isinstance(s, (ReturnNode, LabelNode, GotoNode, InlineAsmNode, FunctionDefNode, GlobalVarNode, DirectiveNode)):
+            return False
+    return True
+
+def param_uses(node, params, fixed, uses, weight):
+    name = store_name(node) if isinstance(node, DerefNode) else None
+    if name in params:
+        if node.size != 32: fixed.add(name)
+        uses[name] = uses.get(name, 0) + weight
+    elif isinstance(node, NumberNode) and node.value in params:
+        fixed.add(node.value)
+    elif isinstance(node, str) and node in params:
+        fixed.add(node)
+    elif isinstance(node, BinOpNode):
+        param_uses(node.left, params, fixed, uses, weight)
+        param_uses(node.right, params, fixed, uses, weight)
+    elif isinstance(node, DerefNode):
+        param_uses(node.target, params, fixed, uses, weight)
+    elif isinstance(node, CallNode):
+        for arg in node.args: param_uses(arg, params, fixed, uses, weight)
+    return node
+
+def stable_reads(node, written):
+    if isinstance(node, NumberNode): return True
+    if isinstance(node, BinOpNode): return stable_reads(node.left, written) and stable_reads(node.right, written)
+    if isinstance(node, DerefNode):
+        name = store_name(node)
+        return name is not None and name not in written
+    return False
+
+def substitute_params(node, values):
+    name = store_name(node) if isinstance(node, DerefNode) and node.size == 32 else None
+    return copy.deepcopy(values[name]) if name in values else node
+
+def inline_functions(statements, export_list, limit, inlined):
+    functions = {s.name: s for s in statements if isinstance(s, FunctionDefNode)}
+    calls = {name: set(called_names(f.block)) for name, f in functions.items()}
+    sites = called_names(statements)
+    for f in functions.values(): sites += called_names(f.block)
+    escaped = find_escaped(statements, set())
+    readers = find_readers(statements)
+
+    def reaches(name, target, seen):
+        for callee in calls.get(name, ()):
+            if callee == target: return True
+            if callee not in seen:
+                seen.add(callee)
+                if reaches(callee, target, seen): return True
+        return False
+
+    sizes = {s.name: s.size for s in statements if isinstance(s, GlobalVarNode)}
+    candidates = {name for name, f in functions.items() if name not in export_list and not reaches(name, name, set())
+                  and all(sizes.get(p) == 32 for p in f.params) and inlinable_body(f.block)}
+    plans = {}
+
+    def plan(name):
+        if name not in candidates: return None
+        if name not in plans:
+            f = functions[name]
+            f.block = inline_block(f.block)
+            looped = {id(s) for loop in nested_statements(f.block) if isinstance(loop, WhileNode) for s in nested_statements([loop])}
+            fixed, uses = set(), {}
+            for s in nested_statements(f.block):
+                weight = 2 if id(s) in looped else 1
+                map_statement(s, lambda node: param_uses(node, f.params, fixed, uses, weight))
+            for p in f.params:
+                if p in escaped or any(owner is not f for owner in readers.get(p, ())): fixed.add(p)
+            reads, writes = set(), []
+            barrier = block_effects(f.block, reads, writes)
+            written = None if barrier else {name for name, _ in writes}
+            if written and None in written: written |= escaped
+            keep = inline_cost(f.block) > limit and (sites.count(name) > 1 or name in escaped)
+            plans[name] = None if keep else (f, fixed, uses, written)
+        return plans[name]
+
+    def bind(call):
+        entry = plan(call.name)
+        if entry is None: return None
+        f, fixed, uses, written = entry
+        if len(call.args) != len(f.params) or any(has_call(arg) for arg in call.args): return None
+        reads = set()
+        for arg in call.args: expression_effects(arg, reads)
+        if any(name in f.params for name, _ in reads): return None
+
+        prologue, values = [], {}
+        for param, arg in zip(f.params, call.args):
+            atom = immediate_value(arg) is not None or isinstance(arg, DerefNode)
+            stable = immediate_value(arg) is not None or (written is not None and stable_reads(arg, written))
+            if param not in fixed and stable and (atom or uses.get(param, 0) <= 1):
+                values[param] = arg
+            else:
+                prologue.append(AssignNode(NumberNode(param), arg, size=32))
+        return f, prologue, values
+
+    def expand(call, f, values):
+        body = copy.deepcopy(f.block)
+        for s in nested_statements(body):
+            map_statement(s, lambda node: map_expression(node, lambda n: substitute_params(n, values)))
+        inlined[call.name] = inlined.get(call.name, 0) + 1
+        return body
+
+    def inline_expression(node):
+        if not isinstance(node, CallNode): return node
+        bound = bind(node)
+        if bound is None or bound[1] or len(bound[0].block) != 1 or bound[0].block[0].value is None: return node
+        if any(immediate_value(arg) is None for arg in node.args): return node
+        return expand(node, bound[0], bound[2])[0].value
+
+    def inline_block(stmts):
+        result = []
+        for s in stmts:
+            if isinstance(s, (IfNode, WhileNode)):
+                s.block = inline_block(s.block)
+                if isinstance(s, IfNode) and s.else_block:
+                    s.else_block = inline_block(s.else_block)
+            elif isinstance(s, SwitchNode):
+                s.cases = [(values, inline_block(block)) for values, block in s.cases]
+                if s.default is not None:
+                    s.default = inline_block(s.default)
+
+            call = s if isinstance(s, CallNode) else s.value if isinstance(s, (AssignNode, ReturnNode)) and isinstance(s.value, CallNode) else None
+            if call is not None:
+                call.args = [map_expression(arg, inline_expression) for arg in call.args]
+                bound = bind(call)
+                value = bound[0].block[-1].value if bound else None
+                if bound and (not has_call(value) if call is s else value is not None):
+                    f, prologue, values = bound
+                    body = expand(call, f, values)
+                    if call is s:
+                        body.pop()
+                    else:
+                        s.value = body.pop().value
+                        body.append(s)
+                    result.extend(prologue + body)
+                    continue
+
+            map_statement(s, lambda node: map_expression(node, inline_expression))
+            result.append(s)
+        return result
+
+    for f in functions.values():
+        if f.name in candidates: plan(f.name)
+        else: f.block = inline_block(f.block)
+    return inline_block(statements)
 
 if_label_count = 0
 call_label_count = 0
 
-def generate_asm(statements, is_sub_block=False, rm=None, strings_to_embed=None, external_symbols=None, global_vars=None):
+JUMP_IF_NOT = {"==": "jne", "!=": "je", "<": "jge", ">": "jle", ">=": "jl", "<=": "jg"}
+JUMP_IF = {"==": "je", "!=": "jne", "<": "jl", ">": "jg", ">=": "jge", "<=": "jle"}
+
+def float_to_int(f):
+    return struct.unpack('<I', struct.pack('<f', f))[0]
+
+def string_bytes(text):
+    return [ord(c) for c in text] + [0]
+
+def store_name(target):
+    if isinstance(target, DerefNode): target = target.target
+    if isinstance(target, NumberNode) and isinstance(target.value, str): return target.value
+    if isinstance(target, str): return target
+    return None
+
+def load_key(node, rm):
+    if isinstance(node, DerefNode):
+        name = store_name(node)
+        if name is not None and rm.cacheable.get(name) == node.size:
+            return (name, node.size)
+    return None
+
+def mark_escaped(node, escaped):
+    if isinstance(node, NumberNode):
+        if isinstance(node.value, str): escaped.add(node.value)
+    elif isinstance(node, BinOpNode):
+        mark_escaped(node.left, escaped)
+        mark_escaped(node.right, escaped)
+    elif isinstance(node, DerefNode):
+        if store_name(node) is None: mark_escaped(node.target, escaped)
+    elif isinstance(node, CallNode):
+        for arg in node.args: mark_escaped(arg, escaped)
+    elif isinstance(node, ArrayNode):
+        for el in node.elements: mark_escaped(el, escaped)
+
+def find_escaped(statements, escaped):
+    for s in statements:
+        if isinstance(s, GlobalVarNode):
+            mark_escaped(s.value, escaped)
+        elif isinstance(s, AssignNode):
+            mark_escaped(s.value, escaped)
+            if isinstance(s.target, DerefNode) and store_name(s.target) is None:
+                mark_escaped(s.target.target, escaped)
+        elif isinstance(s, FunctionDefNode):
+            find_escaped(s.block, escaped)
+        elif isinstance(s, ReturnNode) and s.value is not None:
+            mark_escaped(s.value, escaped)
+        elif isinstance(s, GotoNode) and not isinstance(s.target, str):
+            mark_escaped(s.target, escaped)
+        elif isinstance(s, CallNode):
+            mark_escaped(s, escaped)
+        elif isinstance(s, OutNode):
+            mark_escaped(s.port, escaped)
+            mark_escaped(s.data, escaped)
+        elif isinstance(s, (IfNode, WhileNode)):
+            mark_escaped(s.left, escaped)
+            mark_escaped(s.right, escaped)
+            find_escaped(s.block, escaped)
+            if isinstance(s, IfNode) and s.else_block:
+                find_escaped(s.else_block, escaped)
+        elif isinstance(s, SwitchNode):
+            mark_escaped(s.value, escaped)
+            for block in switch_blocks(s): find_escaped(block, escaped)
+        elif isinstance(s, InlineAsmNode):
+            escaped.update(WORD_PATTERN.findall(s.content))
+    return escaped
+
+def find_reads(statements, reads):
+    for s in statements:
+        if isinstance(s, AssignNode):
+            expression_effects(s.value, reads)
+            if isinstance(s.target, DerefNode) and store_name(s.target) is None:
+                expression_effects(s.target.target, reads)
+        elif isinstance(s, ReturnNode) and s.value is not None:
+            expression_effects(s.value, reads)
+        elif isinstance(s, GotoNode) and not isinstance(s.target, str):
+            expression_effects(s.target, reads)
+        elif isinstance(s, CallNode):
+            expression_effects(s, reads)
+        elif isinstance(s, OutNode):
+            expression_effects(s.port, reads)
+            expression_effects(s.data, reads)
+        elif isinstance(s, (IfNode, WhileNode)):
+            expression_effects(s.left, reads)
+            expression_effects(s.right, reads)
+            find_reads(s.block, reads)
+            if isinstance(s, IfNode) and s.else_block:
+                find_reads(s.else_block, reads)
+        elif isinstance(s, SwitchNode):
+            expression_effects(s.value, reads)
+            for block in switch_blocks(s): find_reads(block, reads)
+    return reads
+
+def register_args(statements, escaped):
+    return {s.name: min(len(s.params), len(ARG_REGS)) for s in statements if isinstance(s, FunctionDefNode) and s.params and s.name not in escaped}
+
+def find_readers(statements):
+    readers = {}
+    for s in statements:
+        if isinstance(s, FunctionDefNode):
+            owner, reads = s, find_reads(s.block, set())
+        else:
+            owner, reads = None, find_reads([s], set())
+        for name, _ in reads:
+            readers.setdefault(name, set()).add(owner)
+    return readers
+
+def expression_effects(node, reads):
+    if isinstance(node, CallNode):
+        for arg in node.args: expression_effects(arg, reads)
+        return True
+    if isinstance(node, BinOpNode):
+        return expression_effects(node.left, reads) | expression_effects(node.right, reads)
+    if isinstance(node, DerefNode):
+        name = store_name(node)
+        if name is not None:
+            reads.add((name, node.size))
+            return False
+        return expression_effects(node.target, reads)
+    return False
+
+def block_effects(stmts, reads, writes):
+    barrier = False
+    for s in stmts:
+        if isinstance(s, (LabelNode, GotoNode, InlineAsmNode, FunctionDefNode, CallNode)):
+            return True
+        if isinstance(s, AssignNode):
+            barrier |= expression_effects(s.value, reads)
+            name = store_name(s.target)
+            if isinstance(s.target, DerefNode) and name is None:
+                barrier |= expression_effects(s.target.target, reads)
+            writes.append((name, s.size))
+        elif isinstance(s, OutNode):
+            barrier |= expression_effects(s.port, reads) | expression_effects(s.data, reads)
+            writes.append((None, 32))
+        elif isinstance(s, ReturnNode) and s.value is not None:
+            barrier |= expression_effects(s.value, reads)
+        elif isinstance(s, (IfNode, WhileNode)):
+            barrier |= expression_effects(s.left, reads) | expression_effects(s.right, reads)
+            barrier |= block_effects(s.block, reads, writes)
+            if isinstance(s, IfNode) and s.else_block:
+                barrier |= block_effects(s.else_block, reads, writes)
+        elif isinstance(s, SwitchNode):
+            barrier |= expression_effects(s.value, reads)
+            for block in switch_blocks(s): barrier |= block_effects(block, reads, writes)
+    return barrier
+
+def loop_constants(stmts, rm, header, values):
+    def operand(node):
+        value = immediate_value(node)
+        if value is not None and value not in values: values.append(value)
+
+    def loads(node):
+        if isinstance(node, CallNode):
+            for arg in node.args: loads(arg)
+        elif isinstance(node, BinOpNode):
+            loads(node.left)
+            loads(node.right)
+        elif isinstance(node, DerefNode):
+            if immediate_value(node.target) is None: loads(node.target)
+            elif load_key(node, rm) not in header: operand(node.target)
+
+    for s in stmts:
+        if isinstance(s, AssignNode):
+            operand(s.value)
+            loads(s.value)
+            if isinstance(s.target, DerefNode):
+                operand(s.target.target)
+                loads(s.target.target)
+            else:
+                operand(s.target if isinstance(s.target, NumberNode) else NumberNode(store_name(s.target)))
+        elif isinstance(s, OutNode):
+            for node in (s.port, s.data):
+                operand(node)
+                loads(node)
+        elif isinstance(s, (IfNode, WhileNode)):
+            if constant_condition(s.left, s.op, s.right) is None:
+                for node in (s.left, s.right):
+                    operand(node)
+                    loads(node)
+            loop_constants(s.block, rm, header, values)
+            if isinstance(s, IfNode) and s.else_block:
+                loop_constants(s.else_block, rm, header, values)
+        elif isinstance(s, SwitchNode):
+            loads(s.value)
+            for block in switch_blocks(s): loop_constants(block, rm, header, values)
+    return values
+
+def induction_key(node, rm):
+    if not isinstance(node, BinOpNode) or node.op != "+" or node.is_float:
+        return None
+    for base_node, index in ((node.left, node.right), (node.right, node.left)):
+        base = immediate_value(base_node)
+        if base is None: continue
+        stride = 1
+        if isinstance(index, BinOpNode) and is_int_constant(index.right):
+            if index.op == "<<": stride = 1 << (index.right.value & 0x1F)
+            elif index.op == "*": stride = index.right.value & 0xFFFFFFFF
+            else: continue
+            index = index.left
+        key = load_key(index, rm)
+        if key is not None and key[1] == 32 and (stride > 1 or isinstance(base, str)):
+            return key + (base, stride)
+    return None
+
+def induction_step(node, name):
+    if not isinstance(node, BinOpNode) or node.op not in ("+", "-") or node.is_float:
+        return None
+    left, right = node.left, node.right
+    if node.op == "+" and is_int_constant(left):
+        left, right = right, left
+    if not (isinstance(left, DerefNode) and left.size == 32 and store_name(left) == name and is_int_constant(right)):
+        return None
+    return right.value if node.op == "+" else -right.value
+
+def stepped_only(stmts, name):
+    for s in stmts:
+        if isinstance(s, AssignNode) and store_name(s.target) == name:
+            if s.size != 32 or induction_step(s.value, name) is None: return False
+        elif isinstance(s, (IfNode, WhileNode)):
+            if not stepped_only(s.block, name): return False
+            if isinstance(s, IfNode) and s.else_block and not stepped_only(s.else_block, name): return False
+        elif isinstance(s, SwitchNode):
+            if not all(stepped_only(block, name) for block in switch_blocks(s)): return False
+    return True
+
+def induction_nodes(stmts, rm, found):
+    def visit(node):
+        if isinstance(node, BinOpNode):
+            key = induction_key(node, rm)
+            if key is not None: found.setdefault(key, node)
+            else:
+                visit(node.left)
+                visit(node.right)
+        elif isinstance(node, DerefNode):
+            visit(node.target)
+        elif isinstance(node, CallNode):
+            for arg in node.args: visit(arg)
+
+    for s in stmts:
+        if isinstance(s, AssignNode):
+            visit(s.value)
+            if isinstance(s.target, DerefNode): visit(s.target.target)
+        elif isinstance(s, OutNode):
+            visit(s.port)
+            visit(s.data)
+        elif isinstance(s, (IfNode, WhileNode)):
+            visit(s.left)
+            visit(s.right)
+            induction_nodes(s.block, rm, found)
+            if isinstance(s, IfNode) and s.else_block:
+                induction_nodes(s.else_block, rm, found)
+        elif isinstance(s, SwitchNode):
+            visit(s.value)
+            for block in switch_blocks(s): induction_nodes(block, rm, found)
+    return found
+
+def has_loop(stmts):
+    for s in stmts:
+        if isinstance(s, WhileNode): return True
+        if isinstance(s, IfNode) and (has_loop(s.block) or (s.else_block and has_loop(s.else_block))): return True
+        if isinstance(s, SwitchNode) and any(has_loop(block) for block in switch_blocks(s)): return True
+    return False
+
+UPDATING_OPS = {"add", "sub", "mul", "div", "mod", "and", "or", "xor", "not", "shl", "shr", "sar",
+                "fadd", "fsub", "fmul", "fdiv", "fmod", "f2i", "i2f"}
+DEFINING_OPS = UPDATING_OPS | {"mov", "pop", "in"}
+BRANCH_OPS = {"je", "jne", "jg", "jge", "jl", "jle"}
+TERMINATING_OPS = {"jmp", "ret", "halt", "switch"}
+
+def instr_regs(instr):
+    if instr.op == "params":
+        return [o.num for o in instr.operands], []
+    defs, uses = [], []
+    for i, operand in enumerate(instr.operands):
+        if not isinstance(operand, Reg) or operand.num < FIRST_VIRTUAL_REG: continue
+        if i == 0 and not operand.ptr and instr.op in DEFINING_OPS:
+            defs.append(operand.num)
+            if instr.op in UPDATING_OPS: uses.append(operand.num)
+        else:
+            uses.append(operand.num)
+    return defs, uses
+
+def split_blocks(items):
+    blocks = []
+    start = 0
+    for i, item in enumerate(items):
+        if isinstance(item, Label) and i > start:
+            blocks.append((start, i))
+            start = i
+        elif isinstance(item, Instr) and item.op in TERMINATING_OPS | BRANCH_OPS:
+            blocks.append((start, i + 1))
+            start = i + 1
+    if start < len(items):
+        blocks.append((start, len(items)))
+    return blocks
+
+def block_successors(items, blocks):
+    block_of_label = {}
+    for b, (start, end) in enumerate(blocks):
+        for item in items[start:end]:
+            if isinstance(item, Label): block_of_label[item.name] = b
+
+    successors = []
+    for b, (start, end) in enumerate(blocks):
+        last = next((item for item in reversed(items[start:end]) if isinstance(item, Instr)), None)
+        succ = set()
+        if last is not None and last.op == "switch":
+            succ.update(block_of_label[target.value] for target in last.operands[1:])
+        elif last is not None and (last.op == "jmp" or last.op in BRANCH_OPS):
+            target = last.operands[-1]
+            if isinstance(target, Imm):
+                if target.value in block_of_label: succ.add(block_of_label[target.value])
+            else:
+                succ.update(block_of_label.values())
+        if b + 1 < len(blocks) and (last is None or last.op not in TERMINATING_OPS):
+            succ.add(b + 1)
+        successors.append(succ)
+    return successors
+
+def analyze_liveness(items):
+    blocks = split_blocks(items)
+    successors = block_successors(items, blocks)
+    regs = [instr_regs(item) if isinstance(item, Instr) else ((), ()) for item in items]
+
+    gen, kill = [], []
+    for start, end in blocks:
+        g, k = set(), set()
+        for defs, uses in regs[start:end]:
+            g.update(u for u in uses if u not in k)
+            k.update(defs)
+        gen.append(g)
+        kill.append(k)
+
+    live_in = [set() for _ in blocks]
+    live_out = [set() for _ in blocks]
+    changed = True
+    while changed:
+        changed = False
+        for b in reversed(range(len(blocks))):
+            out = set()
+            for s in successors[b]: out |= live_in[s]
+            new_in = gen[b] | (out - kill[b])
+            if out != live_out[b] or new_in != live_in[b]:
+                live_out[b], live_in[b] = out, new_in
+                changed = True
+
+    intervals = {}
+    def extend(reg, pos):
+        if reg in intervals:
+            lo, hi = intervals[reg]
+            intervals[reg] = (min(lo, pos), max(hi, pos))
+        else:
+            intervals[reg] = (pos, pos)
+
+    live_at = {}
+    for b, (start, end) in enumerate(blocks):
+        for reg in live_in[b]: extend(reg, start)
+        live = set(live_out[b])
+        for reg in live: extend(reg, end - 1)
+        for i in reversed(range(start, end)):
+            item = items[i]
+            if isinstance(item, Instr) and item.op == "call" or isinstance(item, SaveLive):
+                live_at[id(item)] = set(live)
+            defs, uses = regs[i]
+            for reg in defs: extend(reg, i)
+            for reg in uses: extend(reg, i)
+            live.difference_update(defs)
+            live.update(uses)
+    return intervals, live_at
+
+def copy_hints(items):
+    hints = {}
+    for item in items:
+        if isinstance(item, Instr) and item.op == "mov" and len(item.operands) == 2:
+            dst, src = item.operands
+            if isinstance(dst, Reg) and isinstance(src, Reg) and not dst.ptr and not src.ptr:
+                hints.setdefault(dst.num, src.num)
+    return hints
+
+def rematerializable(items):
+    values = {}
+    for item in items:
+        if not isinstance(item, Instr): continue
+        defs, _ = instr_regs(item)
+        for reg in defs:
+            src = item.operands[1] if item.op == "mov" and len(item.operands) == 2 else None
+            if isinstance(src, Imm) and not src.ptr and values.get(reg, src) == src:
+                values[reg] = src
+            else:
+                values[reg] = None
+    return {reg: imm for reg, imm in values.items() if imm is not None}
+
+def argument_hints(items):
+    hints = {}
+    for item in items:
+        if isinstance(item, Instr) and item.op in ("args", "params"):
+            for operand, arg_reg in zip(item.operands, ARG_REGS):
+                if isinstance(operand, Reg): hints.setdefault(operand.num, arg_reg.num)
+    return hints
+
+def linear_scan(intervals, hints, count, fixed=None):
+    assignment = {}
+    spilled = set()
+    active = []
+    free = list(range(count))
+
+    for reg in sorted(intervals, key=lambda r: (intervals[r][0], r)):
+        start, end = intervals[reg]
+        for other in [a for a in active if intervals[a][1] <= start]:
+            active.remove(other)
+            free.append(assignment[other])
+
+        if free:
+            hint = assignment.get(hints.get(reg), fixed.get(reg) if fixed else None)
+            phys = hint if hint in free else min(free)
+            free.remove(phys)
+            assignment[reg] = phys
+            active.append(reg)
+            continue
+
+        victim = max(active, key=lambda a: intervals[a][1])
+        if intervals[victim][1] > end:
+            assignment[reg] = assignment.pop(victim)
+            active.remove(victim)
+            active.append(reg)
+            spilled.add(victim)
+        else:
+            spilled.add(reg)
+    return assignment, spilled
+
+def allocate_registers(items, rm):
+    intervals, live_at = analyze_liveness(items)
+    hints = copy_hints(items)
+
+    fixed = argument_hints(items)
+
+    assignment, spilled = linear_scan(intervals, hints, ALLOCATABLE_REGS, fixed)
+    if spilled:
+        assignment, spilled = linear_scan(intervals, hints, ALLOCATABLE_REGS - len(SPILL_SCRATCH), fixed)
+
+    remat = rematerializable(items)
+    slots = {reg: rm.spill_slot() for reg in sorted(spilled) if reg not in remat}
+
+    def saved_regs(marker):
+        live = live_at.get(id(marker.call), set()) & live_at.get(id(marker), set())
+        return sorted((assignment[reg], reg) for reg in live if reg in assignment)
+
+    saves = {}
+    result = []
+    for item in items:
+        if isinstance(item, SaveLive):
+            saves[id(item.call)] = saved_regs(item)
+            result.extend(Instr("push", (Reg(num),)) for num, reg in saves[id(item.call)] if reg not in remat)
+            continue
+        if isinstance(item, RestoreLive):
+            saved = saves.get(id(item.call), ())
+            result.extend(Instr("pop", (Reg(num),)) for num, reg in reversed(saved) if reg not in remat)
+            result.extend(Instr("mov", (Reg(num), remat[reg])) for num, reg in saved if reg in remat)
+            continue
+        if not isinstance(item, Instr):
+            result.append(item)
+            continue
+
+        if item.op == "args":
+            moves, loads = [], []
+            for operand, arg_reg in zip(item.operands, ARG_REGS):
+                if isinstance(operand, Imm):
+                    loads.append(Instr("mov", (arg_reg, operand)))
+                elif operand.num in assignment:
+                    moves.append((arg_reg.num, assignment[operand.num]))
+                elif operand.num in remat:
+                    loads.append(Instr("mov", (arg_reg, remat[operand.num])))
+                else:
+                    loads.append(Instr("mov", (arg_reg, Imm(slots[operand.num]))))
+                    loads.append(Instr("mov", (arg_reg, mem(arg_reg)), size=32))
+            result.extend(parallel_move(moves))
+            result.extend(loads)
+            continue
+
+        if item.op == "params":
+            moves = []
+            for operand, arg_reg in zip(item.operands, ARG_REGS):
+                if operand.num in assignment:
+                    moves.append((assignment[operand.num], arg_reg.num))
+                elif operand.num in slots:
+                    result.append(Instr("mov", (SPILL_SCRATCH[0], Imm(slots[operand.num]))))
+                    result.append(Instr("mov", (mem(SPILL_SCRATCH[0]), arg_reg), size=32))
+            result.extend(parallel_move(moves))
+            continue
+
+        if item.op == "switch":
+            item = Instr("jmp", item.operands[:1])
+
+        defs, uses = instr_regs(item)
+        if not defs and not uses:
+            result.append(item)
+            continue
+        if defs and defs[0] in spilled and defs[0] in remat:
+            continue
+
+        mapping = {}
+        before, after = [], []
+        scratch = list(SPILL_SCRATCH)
+        for operand in item.operands:
+            if not isinstance(operand, Reg) or operand.num < FIRST_VIRTUAL_REG or operand.num in mapping: continue
+            num = operand.num
+            if num in assignment:
+                mapping[num] = assignment[num]
+                continue
+            reg = scratch.pop(0)
+            mapping[num] = reg.num
+            if num in uses:
+                if num in remat:
+                    before.append(Instr("mov", (reg, remat[num])))
+                else:
+                    before.append(Instr("mov", (reg, Imm(slots[num]))))
+                    before.append(Instr("mov", (reg, mem(reg)), size=32))
+            if num in defs:
+                addr = SPILL_SCRATCH[1] if reg == SPILL_SCRATCH[0] else SPILL_SCRATCH[0]
+                after.append(Instr("mov", (addr, Imm(slots[num]))))
+                after.append(Instr("mov", (mem(addr), reg), size=32))
+
+        operands = tuple(Reg(mapping[o.num], o.ptr) if isinstance(o, Reg) and o.num in mapping else o for o in item.operands)
+        if item.op == "mov" and len(operands) == 2 and operands[0] == operands[1] and isinstance(operands[0], Reg):
+            continue
+        result.extend(before)
+        result.append(Instr(item.op, operands, size=item.size, signed=item.signed, source_line=item.source_line))
+        result.extend(after)
+    return result
+
+def parallel_move(moves):
+    moves = [(dst, src) for dst, src in moves if dst != src]
+    used = {reg for move in moves for reg in move}
+    temp = next(n for n in range(ALLOCATABLE_REGS) if n not in used)
+    result = []
+    while moves:
+        ready = [move for move in moves if all(move[0] != src for _, src in moves)]
+        if not ready:
+            dst, src = moves[0]
+            result.append(Instr("mov", (Reg(temp), Reg(src))))
+            moves = [(d, temp if s == src else s) for d, s in moves]
+            continue
+        for move in ready:
+            result.append(Instr("mov", (Reg(move[0]), Reg(move[1]))))
+            moves.remove(move)
+    return result
+
+COMMUTATIVE_OPS = {"+", "*", "&", "|", "^"}
+
+def immediate_value(node):
+    if isinstance(node, NumberNode):
+        if getattr(node, 'is_float', False) and isinstance(node.value, float):
+            return float_to_int(node.value)
+        return node.value
+    if isinstance(node, BinOpNode) and node.op == "+" and not node.is_float:
+        left, right = immediate_value(node.left), immediate_value(node.right)
+        if isinstance(left, str) and isinstance(right, int): return f"{left}+{right & 0xFFFFFFFF}"
+        if isinstance(left, int) and isinstance(right, str): return f"{right}+{left & 0xFFFFFFFF}"
+    return None
+
+def generate_asm(statements, is_sub_block=False, rm=None, strings_to_embed=None, external_symbols=None, global_vars=None, reg_args=True, objects=None):
     global if_label_count, call_label_count
-    if rm is None: rm = RegisterManager()
+    if rm is None:
+        cacheable = {s.name: s.size for s in statements if isinstance(s, GlobalVarNode)}
+        escaped = find_escaped(statements, set())
+        functions = register_args(statements, escaped) if reg_args else {}
+        rm = RegisterManager(cacheable, escaped, functions, find_readers(statements))
     if strings_to_embed is None: strings_to_embed = []
     if external_symbols is None: external_symbols = {}
     if global_vars is None: global_vars = []
+    if objects is None: objects = []
     asm = []
     functions_asm = []
 
+    def expression(node, owned=False):
+        code, reg = generate_expression_asm(node, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars, owned=owned)
+        asm.extend(code)
+        return reg
+
+    def load_global(key, reg):
+        rm.loaded.add(key[0])
+        addr_reg = expression(NumberNode(key[0]))
+        asm.append(Instr("mov", (reg, mem(addr_reg)), size=key[1]))
+
     if not is_sub_block:
-        asm.append(f".bits 32")
+        asm.append(Directive(".bits", 32))
         found_org = False
         for s in statements:
             if isinstance(s, DirectiveNode) and s.name == "#org":
-                asm.append(f".org {hex(s.value)}")
+                asm.append(Directive(".org", s.value))
                 found_org = True
         if not found_org: raise CompilerError("Missing #org directive.")
 
     for stmt in statements:
         if hasattr(stmt, 'source_line') and stmt.source_line:
-            asm.append(f"\n{stmt.source_line}")
+            asm.append(Comment(stmt.source_line))
 
         if isinstance(stmt, GlobalVarNode):
             if not isinstance(stmt.value, (NumberNode, StringNode, ArrayNode)):
@@ -803,130 +2006,147 @@ def generate_asm(statements, is_sub_block=False, rm=None, strings_to_embed=None,
             continue
 
         if isinstance(stmt, FunctionDefNode):
-            f_asm = [f"{stmt.name}:"]
-
-            if stmt.params:
-                val_reg = rm.allocate()
-                addr_reg = rm.allocate()
-                ra_reg = rm.allocate()
-
-                f_asm.append(f"pop {ra_reg}")
-
-                for param_name in reversed(stmt.params):
-                    f_asm.append(f"pop {val_reg}")
-                    f_asm.append(f"mov {addr_reg}, {param_name}")
-                    f_asm.append(f"mov.d [{addr_reg}], {val_reg}")
+            f_asm = [Label(stmt.name)]
+            outer_state = rm.snapshot()
+            rm.clear()
 
-                f_asm.append(f"push {ra_reg}")
-
-                rm.free(val_reg)
-                rm.free(addr_reg)
-                rm.free(ra_reg)
+            reg_params = stmt.params[:rm.reg_args.get(stmt.name, 0)]
+            stack_params = stmt.params[len(reg_params):]
+            param_regs = [rm.allocate() for _ in reg_params]
+            if reg_params:
+                f_asm.append(Instr("params", tuple(param_regs)))
 
+            if stack_params:
+                ra_reg = rm.allocate()
+                f_asm.append(Instr("pop", (ra_reg,)))
+
+                for param_name in reversed(stack_params):
+                    val_reg = rm.allocate()
+                    addr_reg = rm.allocate()
+                    f_asm.append(Instr("pop", (val_reg,)))
+                    f_asm.append(Instr("mov", (addr_reg, Imm(param_name))))
+                    f_asm.append(Instr("mov", (mem(addr_reg), val_reg), size=32))
+                    if rm.cacheable.get(param_name) == 32:
+                        rm.remember((param_name, 32), val_reg)
+                    elif param_name in rm.cacheable:
+                        rm.forget_globals()
+
+                f_asm.append(Instr("push", (ra_reg,)))
+
+            def store_param(param_name, val_reg):
+                addr_reg = rm.allocate()
+                f_asm.append(Instr("mov", (addr_reg, Imm(param_name))))
+                f_asm.append(Instr("mov", (mem(addr_reg), val_reg), size=32))
+
+            barrier = block_effects(stmt.block, set(), [])
+            stored = set()
+            for param_name, val_reg in reversed(list(zip(reg_params, param_regs))):
+                if rm.cacheable.get(param_name) == 32:
+                    rm.remember((param_name, 32), val_reg)
+                    outside = any(owner is not stmt and (owner is None or param_name not in owner.params) for owner in rm.readers.get(param_name, ()))
+                    if not (barrier or outside or param_name in rm.escaped):
+                        continue
+                elif param_name in rm.cacheable:
+                    rm.forget_globals()
+                store_param(param_name, val_reg)
+                stored.add(param_name)
+
+            rm.loaded = set()
             body_asm = generate_asm(stmt.block, is_sub_block=True, rm=rm, 
                                    strings_to_embed=strings_to_embed, 
                                    external_symbols=external_symbols,
                                    global_vars=global_vars)
-            f_asm.append(body_asm)
-            if not f_asm[-1].strip().endswith("ret"):
-                f_asm.append("ret")
+            for param_name, val_reg in zip(reg_params, param_regs):
+                if param_name in rm.loaded and param_name not in stored:
+                    store_param(param_name, val_reg)
+            f_asm.extend(body_asm)
+            if not (isinstance(f_asm[-1], Instr) and f_asm[-1].op == "ret"):
+                f_asm.append(Instr("ret"))
 
-            functions_asm.append("\n".join(f_asm))
-            rm.usage_map = {reg: False for reg in rm.available_regs}
-            rm.cache.clear()
+            functions_asm.extend(allocate_registers(f_asm, rm))
+            objects.append(stmt.name)
+            rm.restore(outer_state)
 
         elif isinstance(stmt, ReturnNode):
             if stmt.value:
-                val_asm, val_reg = generate_expression_asm(stmt.value, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
-                if val_asm: 
-                    asm.append(val_asm)
-
-                asm.append(f"mov r0, {val_reg}")
-                rm.free(val_reg)
+                value = immediate_value(stmt.value)
+                asm.append(Instr("mov", (Reg(0), Imm(value) if value is not None else expression(stmt.value))))
 
-            asm.append("ret")
+            asm.append(Instr("ret"))
+            rm.clear(reachable=False)
 
         elif isinstance(stmt, CallNode):
-            call_asm, res_reg = generate_expression_asm(stmt, rm, external_symbols, is_statement=True, strings_to_embed=strings_to_embed, global_vars=global_vars)
-            asm.append(call_asm)
-            if res_reg: rm.free(res_reg)
+            call_asm, _ = generate_expression_asm(stmt, rm, external_symbols, is_statement=True, strings_to_embed=strings_to_embed, global_vars=global_vars)
+            asm.extend(call_asm)
 
         elif isinstance(stmt, LabelNode):
-            asm.append(f"{stmt.name}:")
+            asm.append(Label(stmt.name))
+            rm.clear()
 
         elif isinstance(stmt, DirectiveNode):
             continue
 
         elif isinstance(stmt, InlineAsmNode):
             formatted_asm = stmt.content.replace(' ; ', '\n').replace(';', '\n')
-            asm.append(formatted_asm)
-            rm.usage_map = {reg: False for reg in rm.available_regs}
-            rm.cache.clear()
+            asm.extend(parse_text(formatted_asm, bits=32))
+            rm.clear()
 
         elif isinstance(stmt, AssignNode):
-            suffix = ".b" if stmt.size == 8 else (".w" if stmt.size == 16 else ".d")
-
+            # A call in the target address may change the source, which then has to be loaded first.
+            target_calls = isinstance(stmt.target, DerefNode) and has_call(stmt.target.target)
             if isinstance(stmt.value, StringNode):
                 str_label = f"str_const_{len(strings_to_embed)}"
                 strings_to_embed.append((str_label, stmt.value.value))
                 val_reg = rm.allocate() 
-                asm.append(f"mov {val_reg}, {str_label}")
+                asm.append(Instr("mov", (val_reg, Imm(str_label))))
+            elif isinstance(stmt.value, DerefNode) and stmt.value.size == stmt.size and not target_calls and not rm.lookup(load_key(stmt.value, rm)):
+                rm.loaded.add(store_name(stmt.value))
+                val_reg = mem(expression(stmt.value.target))
             else:
-                v_asm, val_reg = generate_expression_asm(stmt.value, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
-                if v_asm: asm.append(v_asm)
-
-            rm.usage_map[val_reg] = True
+                val_reg = expression(stmt.value)
 
             if isinstance(stmt.target, DerefNode):
-                addr_asm, addr_ptr_reg = generate_expression_asm(stmt.target.target, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
-                if addr_asm: asm.append(addr_asm)
-
-                asm.append(f"mov{suffix} [{addr_ptr_reg}], {val_reg}")
-                rm.free(addr_ptr_reg)
-
+                addr_ptr_reg = expression(stmt.target.target)
             elif isinstance(stmt.target, NumberNode):
-                target_val = hex(stmt.target.value) if isinstance(stmt.target.value, int) else stmt.target.value
-                
-                temp_addr_reg = rm.allocate()
-                asm.append(f"mov {temp_addr_reg}, {target_val}")
-                asm.append(f"mov{suffix} [{temp_addr_reg}], {val_reg}")
-                rm.free(temp_addr_reg)
-
+                addr_ptr_reg = expression(stmt.target)
             else:
-                symbol_name = stmt.target if isinstance(stmt.target, str) else stmt.target.name
-                addr_reg = rm.allocate()
-                asm.append(f"mov {addr_reg}, {symbol_name}")
-                asm.append(f"mov{suffix} [{addr_reg}], {val_reg}")
-                rm.free(addr_reg)
-
-            rm.free(val_reg)
+                addr_ptr_reg = expression(NumberNode(stmt.target if isinstance(stmt.target, str) else stmt.target.name))
+            asm.append(Instr("mov", (mem(addr_ptr_reg), val_reg), size=stmt.size))
+
+            name = store_name(stmt.target)
+            declared = rm.cacheable.get(name)
+            step = induction_step(stmt.value, name) if stmt.size == declared == 32 else None
+            pointers = {key: reg for key, reg in rm.cache.items() if isinstance(key, tuple) and len(key) > 2 and key[0] == name}
+            if declared is None:
+                rm.forget_globals(rm.escaped)
+            elif stmt.size > declared:
+                rm.forget_globals()
+            else:
+                rm.forget_globals({name})
+                if stmt.size == declared == 32 and not val_reg.ptr:
+                    rm.remember((name, 32), val_reg)
+                if step is not None:
+                    for key, reg in pointers.items():
+                        asm.append(Instr("add", (reg, Imm((step * key[3]) & 0xFFFFFFFF))))
+                        rm.remember(key, reg)
 
         elif isinstance(stmt, GotoNode):
             if isinstance(stmt.target, str):
-                asm.append(f"jmp {stmt.target}")
+                asm.append(Instr("jmp", (Imm(stmt.target),)))
+            elif isinstance(immediate_value(stmt.target), str):
+                asm.append(Instr("jmp", (Imm(immediate_value(stmt.target)),)))
             else:
-                target_asm, target_reg = generate_expression_asm(stmt.target, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
-                if target_asm: 
-                    asm.append(target_asm)
-
-                asm.append(f"jmp {target_reg}")
-                rm.free(target_reg)
+                target_reg = expression(stmt.target)
+                asm.append(Instr("mov", (Reg(0), target_reg)))
+                asm.append(Instr("jmp", (Reg(0),)))
 
-            rm.usage_map = {reg: False for reg in rm.available_regs}
-            rm.cache.clear()
+            rm.clear(reachable=False)
 
         elif isinstance(stmt, OutNode):
-            p_asm, p_reg = generate_expression_asm(stmt.port, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
-            if p_asm: asm.append(p_asm)
-
-            rm.usage_map[p_reg] = True
-            
-            d_asm, d_reg = generate_expression_asm(stmt.data, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
-            if d_asm: asm.append(d_asm)
-            
-            asm.append(f"out {p_reg}, {d_reg}")
-            rm.free(p_reg)
-            rm.free(d_reg)
+            p_reg = expression(stmt.port)
+            d_reg = expression(stmt.data)
+            asm.append(Instr("out", (p_reg, d_reg)))
+            rm.forget_globals(rm.escaped)
 
         elif isinstance(stmt, IfNode):
             if_label_count += 1
@@ -935,131 +2155,245 @@ def generate_asm(statements, is_sub_block=False, rm=None, strings_to_embed=None,
 
             jump_target = label_else if stmt.else_block else label_end
 
-            l_asm, l_reg = generate_expression_asm(stmt.left, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
-            if l_asm: asm.append(l_asm)
-            rm.usage_map[l_reg] = True
-
-            r_asm, r_reg = generate_expression_asm(stmt.right, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
-            if r_asm: asm.append(r_asm)
-            rm.usage_map[r_reg] = True
+            l_reg = expression(stmt.left)
+            r_reg = expression(stmt.right)
 
-            if stmt.op == "==":
-                asm.append(f"jne {l_reg}, {r_reg}, {jump_target}")
-            elif stmt.op == "!=":
-                asm.append(f"je {l_reg}, {r_reg}, {jump_target}")
-            elif stmt.op == "<":
-                asm.append(f"jge {l_reg}, {r_reg}, {jump_target}")
-            elif stmt.op == ">":
-                asm.append(f"jle {l_reg}, {r_reg}, {jump_target}")
-            elif stmt.op == ">=":
-                asm.append(f"jl {l_reg}, {r_reg}, {jump_target}")
-            elif stmt.op == "<=":
-                asm.append(f"jg {l_reg}, {r_reg}, {jump_target}")
+            if stmt.op in JUMP_IF_NOT:
+                asm.append(Instr(JUMP_IF_NOT[stmt.op], (l_reg, r_reg, Imm(jump_target))))
+            jump_state = rm.snapshot()
 
-            rm.free(l_reg)
-            rm.free(r_reg)
-
-            asm.append(generate_asm(stmt.block, is_sub_block=True, rm=rm, strings_to_embed=strings_to_embed, external_symbols=external_symbols))
+            asm.extend(generate_asm(stmt.block, is_sub_block=True, rm=rm, strings_to_embed=strings_to_embed, external_symbols=external_symbols))
+            then_state = rm.snapshot()
 
             if stmt.else_block:
-                asm.append(f"jmp {label_end}")
+                asm.append(Instr("jmp", (Imm(label_end),)))
+
+                asm.append(Label(label_else))
+                rm.restore(jump_state)
+                asm.extend(generate_asm(stmt.else_block, is_sub_block=True, rm=rm, strings_to_embed=strings_to_embed, external_symbols=external_symbols))
+                jump_state = rm.snapshot()
 
-                asm.append(f"{label_else}:")
-                asm.append(generate_asm(stmt.else_block, is_sub_block=True, rm=rm, strings_to_embed=strings_to_embed, external_symbols=external_symbols))
+            asm.append(Label(label_end))
+            rm.merge(then_state, jump_state)
 
-            asm.append(f"{label_end}:")
+        elif isinstance(stmt, SwitchNode):
+            if_label_count += 1
+            switch_id = if_label_count
+            label_end = f"_switch_end_{switch_id}"
+            labels = [f"_case_{switch_id}_{i}" for i in range(len(stmt.cases))]
+            label_default = f"_default_{switch_id}" if stmt.default is not None else label_end
+            targets = sorted((value, label) for (values, _), label in zip(stmt.cases, labels) for value in values)
+            low, high = targets[0][0], targets[-1][0]
+
+            if len(targets) >= JUMP_TABLE_MIN_CASES and high - low < 2 * len(targets):
+                label_table = f"_switch_table_{switch_id}"
+                entries = [label_default] * (high - low + 1)
+                for value, label in targets: entries[value - low] = label
+                entries += [label_default] * (len(entries) % 2)
+
+                index_reg = expression(stmt.value, owned=True)
+                if low: asm.append(Instr("sub", (index_reg, Imm(low))))
+                asm.append(Instr("jge", (index_reg, expression(NumberNode(high - low + 1)), Imm(label_default))))
+                asm.append(Instr("shl", (index_reg, Imm(2))))
+                asm.append(Instr("add", (index_reg, Imm(label_table))))
+                asm.append(Instr("switch", (mem(index_reg),) + tuple(Imm(label) for label in labels + [label_default])))
+                asm.append(Label(label_table))
+                asm.append(Data(".dd", entries))
+            else:
+                value_reg = expression(stmt.value)
+
+                def dispatch(cases):
+                    if len(cases) <= LINEAR_SWITCH_CASES:
+                        for value, label in cases:
+                            asm.append(Instr("je", (value_reg, expression(NumberNode(value)), Imm(label))))
+                        asm.append(Instr("jmp", (Imm(label_default),)))
+                        return
+                    middle = len(cases) // 2
+                    label_lower = f"_switch_below_{switch_id}_{cases[middle][0]}"
+                    asm.append(Instr("jl", (value_reg, expression(NumberNode(cases[middle][0])), Imm(label_lower))))
+                    dispatch(cases[middle:])
+                    asm.append(Label(label_lower))
+                    dispatch(cases[:middle])
+
+                dispatch(targets)
+            dispatch_state = rm.snapshot()
+
+            end_states = []
+            for label, block in zip(labels + [label_default], switch_blocks(stmt)):
+                asm.append(Label(label))
+                rm.restore(dispatch_state)
+                asm.extend(generate_asm(block, is_sub_block=True, rm=rm, strings_to_embed=strings_to_embed, external_symbols=external_symbols))
+                asm.append(Instr("jmp", (Imm(label_end),)))
+                end_states.append(rm.snapshot())
+            if stmt.default is None:
+                end_states.append(dispatch_state)
+
+            asm.append(Label(label_end))
+            rm.restore(end_states[0])
+            for state in end_states[1:]:
+                rm.merge(rm.snapshot(), state)
 
         elif isinstance(stmt, WhileNode):
             if_label_count += 1
             label_start = f"_while_start_{if_label_count}"
             label_end = f"_while_end_{if_label_count}"
 
-            asm.append(f"{label_start}:")
-
-            l_asm, l_reg = generate_expression_asm(stmt.left, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
-            if l_asm: asm.append(l_asm)
-            rm.usage_map[l_reg] = True
-
-            r_asm, r_reg = generate_expression_asm(stmt.right, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
-            if r_asm: asm.append(r_asm)
-            rm.usage_map[r_reg] = True
-
-            if stmt.op == "==":
-                asm.append(f"jne {l_reg}, {r_reg}, {label_end}")
-            elif stmt.op == "!=":
-                asm.append(f"je {l_reg}, {r_reg}, {label_end}")
-            elif stmt.op == "<":
-                asm.append(f"jge {l_reg}, {r_reg}, {label_end}")
-            elif stmt.op == ">":
-                asm.append(f"jle {l_reg}, {r_reg}, {label_end}")
-            elif stmt.op == ">=":
-                asm.append(f"jl {l_reg}, {r_reg}, {label_end}")
-            elif stmt.op == "<=":
-                asm.append(f"jg {l_reg}, {r_reg}, {label_end}")
-
-            rm.free(l_reg)
-            rm.free(r_reg)
-
-            asm.append(generate_asm(stmt.block, is_sub_block=True, rm=rm, strings_to_embed=strings_to_embed, external_symbols=external_symbols))
+            reads, writes = set(), []
+            barrier = not rm.reachable
+            barrier |= expression_effects(stmt.left, reads) | expression_effects(stmt.right, reads)
+            barrier |= block_effects(stmt.block, reads, writes)
+
+            barrier |= any(size > rm.cacheable[name] for name, size in writes if name in rm.cacheable)
+
+            header, carried, hoisted, induction = {}, {}, [], {}
+            if not barrier:
+                pointer_store = any(rm.cacheable.get(name) is None for name, _ in writes)
+                written = {name for name, size in writes if size == 32}
+                unstable = {name for name, size in writes if size != 32 or rm.cacheable.get(name) != 32}
+                if pointer_store: unstable |= rm.escaped
+
+                keys = reads | {key for key in rm.cache if isinstance(key, tuple) and len(key) == 2}
+                for key in sorted(keys):
+                    if rm.cacheable.get(key[0]) != key[1] or key[0] in unstable:
+                        continue
+                    reg = rm.lookup(key)
+                    if key[0] in written:
+                        if key not in reads: continue
+                        carried[key] = rm.allocate()
+                        if reg is not None: asm.append(Instr("mov", (carried[key], reg)))
+                        else: load_global(key, carried[key])
+                        header[key] = carried[key]
+                    elif reg is not None:
+                        header[key] = reg
+                    elif key in reads:
+                        header[key] = rm.allocate()
+                        load_global(key, header[key])
+
+                for key, reg in rm.cache.items():
+                    if isinstance(key, tuple) and len(key) > 2 and key[0] not in written | unstable:
+                        header[key] = reg
+
+                if not has_loop(stmt.block):
+                    for key, node in induction_nodes([stmt], rm, {}).items():
+                        if rm.loop_depth or len(induction) == MAX_INDUCTION_POINTERS: break
+                        if key[:2] in carried and key not in header and stepped_only(stmt.block, key[0]):
+                            induction[key] = node
+                    hoisted = [value for value in loop_constants([stmt], rm, header, []) if rm.lookup(value) is None]
+                    hoisted = hoisted[:MAX_HOISTED_CONSTANTS - len(induction)]
+                for value in hoisted:
+                    expression(NumberNode(value))
+                for key, reg in rm.cache.items():
+                    if not isinstance(key, tuple): header[key] = reg
+
+            label_cond = f"_while_cond_{if_label_count}"
+            rm.clear()
+            for key, reg in header.items(): rm.remember(key, reg)
+            for key, node in induction.items():
+                code, carried[key] = generate_expression_asm(node, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars, owned=True)
+                asm.extend(code)
+                header[key] = carried[key]
+                rm.remember(key, carried[key])
+
+            endless = constant_condition(stmt.left, stmt.op, stmt.right) is True
+            if not endless:
+                l_asm, l_reg = generate_expression_asm(stmt.left, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
+                r_asm, r_reg = generate_expression_asm(stmt.right, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
+                cond_asm = l_asm + r_asm
+
+                if stmt.op in JUMP_IF:
+                    cond_asm.append(Instr(JUMP_IF[stmt.op], (l_reg, r_reg, Imm(label_start))))
+                else:
+                    cond_asm.append(Instr("jmp", (Imm(label_start),)))
+                asm.append(Instr("jmp", (Imm(label_cond),)))
+            exit_state = rm.snapshot()
+
+            asm.append(Label(label_start))
+            rm.loop_depth += 1
+            asm.extend(generate_asm(stmt.block, is_sub_block=True, rm=rm, strings_to_embed=strings_to_embed, external_symbols=external_symbols))
+            rm.loop_depth -= 1
+
+            if rm.reachable and carried:
+                sources = {}
+                for key, reg in carried.items():
+                    current = rm.lookup(key)
+                    if current is None and key in induction:
+                        code, current = generate_expression_asm(induction[key], rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars, owned=True)
+                        asm.extend(code)
+                    if current in carried.values() and current != reg:
+                        sources[key] = rm.allocate()
+                        asm.append(Instr("mov", (sources[key], current)))
+                    else:
+                        sources[key] = current
+                for key, reg in carried.items():
+                    if sources[key] is None: load_global(key, reg)
+                    elif sources[key] != reg: asm.append(Instr("mov", (reg, sources[key])))
 
-            asm.append(f"jmp {label_start}")
+            if endless:
+                asm.append(Instr("jmp", (Imm(label_start),)))
+            else:
+                asm.append(Label(label_cond))
+                asm.extend(cond_asm)
 
-            asm.append(f"{label_end}:")
+            asm.append(Label(label_end))
+            if endless: rm.clear(reachable=False)
+            else: rm.restore(exit_state)
+            rm.forget(hoisted)
 
     if not is_sub_block:
-        asm.append("\n; --- End of Main Program ---")
-        asm.append("_program_halt:")
-        asm.append("jmp _program_halt")
-        asm.append("halt")
+        asm.append(Comment("; --- End of Main Program ---"))
+        asm.append(Label("_program_halt"))
+        asm.append(Instr("jmp", (Imm("_program_halt"),)))
+        asm.append(Instr("halt"))
+        asm = allocate_registers(asm, rm)
 
         if functions_asm:
-            asm.append("\n; --- Functions Section ---")
+            asm.append(Comment("; --- Functions Section ---"))
             asm.extend(functions_asm)
 
         if global_vars:
-            asm.append("\n; --- Global Variables Section ---")
+            asm.append(Comment("; --- Global Variables Section ---"))
             for var in global_vars:
+                objects.append(f"{var.name}_len" if isinstance(var.value, ArrayNode) else var.name)
                 if isinstance(var.value, StringNode):
-                    asm.append(f"{var.name}:")
-                    chars = ", ".join([hex(ord(c)) for c in var.value.value])
-                    asm.append(f".db {chars}, 0x00")
+                    asm.append(Label(var.name))
+                    asm.append(Data(".db", string_bytes(var.value.value)))
                 
                 elif isinstance(var.value, ArrayNode):
                     array_len = len(var.value.elements)
-                    asm.append(f"{var.name}_len:")
-                    asm.append(f".dw {hex(array_len)}")
+                    asm.append(Label(f"{var.name}_len"))
+                    asm.append(Data(".dw", [array_len]))
 
-                    asm.append(f"{var.name}:")
+                    asm.append(Label(var.name))
                     directive = ".db" if var.size == 8 else (".dw" if var.size == 16 else ".dd")
-                    element_values = []
-                    for el in var.value.elements:
-                        val = hex(el.value) if isinstance(el.value, int) else el.value
-                        element_values.append(str(val))
-
-                    asm.append(f"{directive} {', '.join(element_values)}")
+                    asm.append(Data(directive, [el.value for el in var.value.elements]))
                 
                 else:
-                    asm.append(f"{var.name}:")
+                    asm.append(Label(var.name))
                     cmd = ".db" if var.size == 8 else (".dw" if var.size == 16 else ".dd")
 
                     val = var.value.value
                     if getattr(var.value, 'is_float', False) and isinstance(val, float):
-                        val_out = float_to_hex(val)
-                    else:
-                        val_out = hex(val) if isinstance(val, int) else val
+                        val = float_to_int(val)
                         
-                    asm.append(f"{cmd} {val_out}")
+                    asm.append(Data(cmd, [val]))
 
         if strings_to_embed:
-            asm.append("\n; --- String Data Section ---")
+            asm.append(Comment("; --- String Data Section ---"))
             for label, text in strings_to_embed:
-                asm.append(f"{label}:")
-                chars = ", ".join([hex(ord(c)) for c in text])
-                asm.append(f".db {chars}, 0x00")
+                objects.append(label)
+                asm.append(Label(label))
+                asm.append(Data(".db", string_bytes(text)))
+
+        if rm.spill_slots:
+            asm.append(Comment("; --- Spill Area ---"))
+            for label in rm.spill_slots:
+                objects.append(label)
+                asm.append(Label(label))
+                asm.append(Data(".dd", [0]))
         
-    return "\n".join(asm)
+    return asm
 
-def generate_expression_asm(node, rm, external_symbols=None, is_statement=False, strings_to_embed=None, global_vars=None):
+def generate_expression_asm(node, rm, external_symbols=None, is_statement=False, strings_to_embed=None, global_vars=None, owned=False):
     global if_label_count, call_label_count
     if external_symbols is None: external_symbols = {}
     if strings_to_embed is None: strings_to_embed = []
@@ -1070,66 +2404,96 @@ def generate_expression_asm(node, rm, external_symbols=None, is_statement=False,
         strings_to_embed.append((raw_data_label, node.value))
         
         reg = rm.allocate()
-        return f"mov {reg}, {raw_data_label}", reg
+        return [Instr("mov", (reg, Imm(raw_data_label)))], reg
 
     if isinstance(node, CallNode):
-        asm = ""
-
-        for arg in node.args:
-            arg_asm, arg_reg = generate_expression_asm(arg, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
-            if arg_asm:
-                asm += arg_asm + "\n"
-            asm += f"push {arg_reg}\n"
-            rm.free(arg_reg)
-
         target = node.name
         if target in external_symbols:
-            target = hex(external_symbols[target])
+            target = external_symbols[target]
+        call = Instr("call", (Imm(target),))
+        reg_count = rm.reg_args[node.name] if node.name in rm.reg_args else external_symbols.get(f"{node.name}@regs", 0)
+
+        asm = [SaveLive(call)]
+        reg_args = []
+        for i, arg in enumerate(node.args):
+            value = immediate_value(arg)
+            if value is not None:
+                arg_reg = Imm(value)
+            else:
+                arg_asm, arg_reg = generate_expression_asm(arg, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
+                asm.extend(arg_asm)
+            if i < reg_count:
+                reg_args.append(arg_reg)
+            else:
+                asm.append(Instr("push", (arg_reg,)))
 
-        asm += f"call {target}\n"
+        if reg_args:
+            asm.append(Instr("args", tuple(reg_args)))
+        asm.append(call)
+        rm.clear(reachable=rm.reachable)
 
-        if is_statement:
-            return asm, None
-        else:
+        res_reg = None
+        if not is_statement:
             res_reg = rm.allocate()
-            asm += f"mov {res_reg}, r0"
-            return asm, res_reg
-
-    if isinstance(node, NumberNode):
-        if getattr(node, 'is_float', False) and isinstance(node.value, float):
-            val = float_to_hex(node.value)
-        else:
-            val = hex(node.value) if isinstance(node.value, int) else node.value
-
-        if isinstance(node.value, int):
-            existing_reg = rm.get_reg_with_value(node.value)
+            asm.append(Instr("mov", (res_reg, Reg(0))))
+        asm.append(RestoreLive(call))
+        return asm, res_reg
+
+    value = immediate_value(node) if isinstance(node, (NumberNode, BinOpNode)) else None
+    if value is not None:
+        if not owned:
+            existing_reg = rm.lookup(value)
             if existing_reg:
-                return "", existing_reg
+                return [], existing_reg
 
-        reg = rm.allocate(node.value)
-        return f"mov {reg}, {val}", reg
+        reg = rm.allocate()
+        if not owned: rm.remember(value, reg)
+        return [Instr("mov", (reg, Imm(value)))], reg
     
-    if isinstance(node, DerefNode):
-        suffix = ".b" if node.size == 8 else (".w" if node.size == 16 else ".d")
+    if isinstance(node, (DerefNode, str)):
+        if isinstance(node, str):
+            var_size = next((gvar.size for gvar in global_vars if gvar.name == node), 32)
+            node = DerefNode(NumberNode(node), size=var_size)
+
+        key = load_key(node, rm)
+        cached = rm.lookup(key) if key else None
+        if cached is not None:
+            if not owned: return [], cached
+            target_reg = rm.allocate()
+            return [Instr("mov", (target_reg, cached))], target_reg
 
         addr_asm, addr_reg = generate_expression_asm(node.target, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
-        
-        target_reg = rm.allocate()
+        rm.loaded.add(store_name(node))
 
-        asm = f"{addr_asm}\nmov{suffix} {target_reg}, [{addr_reg}]"
+        target_reg = rm.allocate()
+        if key and not owned: rm.remember(key, target_reg)
 
-        rm.free(addr_reg)
-        
-        return asm, target_reg
+        return addr_asm + [Instr("mov", (target_reg, mem(addr_reg)), size=node.size)], target_reg
 
     if isinstance(node, BinOpNode):
-        left_asm, left_reg = generate_expression_asm(node.left, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
-        rm.usage_map[left_reg] = True
-
-        right_asm, right_reg = generate_expression_asm(node.right, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
-        rm.usage_map[right_reg] = True
+        cached = rm.lookup(induction_key(node, rm))
+        if cached is not None:
+            if not owned: return [], cached
+            target_reg = rm.allocate()
+            return [Instr("mov", (target_reg, cached))], target_reg
 
         is_f = getattr(node, 'is_float', False)
+        left, right = node.left, node.right
+        if not is_f and node.op in COMMUTATIVE_OPS and immediate_value(left) is not None and immediate_value(right) is None:
+            left, right = right, left
+
+        left_asm, left_reg = generate_expression_asm(left, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars, owned=True)
+        if left_reg in rm.shared:
+            copy_reg = rm.allocate()
+            left_asm.append(Instr("mov", (copy_reg, left_reg)))
+            left_reg = copy_reg
+
+        value = None if is_f else immediate_value(right)
+        if value is not None:
+            if node.op in ("<<", ">>") and isinstance(value, int): value &= 0x1F
+            right_asm, right_reg = [], Imm(value)
+        else:
+            right_asm, right_reg = generate_expression_asm(right, rm, external_symbols, strings_to_embed=strings_to_embed, global_vars=global_vars)
 
         if is_f:
             op_map = {
@@ -1157,42 +2521,96 @@ def generate_expression_asm(node, rm, external_symbols=None, is_statement=False,
             raise CompilerError(f"Operator '{node.op}' not available for float type number.")
         op_cmd = op_map[node.op]
 
-        res_asm = ""
-        if left_asm: res_asm += left_asm + "\n"
-        if right_asm: res_asm += right_asm + "\n"
-        res_asm += f"{op_cmd} {left_reg}, {right_reg}"
-
-        rm.free(right_reg)
-
-        if left_reg in rm.cache:
-            del rm.cache[left_reg]
+        res_asm = left_asm + right_asm
+        res_asm.append(Instr(op_cmd, (left_reg, right_reg)))
             
         return res_asm, left_reg
 
-    if isinstance(node, str):
-        var_size = 32
-        for gvar in global_vars:
-            if gvar.name == node:
-                var_size = gvar.size
-                break
-        
-        suffix = ".b" if var_size == 8 else (".w" if var_size == 16 else ".d")
-        
-        addr_reg = rm.allocate()
-        val_reg = rm.allocate()
+    return [], None
 
-        asm = f"mov {addr_reg}, {node}\n"
-        asm += f"mov{suffix} {val_reg}, [{addr_reg}]"
-        
-        rm.free(addr_reg)
-        return asm, val_reg
+def compile_source(code, external_symbols, want_listing=False, opt_level=1, reg_args=True, inline_limit=INLINE_LIMIT):
+    source_code, export_list = preprocess(None, code)
+    tokens = tokenize(source_code)
+    parser = Parser(tokens, source_code, external_symbols)
+    statements = fold_constants(parser.parse_program())
+    inlined = {}
+    if opt_level > 0 and inline_limit > 0:
+        statements = inline_functions(statements, export_list, inline_limit, inlined)
+        if inlined: statements = fold_constants(statements)
+
+    target_sector = None
+    reserved_sectors = 0
+    
+    for s in statements:
+        if isinstance(s, DirectiveNode):
+            if s.name == "#sector":
+                target_sector = s.value
+            elif s.name == "#sectors":
+                reserved_sectors = s.value
+
+    if target_sector is None:
+        raise CompilerError("Missing or invalid '#sector' directive.")
+
+    if reserved_sectors <= 0:
+        raise CompilerError("Missing or invalid '#sectors' directive. Must be at least 1.")
+
+    objects = []
+    asm_code = generate_asm(statements, external_symbols=external_symbols, reg_args=reg_args, objects=objects)
+    peephole_stats = {}
+    removed = {}
+    if opt_level > 0:
+        asm_code = mxopt.peephole(asm_code, 32, peephole_stats)
+        asm_code = mxopt.remove_dead_objects(asm_code, objects, export_list, 32, removed)
+    bytecode, symbols = assemble_ir(asm_code, external_symbols)
+    listing = format_asm(asm_code) if want_listing else None
+
+    exports = {name: symbols[name] for name in export_list if name in symbols}
+    if reg_args:
+        conventions = register_args(statements, find_escaped(statements, set()))
+        for name in export_list:
+            if name in conventions: exports[f"{name}@regs"] = conventions[name]
+
+    return {
+        "bytecode": bytecode,
+        "sector": target_sector,
+        "sectors": reserved_sectors,
+        "export_list": export_list,
+        "exports": exports,
+        "listing": listing,
+        "peephole": peephole_stats,
+        "removed": removed,
+        "inlined": inlined,
+    }
+
+def compile_file(input_file, external_symbols=None, use_cache=True, want_listing=False, opt_level=1, reg_args=True, inline_limit=INLINE_LIMIT):
+    if external_symbols is None: external_symbols = {}
+    code = get_combined_source(input_file)
+
+    cache_key = None
+    if use_cache:
+        cache_key = mxcache.make_key(code, external_symbols, [__file__, mxa.__file__, mxopt.__file__], [f"-O{opt_level}", reg_args, inline_limit])
+        entry = mxcache.load(cache_key)
+        if entry is not None:
+            print(entry["messages"], end="")
+            print(f"[Info] Build cache hit for {input_file}.")
+            return entry
+
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            entry = compile_source(code, external_symbols, want_listing or use_cache, opt_level, reg_args, inline_limit)
+    finally:
+        print(output.getvalue(), end="")
 
-    return "", None
+    entry["messages"] = output.getvalue()
+    if cache_key:
+        mxcache.store(cache_key, entry)
+    return entry
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage: python compiler.py <source.c> [flags]")
-        print("Flags: -n, -info, -asm, -export <file>, -import <file>")
+        print("Flags: -n, -info, -asm, -no-cache, -O0, -O1, -stack-args, -inline-limit <n>, -export <file>, -import <file>")
         sys.exit(1)
 
     input_file = sys.argv[1]
@@ -1212,57 +2630,45 @@ if __name__ == "__main__":
             except:
                 raise CompilerError("[Error] Could not load symbol file.")
 
-        source_code, export_list = preprocess(input_file)
-        tokens = tokenize(source_code)
-        parser = Parser(tokens, source_code, external_symbols)
-        statements = parser.parse_program()
-
-        target_sector = None
-        reserved_sectors = 0
-        
-        for s in statements:
-            if isinstance(s, DirectiveNode):
-                if s.name == "#sector":
-                    target_sector = s.value
-                elif s.name == "#sectors":
-                    reserved_sectors = s.value
-
-        if target_sector is None:
-            raise CompilerError("Missing or invalid '#sector' directive.")
-
-        if reserved_sectors <= 0:
-            raise CompilerError("Missing or invalid '#sectors' directive. Must be at least 1.")
-
-        asm_code = generate_asm(statements, external_symbols=external_symbols)
-
-        timestamp = datetime.datetime.now().strftime('%H%M%S')
-        asm_file_name = f"temp_{timestamp}.asm"
-        with open(asm_file_name, "w") as f:
-            f.write(asm_code)
-
-        bytecode, symbols = assemble(asm_file_name, external_symbols)
+        inline_limit = INLINE_LIMIT
+        if "-inline-limit" in flags:
+            try:
+                inline_limit = int(sys.argv[sys.argv.index("-inline-limit") + 1], 0)
+            except (IndexError, ValueError):
+                raise CompilerError("[Error] -inline-limit needs a number.")
+
+        result = compile_file(input_file, external_symbols, use_cache="-no-cache" not in flags, want_listing="-asm" in flags, opt_level=0 if "-O0" in flags else 1, reg_args="-stack-args" not in flags, inline_limit=inline_limit)
+        bytecode = result["bytecode"]
+        target_sector = result["sector"]
+        reserved_sectors = result["sectors"]
+
+        if "-asm" in flags:
+            timestamp = datetime.datetime.now().strftime('%H%M%S')
+            asm_file_name = f"temp_{timestamp}.asm"
+            with open(asm_file_name, "w") as f:
+                f.write(result["listing"])
+            print(f"[Info] Assembly written to {asm_file_name}.")
 
         if "-export" in flags:
             idx = sys.argv.index("-export")
             h_file = sys.argv[idx + 1]
 
             smart_symbols = {}
-            for name in export_list:
-                if name in symbols:
-                    smart_symbols[name] = symbols[name]
+            for name in result["export_list"]:
+                if name in result["exports"]:
+                    smart_symbols[name] = result["exports"][name]
+                    if f"{name}@regs" in result["exports"]:
+                        smart_symbols[f"{name}@regs"] = result["exports"][f"{name}@regs"]
                 else:
                     raise CompilerError(f"Export-Label '{name}' was not found in source code.")
             
             import json
             with open(h_file, "w") as f:
                 json.dump(smart_symbols, f)
-            print(f"[Success] {len(smart_symbols)} symbols exported to {h_file}.")
-
-        if "-asm" not in flags:
-            os.remove(asm_file_name)
+            print(f"[Success] {len(result['export_list'])} symbols exported to {h_file}.")
 
         actual_size = len(bytecode)
-        needed_sectors = ((actual_size - 1) // 512 + 1) if actual_size > 0 else 1
+        needed_sectors = mxdisk.sectors_needed(actual_size)
 
         final_sector_count = max(needed_sectors, reserved_sectors)
 
@@ -1272,26 +2678,26 @@ if __name__ == "__main__":
         if "-n" in flags:
             print(f"[Info] Dry run: disk.bin was not modified.")
         else:
-            target_size = final_sector_count * 512
-            padded_bytecode = bytecode.ljust(target_size, b'\x00')
-
-            disk_path = "disk.bin"
-            if not os.path.exists(disk_path):
-                potential_path = os.path.join("..", "emulator", "disk.bin")
-                if os.path.exists(potential_path):
-                    disk_path = potential_path
-            
+            disk = mxdisk.DiskImage(mxdisk.find_disk())
             try:
-                with open(disk_path, "r+b") as f:
-                    f.seek(target_sector * 512)
-                    f.write(padded_bytecode)
-                print(f"[Success] Wrote {actual_size} bytes to sector {target_sector} in {disk_path}.")
-            except FileNotFoundError:
-                raise CompilerError(f"disk.bin not found.")
+                disk.place(target_sector, bytecode, reserved_sectors)
+                disk.write()
+            except mxdisk.DiskError as e:
+                raise CompilerError(e.message)
+            print(f"[Success] Wrote {actual_size} bytes to sector {target_sector} in {disk.path}.")
 
         if "-info" in flags:
             usage = (actual_size / (final_sector_count * 512)) * 100
             print(f"[Stats] Size: {actual_size} bytes / Usage: {usage:.1f}% of allocated space.")
+            if result["peephole"]:
+                hits = ", ".join(f"{name} {count}" for name, count in result["peephole"].items())
+                print(f"[Stats] Peephole: {hits}.")
+            if result["removed"]:
+                names = ", ".join(result["removed"])
+                print(f"[Stats] Dead code: removed {names} ({sum(result['removed'].values())} bytes).")
+            if result["inlined"]:
+                calls = ", ".join(f"{name} {count}" for name, count in result["inlined"].items())
+                print(f"[Stats] Inlined calls: {calls}.")
 
     except CompilerError as e:
         print(e)
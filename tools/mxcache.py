@@ -0,0 +1,84 @@
+import os
+import json
+import base64
+import hashlib
+
+CACHE_DIR = os.environ.get("MXC_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".mxc_cache"))
+CACHE_LIMIT = 64 * 1024 * 1024
+
+def fingerprint(paths):
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def make_key(source, external_symbols, compiler_files, options=()):
+    h = hashlib.sha256()
+    h.update(fingerprint(compiler_files).encode())
+    h.update(json.dumps(external_symbols, sort_keys=True).encode())
+    h.update(json.dumps(list(options)).encode())
+    h.update(source.encode())
+    return h.hexdigest()
+
+def entry_path(key):
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+def load(key):
+    path = entry_path(key)
+    try:
+        with open(path, "r") as f:
+            entry = json.load(f)
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+
+    entry["bytecode"] = base64.b64decode(entry["bytecode"])
+    return entry
+
+def store(key, entry):
+    data = dict(entry)
+    data["bytecode"] = base64.b64encode(entry["bytecode"]).decode("ascii")
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{entry_path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, entry_path(key))
+        evict()
+    except OSError as e:
+        print(f"[Warning] Could not write build cache: {e}")
+
+def cache_limit():
+    value = os.environ.get("MXC_CACHE_SIZE")
+    if value is None: return CACHE_LIMIT
+    try:
+        return int(value)
+    except ValueError:
+        print(f"[Warning] Invalid MXC_CACHE_SIZE '{value}', using {CACHE_LIMIT} bytes.")
+        return CACHE_LIMIT
+
+def evict(limit=None):
+    if limit is None: limit = cache_limit()
+
+    entries = []
+    total = 0
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith(".json"): continue
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= limit: break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
@@ -0,0 +1,78 @@
+import os
+import mmap
+
+SECTOR_SIZE = 512
+
+class DiskError(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+    def __str__(self):
+        return f"\n[Disk Error] {self.message}"
+
+def sectors_needed(size):
+    return ((size - 1) // SECTOR_SIZE + 1) if size > 0 else 1
+
+def find_disk(search_dirs=()):
+    candidates = ["disk.bin", os.path.join("..", "emulator", "disk.bin")]
+    for path in search_dirs:
+        base = path if os.path.isdir(path) else os.path.dirname(path)
+        candidates.append(os.path.join(base, "..", "emulator", "disk.bin"))
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    return candidates[0]
+
+class Placement:
+    __slots__ = ("sector", "payload", "sector_count", "name")
+
+    def __init__(self, sector, payload, sector_count, name):
+        self.sector = sector
+        self.payload = payload
+        self.sector_count = sector_count
+        self.name = name
+
+    @property
+    def end(self):
+        return self.sector + self.sector_count
+
+class DiskImage:
+    def __init__(self, path):
+        self.path = path
+        self.placements = []
+
+    def place(self, sector, payload, reserved_sectors=0, name=None):
+        if sector < 0:
+            raise DiskError(f"{name or 'Program'} has an invalid target sector {sector}.")
+        needed_sectors = sectors_needed(len(payload))
+        if reserved_sectors > 0 and needed_sectors > reserved_sectors:
+            raise DiskError(f"{name or 'Program'} needs {needed_sectors} sectors, but only {reserved_sectors} are reserved in #sectors.")
+        self.placements.append(Placement(sector, payload, max(needed_sectors, reserved_sectors), name or f"sector {sector}"))
+
+    def check(self):
+        ordered = sorted(self.placements, key=lambda p: p.sector)
+        for prev, cur in zip(ordered, ordered[1:]):
+            if cur.sector < prev.end:
+                raise DiskError(f"{cur.name} (sectors {cur.sector}-{cur.end - 1}) overlaps {prev.name} (sectors {prev.sector}-{prev.end - 1}).")
+        return ordered
+
+    def write(self):
+        ordered = self.check()
+        if not ordered: return
+
+        end = max(p.end for p in ordered) * SECTOR_SIZE
+        try:
+            with open(self.path, "r+b") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() < end:
+                    f.truncate(end)
+                with mmap.mmap(f.fileno(), end) as disk:
+                    for p in ordered:
+                        start = p.sector * SECTOR_SIZE
+                        size = len(p.payload)
+                        disk[start:start + size] = p.payload
+                        disk[start + size:p.end * SECTOR_SIZE] = bytes(p.end * SECTOR_SIZE - start - size)
+                    disk.flush()
+        except FileNotFoundError:
+            raise DiskError(f"{self.path} not found.")
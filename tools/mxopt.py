@@ -0,0 +1,383 @@
+from mxa import Instr, Reg, Imm, Label, Data, Comment
+
+WINDOW = 6
+MAX_PASSES = 8
+PC = 15
+SP = 14
+
+INVERSE_BRANCHES_32 = {"je": "jne", "jne": "je", "jg": "jle", "jle": "jg", "jge": "jl", "jl": "jge"}
+INVERSE_BRANCHES_16 = {"je": ("jne", False), "jne": ("je", False), "jlt": ("jge", False), "jge": ("jlt", False), "jgt": ("jge", True)}
+NON_DEFINING_32 = {"nop", "halt", "jmp", "call", "ret", "int", "iret", "push", "out", "wait",
+                   "gpuclear", "gpublit", "gpurect", "gpuline", "gpurectfill", "gpucirc", "gpucircfill"} | set(INVERSE_BRANCHES_32)
+DEFINING_16 = {"mov", "movi", "add", "sub", "mul", "peek", "pop"}
+
+class Peephole:
+    def __init__(self, items, bits):
+        self.items = items
+        self.bits = bits
+        self.labels = {item.name: i for i, item in enumerate(items) if isinstance(item, Label)}
+        self.known = {}
+
+    def window(self, i):
+        indices = []
+        while i < len(self.items) and len(indices) < WINDOW:
+            item = self.items[i]
+            if item is not None and not isinstance(item, Comment):
+                indices.append(i)
+            i += 1
+        return indices
+
+    def labels_after(self, i):
+        names = set()
+        for j in range(i + 1, len(self.items)):
+            item = self.items[j]
+            if isinstance(item, Label):
+                names.add(item.name)
+            elif item is not None and not isinstance(item, Comment):
+                break
+        return names
+
+    def jump_at(self, i):
+        w = self.window(i)
+        instrs = [self.items[j] for j in w[:2]]
+        if not instrs or not isinstance(instrs[0], Instr):
+            return None
+        first = instrs[0]
+        if self.bits == 32:
+            if first.op == "jmp" and isinstance(first.operands[0], Imm) and not first.operands[0].ptr:
+                return first.operands[0].value
+            return None
+        if first.op == "movi":
+            if first.operands[0].num == PC:
+                return first.operands[1].value
+            if len(instrs) > 1 and is_reg_jump(instrs[1], first.operands[0]):
+                return first.operands[1].value
+        return None
+
+    def final_target(self, name):
+        seen = {name}
+        while isinstance(name, str) and name in self.labels:
+            target = self.jump_at(self.labels[name] + 1)
+            if not isinstance(target, str) or target in seen:
+                break
+            seen.add(target)
+            name = target
+        return name
+
+def is_reg_jump(instr, reg):
+    return isinstance(instr, Instr) and instr.op == "mov" and instr.operands[0].num == PC and instr.operands[1].num == reg.num
+
+def is_const_load(instr, bits):
+    if bits == 16:
+        return instr.op == "movi"
+    return instr.op == "mov" and not instr.operands[0].ptr and isinstance(instr.operands[1], Imm) and not instr.operands[1].ptr
+
+def is_transfer(instr, bits):
+    if bits == 32:
+        return instr.op in ("jmp", "ret", "iret", "halt")
+    return instr.op in ("mov", "movi", "pop") and instr.operands[0].num == PC
+
+def same_value(a, b):
+    return a is not None and type(a) is type(b) and a == b
+
+def track(known, instr, bits):
+    if instr.op in ("push", "pop", "call"):
+        known.pop(SP, None)
+    if bits == 32:
+        if instr.op in ("call", "int") or is_transfer(instr, bits):
+            known.clear()
+            return
+        if instr.op in NON_DEFINING_32 or not instr.operands:
+            return
+        dest = instr.operands[0]
+        if not isinstance(dest, Reg) or dest.ptr:
+            return
+        if dest.num == PC:
+            known.clear()
+        elif is_const_load(instr, bits):
+            known[dest.num] = instr.operands[1].value
+        elif instr.op == "mov" and isinstance(instr.operands[1], Reg) and not instr.operands[1].ptr and instr.operands[1].num in known:
+            known[dest.num] = known[instr.operands[1].num]
+        else:
+            known.pop(dest.num, None)
+        return
+
+    if instr.op not in DEFINING_16:
+        return
+    dest = instr.operands[0].num
+    if dest == PC:
+        known.clear()
+    elif instr.op == "movi":
+        known[dest] = instr.operands[1].value
+    elif instr.op == "mov" and instr.operands[1].num in known:
+        known[dest] = known[instr.operands[1].num]
+    else:
+        known.pop(dest, None)
+
+def self_move(p, w):
+    instr = p.items[w[0]]
+    if instr.op != "mov" or len(instr.operands) != 2:
+        return None
+    dest, src = instr.operands
+    if isinstance(src, Reg) and dest.num == src.num and dest.num != PC and not dest.ptr and not src.ptr:
+        return [(w[0], None)]
+    return None
+
+def redundant_const(p, w):
+    instr = p.items[w[0]]
+    if not is_const_load(instr, p.bits) or instr.operands[0].num == PC:
+        return None
+    value = instr.operands[1].value
+    if p.bits == 16 and not isinstance(value, int):
+        return None
+    if same_value(p.known.get(instr.operands[0].num), value):
+        return [(w[0], None)]
+    return None
+
+def push_pop(p, w):
+    if len(w) < 2:
+        return None
+    push, pop = p.items[w[0]], p.items[w[1]]
+    if push.op != "push" or not isinstance(pop, Instr) or pop.op != "pop":
+        return None
+    src, dest = push.operands[0], pop.operands[0]
+    if src.ptr or dest.ptr:
+        return None
+    if p.bits == 32 and (dest.num in (SP, PC) or src == Reg(SP)):
+        return None
+    if src == dest:
+        return [(w[0], None), (w[1], None)]
+    return [(w[0], Instr("mov", (dest, src))), (w[1], None)]
+
+def store_reload(p, w):
+    store = p.items[w[0]]
+    if p.bits == 32:
+        if store.op != "mov" or not isinstance(store.operands[0], Reg) or not store.operands[0].ptr:
+            return None
+        addr, value = store.operands
+        if not isinstance(value, Reg) or value.ptr or store.size not in (None, 32):
+            return None
+    else:
+        if store.op != "poke":
+            return None
+        value, addr, mode = store.operands
+        size = p.known.get(mode.num)
+        if not isinstance(size, int):
+            return None
+        stored = p.known.get(value.num)
+        if size == 1 and not (isinstance(stored, int) and stored <= 0xFF):
+            return None
+    target = p.known.get(addr.num)
+    if not isinstance(target, str):
+        return None
+
+    known = dict(p.known)
+    for j in w[1:]:
+        instr = p.items[j]
+        if not isinstance(instr, Instr):
+            return None
+        if p.bits == 32:
+            if instr.op == "mov" and not instr.operands[0].ptr and isinstance(instr.operands[1], Reg) and instr.operands[1].ptr:
+                if instr.size not in (None, 32) or known.get(instr.operands[1].num) != target:
+                    return None
+                dest = instr.operands[0]
+                return [(j, None if dest.num == value.num else Instr("mov", (dest, value)))]
+        elif instr.op == "peek":
+            dest, load_addr, load_mode = instr.operands
+            if known.get(load_addr.num) != target or not same_value(known.get(load_mode.num), p.known[mode.num]):
+                return None
+            return [(j, None if dest.num == value.num else Instr("mov", (dest, value)))]
+        if not is_const_load(instr, p.bits) or instr.operands[0].num in (value.num, PC):
+            return None
+        track(known, instr, p.bits)
+    return None
+
+def jump_to_next(p, w):
+    instr = p.items[w[0]]
+    if p.bits == 32:
+        if (instr.op == "jmp" or instr.op in INVERSE_BRANCHES_32) and isinstance(instr.operands[-1], Imm) and not instr.operands[-1].ptr:
+            if instr.operands[-1].value in p.labels_after(w[0]):
+                return [(w[0], None)]
+        return None
+
+    if instr.op != "movi":
+        return None
+    if instr.operands[0].num == PC:
+        return [(w[0], None)] if instr.operands[1].value in p.labels_after(w[0]) else None
+    if len(w) < 2:
+        return None
+    jump = p.items[w[1]]
+    reg = instr.operands[0]
+    if is_reg_jump(jump, reg) or (isinstance(jump, Instr) and jump.op in INVERSE_BRANCHES_16 and jump.operands[2].num == reg.num):
+        if instr.operands[1].value in p.labels_after(w[1]):
+            return [(w[0], None), (w[1], None)]
+    return None
+
+def branch_over_jump(p, w):
+    if p.bits == 32:
+        if len(w) < 2:
+            return None
+        branch, jump = p.items[w[0]], p.items[w[1]]
+        if branch.op not in INVERSE_BRANCHES_32 or not isinstance(jump, Instr) or jump.op != "jmp":
+            return None
+        skip, target = branch.operands[-1], jump.operands[0]
+        if not isinstance(skip, Imm) or skip.ptr or not isinstance(target, Imm) or target.ptr:
+            return None
+        if skip.value not in p.labels_after(w[1]):
+            return None
+        inverted = Instr(INVERSE_BRANCHES_32[branch.op], tuple(branch.operands[:-1]) + (target,), branch.size, branch.signed)
+        return [(w[0], inverted), (w[1], None)]
+
+    if len(w) < 3:
+        return None
+    load, branch = p.items[w[0]], p.items[w[1]]
+    if load.op != "movi" or not isinstance(branch, Instr) or branch.op not in INVERSE_BRANCHES_16:
+        return None
+    left, right, reg = branch.operands
+    if reg.num != load.operands[0].num or reg.num in (left.num, right.num, PC):
+        return None
+    target = p.jump_at(w[2])
+    if target is None:
+        return None
+    end = w[2] if p.items[w[2]].operands[0].num == PC else w[3]
+    if load.operands[1].value not in p.labels_after(end):
+        return None
+    op, swap = INVERSE_BRANCHES_16[branch.op]
+    operands = (right, left, reg) if swap else (left, right, reg)
+    edits = [(w[0], Instr("movi", (reg, Imm(target)))), (w[1], Instr(op, operands))]
+    return edits + [(j, None) for j in w[2:w.index(end) + 1]]
+
+def jump_chain(p, w):
+    instr = p.items[w[0]]
+    if p.bits == 32:
+        if instr.op != "jmp" and instr.op not in INVERSE_BRANCHES_32:
+            return None
+        target = instr.operands[-1]
+        if not isinstance(target, Imm) or target.ptr or not isinstance(target.value, str):
+            return None
+        final = p.final_target(target.value)
+        if final == target.value:
+            return None
+        return [(w[0], Instr(instr.op, tuple(instr.operands[:-1]) + (Imm(final),), instr.size, instr.signed))]
+
+    if instr.op != "movi" or not isinstance(instr.operands[1].value, str):
+        return None
+    reg = instr.operands[0]
+    if reg.num != PC:
+        if len(w) < 2:
+            return None
+        jump = p.items[w[1]]
+        if not is_reg_jump(jump, reg) and not (isinstance(jump, Instr) and jump.op in INVERSE_BRANCHES_16 and jump.operands[2].num == reg.num):
+            return None
+    final = p.final_target(instr.operands[1].value)
+    if final == instr.operands[1].value:
+        return None
+    return [(w[0], Instr("movi", (reg, Imm(final))))]
+
+def unreachable(p, w):
+    if not is_transfer(p.items[w[0]], p.bits):
+        return None
+    edits = []
+    for j in range(w[0] + 1, len(p.items)):
+        item = p.items[j]
+        if isinstance(item, Instr):
+            edits.append((j, None))
+        elif item is not None and not isinstance(item, Comment):
+            break
+    return edits or None
+
+RULES = [
+    ("self_move", self_move),
+    ("redundant_const", redundant_const),
+    ("push_pop", push_pop),
+    ("store_reload", store_reload),
+    ("jump_to_next", jump_to_next),
+    ("branch_over_jump", branch_over_jump),
+    ("jump_chain", jump_chain),
+    ("unreachable", unreachable),
+]
+
+def peephole(items, bits, stats=None, rules=RULES):
+    items = list(items)
+    for _ in range(MAX_PASSES):
+        p = Peephole(items, bits)
+        changed = False
+        i = 0
+        while i < len(items):
+            item = items[i]
+            if isinstance(item, Instr):
+                w = p.window(i)
+                for name, rule in rules:
+                    edits = rule(p, w)
+                    if edits:
+                        for j, new in edits:
+                            items[j] = new
+                        if stats is not None:
+                            stats[name] = stats.get(name, 0) + 1
+                        changed = True
+                        break
+                if items[i] is not item:
+                    continue
+                track(p.known, item, bits)
+            elif item is not None and not isinstance(item, Comment):
+                p.known.clear()
+            i += 1
+        items = [item for item in items if item is not None]
+        if not changed:
+            break
+    return items
+
+def count_instructions(items):
+    return sum(1 for item in items if isinstance(item, Instr))
+
+def item_size(item, bits):
+    if isinstance(item, Instr):
+        return 8 if bits == 32 else 3
+    if isinstance(item, Data):
+        return len(item.values) * Data.WIDTHS[item.directive]
+    return 0
+
+def label_refs(items):
+    names = []
+    for item in items:
+        if isinstance(item, Instr):
+            values = [op.value for op in item.operands if isinstance(op, Imm)]
+        elif isinstance(item, Data):
+            values = item.values
+        else:
+            continue
+        for value in values:
+            if isinstance(value, str):
+                names.extend(part.strip() for part in value.split("+"))
+    return names
+
+def remove_dead_objects(items, objects, roots, bits, removed=None):
+    starts = set(objects)
+    entry, chunks = [], []
+    for item in items:
+        if isinstance(item, Label) and item.name in starts:
+            chunks.append((item.name, []))
+        (chunks[-1][1] if chunks else entry).append(item)
+
+    owner = {}
+    for i, (_, chunk) in enumerate(chunks):
+        for item in chunk:
+            if isinstance(item, Label): owner[item.name] = i
+    live = set()
+    pending = list(roots) + label_refs(entry)
+    while pending:
+        i = owner.get(pending.pop())
+        if i is not None and i not in live:
+            live.add(i)
+            pending.extend(label_refs(chunks[i][1]))
+
+    result = entry
+    for i, (name, chunk) in enumerate(chunks):
+        if i in live:
+            result.extend(chunk)
+            continue
+        if removed is not None:
+            removed[name] = sum(item_size(item, bits) for item in chunk)
+        end = max(j for j, item in enumerate(chunk) if not isinstance(item, Comment)) + 1
+        result.extend(chunk[end:])
+    return result